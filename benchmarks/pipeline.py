@@ -0,0 +1,172 @@
+"""
+Benchmarks of the conversion pipeline, timing every stage of read_to_xml separately on synthetic workbooks of
+increasing size. Run them with:
+
+python -m benchmarks.pipeline [-s SHEETS [SHEETS ...]] [-n ROWS [ROWS ...]] [-o OUTPUT] [-c BASELINE]
+
+The results are written as JSON, by default to results/benchmarks/<commit>.json, so the results of two commits can be
+compared with the -c option.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+
+from benchmarks.workbooks import SOURCE_WORKBOOKS, create_benchmark_workbook
+from src.dfs_schema import get_dfs_schema, get_XML_schema, get_cache_dir
+from src.instrumentation import Instrumentation
+from src.read_excel import read_to_xml
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Stages of the conversion, as recorded by the instrumentation of read_to_xml
+STAGES = ('read', 'references', 'codelijsten', 'partition', 'data_read', 'to_json', 'validate', 'encode', 'write')
+DEFAULT_SHEETS = ('filtermeting', 'bodemobservatie', 'boring')
+DEFAULT_ROWS = (1000, 10000, 100000)
+REGRESSION_RATIO = 1.2  # slowdown of a stage that is reported when comparing with a baseline
+
+
+def get_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=PROJECT_ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run_pipeline(filename, sheet, root, xml_schema, output_filename) -> dict:
+    """
+    Converts a sheet of a workbook with read_to_xml, timing every stage with its instrumentation.
+
+    Args:
+        filename (str): Path to the Excel file.
+        sheet (str): Name of the sheet.
+        root (Node): Root node of the depth-first schema tree.
+        xml_schema (XMLSchema): Compiled XSD schema.
+        output_filename (str): Path of the XML file to write.
+
+    Returns:
+        dict: Seconds spent in every stage of STAGES, and the number of objects and invalid objects.
+    """
+    # Tracing the memory allocations would slow the stages down
+    instrumentation = Instrumentation(trace_memory=False)
+    validator = read_to_xml(filename, output_filename, sheets=[sheet], xml_schema=xml_schema, dfs_schema=root,
+                            instrumentation=instrumentation)
+
+    totals = instrumentation.get_totals()
+    timings = {stage: totals[stage]['wall'] if stage in totals else 0.0 for stage in STAGES}
+    objects = sum(record.counts['objects'] for record in instrumentation.records if record.stage == 'partition')
+    return {'stages': timings, 'objects': objects, 'errors': len(validator.errors[sheet])}
+
+
+def run_benchmarks(sheets=DEFAULT_SHEETS, rows=DEFAULT_ROWS, xsd_source='productie', repeat=3,
+                   workbook_dir=None) -> dict:
+    """
+    Runs the pipeline benchmark for every sheet and number of rows.
+
+    Args:
+        sheets (Iterable[str], optional): Sheets to benchmark. Defaults to DEFAULT_SHEETS.
+        rows (Iterable[int], optional): Numbers of data rows of the synthetic workbooks. Defaults to DEFAULT_ROWS.
+        xsd_source (str, optional): 'productie', 'oefen' or 'ontwikkel'. Defaults to 'productie'.
+        repeat (int, optional): Number of runs, the fastest time of every stage is kept. Defaults to 3.
+        workbook_dir (str, optional): Directory in which the synthetic workbooks are kept between runs. Defaults to
+            the benchmarks directory in the cache directory.
+
+    Returns:
+        dict: The results, with the commit and platform they were measured on.
+    """
+    if workbook_dir is None:
+        workbook_dir = os.path.join(get_cache_dir(), 'benchmarks')
+    root = get_dfs_schema(PROJECT_ROOT, xsd_source)
+    xml_schema = get_XML_schema(xsd_source, cache_dir=get_cache_dir())
+    output_filename = os.path.join(workbook_dir, 'benchmark.xml')
+
+    results = []
+    for sheet in sheets:
+        for n_rows in rows:
+            filename = os.path.join(workbook_dir, f'{xsd_source}_{sheet}_{n_rows}.xlsx')
+            if not os.path.exists(filename):
+                create_benchmark_workbook(filename, sheet, n_rows, root)
+
+            runs = [run_pipeline(filename, sheet, root, xml_schema, output_filename) for _ in range(repeat)]
+            result = {'sheet': sheet, 'rows': n_rows, 'objects': runs[0]['objects'], 'errors': runs[0]['errors'],
+                      'stages': {stage: min(run['stages'][stage] for run in runs) for stage in STAGES}}
+            result['total'] = sum(result['stages'].values())
+            results.append(result)
+            print(f"{sheet} ({n_rows} rows, {result['objects']} objects): {result['total']:.3f}s")
+
+    if os.path.exists(output_filename):
+        os.remove(output_filename)
+
+    return {
+        'commit': get_commit(),
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'xsd_source': xsd_source,
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def compare_results(results, baseline) -> list:
+    """
+    Compares the stage timings of two benchmark runs.
+
+    Args:
+        results (dict): Results of run_benchmarks.
+        baseline (dict): Earlier results of run_benchmarks.
+
+    Returns:
+        List[Tuple[str, int, str, float, float]]: Sheet, rows, stage, baseline and new seconds of every stage that
+            became more than REGRESSION_RATIO times slower.
+    """
+    baseline_stages = {(r['sheet'], r['rows']): r['stages'] for r in baseline['results']}
+    regressions = []
+    for result in results['results']:
+        old = baseline_stages.get((result['sheet'], result['rows']))
+        if old is None:
+            continue
+        for stage, seconds in result['stages'].items():
+            if stage in old and seconds > REGRESSION_RATIO * old[stage]:
+                regressions.append((result['sheet'], result['rows'], stage, old[stage], seconds))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='benchmarks.pipeline',
+                                     description='Times every stage of the conversion pipeline on synthetic workbooks')
+    parser.add_argument("-s", "--sheets", nargs='+', choices=sorted(SOURCE_WORKBOOKS),
+                        help=f"Sheet(s) to benchmark, default: {' '.join(DEFAULT_SHEETS)}",
+                        default=list(DEFAULT_SHEETS))
+    parser.add_argument("-n", "--rows", nargs='+', type=int,
+                        help=f"Number(s) of data rows, default: {' '.join(str(n) for n in DEFAULT_ROWS)}",
+                        default=list(DEFAULT_ROWS))
+    parser.add_argument("-omg", "--omgeving",
+                        help="Determines which xsd-schema is used, options are 'ontwikkel','oefen' and 'productie', "
+                             "default: productie",
+                        default='productie')
+    parser.add_argument("-r", "--repeat", type=int, help="Number of runs of every benchmark, default: 3", default=3)
+    parser.add_argument("-o", "--output_file",
+                        help="JSON file to which the results are written, default: results/benchmarks/<commit>.json")
+    parser.add_argument("-c", "--compare", help="JSON file of earlier results to compare with")
+    args = parser.parse_args()
+
+    benchmark = run_benchmarks(args.sheets, args.rows, xsd_source=args.omgeving, repeat=args.repeat)
+
+    output_file = args.output_file or os.path.join(PROJECT_ROOT, 'results', 'benchmarks',
+                                                   f"{benchmark['commit'][:12]}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+    with open(output_file, 'w') as f:
+        json.dump(benchmark, f, indent=2)
+    print(f'Results written to {output_file}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare_results(benchmark, json.load(f))
+        for sheet, n_rows, stage, old, new in regressions:
+            print(f'{sheet} ({n_rows} rows) {stage}: {old:.3f}s -> {new:.3f}s')
+        if not regressions:
+            print('No regressions')
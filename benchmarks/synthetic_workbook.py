@@ -0,0 +1,200 @@
+"""
+Generator of filled workbooks of any size for load testing. It walks the depth-first schema tree of a sheet and writes
+N objects below the header rows of the template of create_xls, so the workbook can be read by read_sheets. Generate a
+workbook with:
+
+python -m benchmarks.synthetic_workbook -s SHEET -n OBJECTS [-r REPEAT] [-d DEPTH] [-o OUTPUT_FILE]
+
+Every leaf of the template gets a value of its binding, or a code of its codelijst. Children that can occur more than
+once get REPEAT copies, up to DEPTH nested levels of repetition. Only the cardinalities, bindings and codelijsten of the
+schema tree are respected, restrictions that are only known to the XSD (patterns, ranges) are not.
+"""
+
+import argparse
+import datetime
+import os
+
+import xlsxwriter
+
+from src.dfs_schema import ChoiceNode, get_dfs_schema
+from src.generate_excel_template import initialize_config, get_excel_format_data, get_default_formats, write_cell, \
+    add_metadata_sheet
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIRST_DATE = datetime.datetime(2000, 1, 1)
+
+
+class SyntheticObjects:
+    """
+    Generates the rows of objects of a sheet, as dicts of column name to value.
+    """
+
+    def __init__(self, node, repeat=2, repeat_depth=1):
+        self.node = node
+        self.repeat = repeat
+        self.repeat_depth = repeat_depth
+        self.counter = 0
+
+    def get_value(self, leaf, name):
+        self.counter += 1
+        i = self.counter
+        if leaf.enum:
+            return leaf.enum[i % len(leaf.enum)]
+
+        binding = leaf.binding
+        if binding == 'java.lang.Boolean':
+            return 'true' if i % 2 else 'false'
+        if binding == 'java.math.BigInteger':
+            return i
+        if binding in ('java.math.BigDecimal', 'java.lang.Double'):
+            return (i % 10000) / 10
+        if binding == 'java.sql.Date':
+            return FIRST_DATE + datetime.timedelta(days=i % 9000)
+        if binding == 'java.sql.Time':
+            return datetime.time(i % 24, i % 60, 0)
+        if binding == 'java.util.List':
+            return f'{100000 + i % 100000}.0 {150000 + i % 100000}.0'
+        if binding == 'java.net.URI':
+            return f'https://www.example.com/{i}'
+        return f'{name.lstrip("@")}_{i}'
+
+    def get_copies(self, node, depth):
+        if node.max_amount <= 1:
+            return 1
+        if depth >= self.repeat_depth:
+            return max(1, node.min_amount)
+        return max(node.min_amount, min(self.repeat, node.max_amount))
+
+    def get_rows(self, node, current_lijst, depth=0) -> list:
+        """
+        Generates the rows of a single occurrence of a node, its single valued leaves are all on the first row.
+
+        Args:
+            node (Node): Current node in the schema tree.
+            current_lijst (List[str]): Current list of column name parts.
+            depth (int, optional): Number of repeated nodes above this node. Defaults to 0.
+
+        Returns:
+            List[Dict[str, Any]]: Rows of the occurrence.
+        """
+        if not node.children:
+            return [{'-'.join(current_lijst): self.get_value(node, node.name)}]
+
+        children = [c for c in node.children if c.priority is None or c.priority[0] < 4]
+        if isinstance(node, ChoiceNode) and children:
+            self.counter += 1
+            children = [children[self.counter % len(children)]]
+
+        rows = [{}]
+        for child in children:
+            current_lijst.append(child.name)
+            child_rows = []
+            copies = self.get_copies(child, depth)
+            for _ in range(copies):
+                child_rows += self.get_rows(child, current_lijst, depth + int(copies > 1))
+            del current_lijst[-1]
+
+            rows += [{} for _ in range(len(child_rows) - len(rows))]
+            for row, child_row in zip(rows, child_rows):
+                row.update(child_row)
+        return rows
+
+    def __iter__(self):
+        while True:
+            yield self.get_rows(self.node, [])
+
+
+def write_header(worksheet, sheet_data, cell_format) -> int:
+    """
+    Writes the header rows of a template, in row order as required by the constant memory mode of xlsxwriter.
+
+    Returns:
+        int: Index of the bottom header row.
+    """
+    for data in sorted(sheet_data, key=lambda d: (d.row_range[0], d.col_range[0])):
+        write_cell(data, worksheet, cell_format)
+    return max(d.row_range[1] for d in sheet_data)
+
+
+def create_synthetic_workbook(filename, sheet, n_objects, root, project_root=PROJECT_ROOT, repeat=2, repeat_depth=1,
+                              priority_config=None) -> int:
+    """
+    Writes a workbook with n_objects generated objects in a sheet.
+
+    Args:
+        filename (str): Path of the workbook to write.
+        sheet (str): Name of the sheet.
+        n_objects (int): Number of objects.
+        root (Node): Root node of the depth-first schema tree.
+        project_root (str, optional): Project root, containing the config directory. Defaults to PROJECT_ROOT.
+        repeat (int, optional): Number of copies of children that can occur more than once. Defaults to 2.
+        repeat_depth (int, optional): Number of nested levels of repetition that get repeat copies, deeper children
+            that can occur more than once get their minimal number of copies. Defaults to 1.
+        priority_config (str, optional): Priority config that determines the columns of the template. Defaults to
+            config/priority_config_full.ini, as in create_xls.
+
+    Returns:
+        int: Number of data rows written.
+    """
+    if priority_config is None:
+        priority_config = os.path.join(project_root, 'config', 'priority_config_full.ini')
+    initialize_config(None, None, priority_config)
+
+    node = root.get_specific_child(sheet)
+    sheet_data = get_excel_format_data(node)
+    bottom_header_index = max(d.row_range[1] for d in sheet_data)
+    columns = {d.data: d.col_range[0] for d in sheet_data if d.row_range[0] == 0}
+
+    os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+    workbook = xlsxwriter.Workbook(filename, {'constant_memory': True})
+    n_rows = 0
+    try:
+        formats = get_default_formats(workbook)
+        workbook.add_worksheet('Codelijsten')
+        worksheet = workbook.add_worksheet(sheet)
+        write_header(worksheet, sheet_data, formats['standard'])
+
+        objects = iter(SyntheticObjects(node, repeat=repeat, repeat_depth=repeat_depth))
+        for _ in range(n_objects):
+            for row in next(objects):
+                n_rows += 1
+                for column, value in row.items():
+                    if column not in columns:
+                        continue
+                    if isinstance(value, datetime.datetime):
+                        worksheet.write_datetime(bottom_header_index + n_rows, columns[column], value,
+                                                 formats['java.sql.Date'])
+                    elif isinstance(value, datetime.time):
+                        worksheet.write_datetime(bottom_header_index + n_rows, columns[column], value,
+                                                 formats['java.sql.Time'])
+                    else:
+                        worksheet.write(bottom_header_index + n_rows, columns[column], value)
+
+        add_metadata_sheet(workbook, root, project_root)
+    finally:
+        workbook.close()
+
+    return n_rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='synthetic_workbook',
+                                     description='Writes a filled workbook with generated objects for load testing')
+    parser.add_argument("-s", "--sheet", help="Sheet to fill", required=True)
+    parser.add_argument("-n", "--objects", type=int, help="Number of objects, default: 1000", default=1000)
+    parser.add_argument("-r", "--repeat", type=int,
+                        help="Number of copies of children that can occur more than once, default: 2", default=2)
+    parser.add_argument("-d", "--depth", type=int,
+                        help="Number of nested levels of repetition that get REPEAT copies, default: 1", default=1)
+    parser.add_argument("-omg", "--omgeving",
+                        help="Determines which xsd-schema is used, options are 'ontwikkel','oefen' and 'productie', "
+                             "default: productie",
+                        default='productie')
+    parser.add_argument("-o", "--output_file", help="Workbook to write, default: results/<sheet>_<objects>.xlsx")
+    args = parser.parse_args()
+
+    output_file = args.output_file or os.path.join(PROJECT_ROOT, 'results', f'{args.sheet}_{args.objects}.xlsx')
+    dfs_schema = get_dfs_schema(PROJECT_ROOT, xsd_source=args.omgeving)
+    rows = create_synthetic_workbook(output_file, args.sheet, args.objects, dfs_schema, repeat=args.repeat,
+                                     repeat_depth=args.depth)
+    print(f'Wrote {args.objects} objects in {rows} rows to {output_file}')
@@ -0,0 +1,113 @@
+"""
+Synthetic workbooks for the benchmarks, made by repeating the filled rows of a template generated by create_xls until
+the sheet holds the requested number of rows. The string identifiers of every copy get a suffix, so every copy is
+converted to new objects.
+"""
+
+import datetime
+import math
+import os
+
+import pandas as pd
+import xlsxwriter
+
+from src.read_excel import get_leaf_columns
+from src.dfs_schema import get_identifiers
+
+DATA_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests', 'data',
+                           'filled_templates')
+
+# Filled template holding example data of each sheet
+SOURCE_WORKBOOKS = {
+    'filtermeting': 'grondwater_template_full.xlsx',
+    'filter': 'grondwater_template_full.xlsx',
+    'filterdebietmeter': 'grondwater_template_full.xlsx',
+    'bodemobservatie': 'bodem_template_full2.xlsx',
+    'bodemmonster': 'bodem_template_full2.xlsx',
+    'bodemkundigeopbouw': 'bodem_template_full2.xlsx',
+    'boring': 'geologie_template_full2.xlsx',
+    'interpretaties': 'geologie_template_full2.xlsx',
+}
+
+
+def get_suffix_columns(node) -> set:
+    """
+    Gets the identifier columns of a sheet that can be made unique by adding a suffix, free text without codelijst.
+
+    Args:
+        node (Node): Schema node of the sheet.
+
+    Returns:
+        Set[str]: Column names.
+    """
+    identifiers = []
+    get_identifiers(node, [], identifiers)
+    columns = []
+    get_leaf_columns(node, [], columns)
+    return {column for column, leaf in columns if column in identifiers and leaf.binding == 'java.lang.String'
+            and not leaf.enum}
+
+
+def create_benchmark_workbook(filename, sheet, n_rows, root, source=None) -> str:
+    """
+    Writes a workbook with a single sheet of n_rows data rows, copied from a filled template.
+
+    Args:
+        filename (str): Path of the workbook to write.
+        sheet (str): Name of the sheet.
+        n_rows (int): Number of data rows below the header rows.
+        root (Node): Root node of the depth-first schema tree the template was generated from.
+        source (str, optional): Filled template to copy the header and data rows from. Defaults to the template of
+            the sheet in SOURCE_WORKBOOKS.
+
+    Returns:
+        str: Path of the workbook.
+    """
+    if source is None:
+        source = os.path.join(DATA_FOLDER, SOURCE_WORKBOOKS[sheet])
+
+    node = root.get_specific_child(sheet)
+    header_rows = node.get_max_depth()
+    cells = pd.read_excel(source, sheet_name=sheet, header=None, dtype=object)
+    header = cells.iloc[:header_rows + 1].values.tolist()
+    data = cells.iloc[header_rows + 1:].dropna(how='all').values.tolist()
+    if not data:
+        raise ValueError(f'{source} has no data in sheet {sheet}')
+
+    suffix_columns = [i for i, column in enumerate(header[0]) if column in get_suffix_columns(node)]
+    if not suffix_columns:
+        print(f'Sheet {sheet} has no free text identifiers, the copies are merged into the same objects')
+
+    os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+    workbook = xlsxwriter.Workbook(filename, {'constant_memory': True})
+    try:
+        worksheet = workbook.add_worksheet(sheet)
+        date_format = workbook.add_format({'num_format': 'dd/mm/yyyy'})
+        time_format = workbook.add_format({'num_format': 'h:mm:ss'})
+
+        def write_row(row_index, values):
+            for col, value in enumerate(values):
+                if value is None or (isinstance(value, float) and math.isnan(value)):
+                    continue
+                if isinstance(value, datetime.datetime):
+                    worksheet.write_datetime(row_index, col, value, date_format)
+                elif isinstance(value, datetime.time):
+                    worksheet.write_datetime(row_index, col, value, time_format)
+                else:
+                    worksheet.write(row_index, col, value)
+
+        for i, values in enumerate(header):
+            write_row(i, values)
+
+        for i in range(n_rows):
+            copy, j = divmod(i, len(data))
+            values = list(data[j])
+            if copy:
+                for col in suffix_columns:
+                    if isinstance(values[col], str):
+                        values[col] = f'{values[col]}-{copy}'
+            write_row(len(header) + i, values)
+    finally:
+        workbook.close()
+
+    return filename
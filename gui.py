@@ -1,13 +1,15 @@
+import contextlib
 import tkinter as tk
 from tkinter import ttk, filedialog as fd, messagebox as mb
 import traceback
 import os
+import queue
 import threading
 import time
 
-from src.read_excel import read_to_xml
-from src.generate_excel_template import generate_standard_templates
-from src.dfs_schema import get_project_root, get_XML_schema
+# pandas and xmlschema are imported by the conversion modules on first use, so the window opens without waiting
+# for them
+from src.dfs_schema import get_project_root, get_XML_schema, get_dfs_schema, get_cache_dir
 
 """
 Command:
@@ -58,8 +60,20 @@ class Xls2XmlApp(tk.Tk):
             'bodemsite', 'boring', 'filter', 'filterdebietmeter', 'filtermeting', 'grondmonster', 'grondwaterlocatie',
             'interpretaties', 'monster', 'observatie', 'opdracht', 'sondering')
 
+        self.STAGE_WEIGHTS = {'read': 0.6, 'validate': 0.35, 'write': 0.05}
+        self.STAGE_LABELS = {'read': 'Reading sheets', 'partition': 'Reading objects', 'validate': 'Validating objects',
+                             'write': 'Writing XML'}
+        self.POLL_INTERVAL = 50  # ms between two checks of the message queue
+        self.PROGRESS_INTERVAL = 0.1  # s between two progress messages of the conversion thread
+
         self.SCHEMAS = {}
+        self.DFS_SCHEMAS = {}
+        self.schema_events = {}  # omgeving -> threading.Event, set once its schemas are loaded (or failed to)
+        self.schema_errors = {}
         self.sheet_checkboxes = {}
+        self.messages = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.conversion_thread = None
 
         # --- Main Window Setup ---
         self.title(self.TITLE)
@@ -72,6 +86,10 @@ class Xls2XmlApp(tk.Tk):
         self._setup_layout()
         self._toggle_sheets()  # Initialize sheet checkboxes as disabled
 
+        self.omgeving.trace_add('write', lambda *args: self._preload_schema(self.omgeving.get()))
+        self._preload_schema(self.omgeving.get())
+        self.after(self.POLL_INTERVAL, self._process_messages)
+
     def _setup_variables(self):
         """Initializes application variables."""
         self.input_filename = tk.StringVar()
@@ -79,6 +97,7 @@ class Xls2XmlApp(tk.Tk):
         self.omgeving = tk.StringVar(value='productie')
         self.all_sheets_var = tk.BooleanVar(value=True)  # Variable for the 'Automatic' checkbox
         self.sheet_vars = {}
+        self.profile_var = tk.BooleanVar(value=False)
 
     def _setup_widgets(self):
         """Creates and configures all GUI widgets."""
@@ -95,9 +114,9 @@ class Xls2XmlApp(tk.Tk):
         self.automatic_checkbox = ttk.Checkbutton(self, text='Automatic (All Sheets)', variable=self.all_sheets_var,
                                                   command=self._toggle_sheets)
 
-        self.run_button = ttk.Button(self, text='Run Conversion', command=self.run_xls2xml)
+        self.run_button = ttk.Button(self, text='Run Conversion (loading schema...)', command=self.run_xls2xml)
         self.status_label = ttk.Label(self, text='Ready.', relief=tk.SUNKEN, anchor=tk.W)
-        self.progressbar = ttk.Progressbar(self, orient=tk.HORIZONTAL, length=400, mode='determinate')
+        self.progressbar = ttk.Progressbar(self, orient=tk.HORIZONTAL, length=400, mode='determinate', maximum=100)
 
     def _setup_menu(self):
         """Creates the application menu bar."""
@@ -105,6 +124,9 @@ class Xls2XmlApp(tk.Tk):
         filemenu = tk.Menu(menubar, tearoff=0)
         filemenu.add_command(label="Generate Templates", command=self.generate_templates)
         menubar.add_cascade(label="File", menu=filemenu)
+        optionsmenu = tk.Menu(menubar, tearoff=0)
+        optionsmenu.add_checkbutton(label="Profile Conversion", variable=self.profile_var)
+        menubar.add_cascade(label="Options", menu=optionsmenu)
         self.config(menu=menubar)
 
     def _setup_layout(self, n=0):
@@ -239,63 +261,200 @@ class Xls2XmlApp(tk.Tk):
                 mb.showwarning("No Sheets Selected", "Please select at least one sheet or the 'Automatic' option.")
                 return
 
-        self.run_button.config(state=tk.DISABLED)
+        self._preload_schema(self.omgeving.get())
+        self.run_button.config(text='Cancel Conversion', command=self.cancel_conversion)
         self.status_label.config(text='Preparing to convert...')
-
-        # Start the conversion in a new thread
-        conversion_thread = threading.Thread(
+        self.progressbar['value'] = 0
+        self._stage_fractions = dict.fromkeys(self.STAGE_WEIGHTS, 0)
+        self._sheet_progress = (0, 1)
+        self._start_time = time.monotonic()
+        self.cancel_event.clear()
+
+        # Start the conversion in a new thread, the thread reports back through self.messages
+        self.conversion_thread = threading.Thread(
             target=self._perform_conversion,
-            args=(input_path, output_path, selected_sheets),
+            args=(input_path, output_path, selected_sheets, self.omgeving.get(),
+                  self.schema_events[self.omgeving.get()], self.profile_var.get()),
             daemon=True
         )
-        conversion_thread.start()
+        self.conversion_thread.start()
+
+    def _preload_schema(self, omgeving):
+        """Starts loading the XSD and dfs schemas of an omgeving in the background, unless already (being) loaded."""
+        if omgeving not in self.schema_events:
+            self.schema_events[omgeving] = threading.Event()
+            self.schema_errors.pop(omgeving, None)
+            threading.Thread(target=self._load_schema, args=(omgeving, self.schema_events[omgeving]),
+                             daemon=True).start()
+        self._update_run_button()
+
+    def _load_schema(self, omgeving, event):
+        """Loads the schemas of an omgeving (runs in a separate thread), using the on-disk schema cache."""
+        try:
+            import src.read_excel  # noqa: F401, imports pandas and xmlschema before the first conversion
+            if omgeving not in self.SCHEMAS:
+                self.SCHEMAS[omgeving] = get_XML_schema(omgeving, cache_dir=get_cache_dir())
+            if omgeving not in self.DFS_SCHEMAS:
+                self.DFS_SCHEMAS[omgeving] = get_dfs_schema(get_project_root(), xsd_source=omgeving)
+            self.messages.put(('schema', omgeving, None))
+        except Exception as e:
+            print(f"Detailed Error:\n{traceback.format_exc()}")
+            self.messages.put(('schema', omgeving, e))
+        finally:
+            event.set()
 
-    def _perform_conversion(self, input_path, output_path, sheets_to_convert):
-        """Performs the actual conversion (runs in a separate thread)."""
-        self.status_label.config(text='Converting your xlsx to XML...')
-        self.progressbar.start()  # Use indeterminate mode for a generic loading animation
+    def _update_run_button(self):
+        """Shows whether the schemas of the selected omgeving are ready on the run button."""
+        if self.conversion_thread is not None and self.conversion_thread.is_alive():
+            return
+        omgeving = self.omgeving.get()
+        if omgeving in self.SCHEMAS and omgeving in self.DFS_SCHEMAS:
+            text = 'Run Conversion (schema ready)'
+        elif omgeving in self.schema_errors:
+            text = 'Run Conversion (schema not loaded)'
+        else:
+            text = 'Run Conversion (loading schema...)'
+        self.run_button.config(text=text)
 
-        try:
-            # Check if schema is already loaded
-            if self.omgeving.get() not in self.SCHEMAS:
-                self.status_label.config(text=f'Loading schema for {self.omgeving.get()}...')
-                self.update_idletasks()
-                self.SCHEMAS[self.omgeving.get()] = get_XML_schema(self.omgeving.get())
+    def cancel_conversion(self):
+        """Asks the conversion thread to stop at its next progress report."""
+        self.cancel_event.set()
+        self.run_button.config(state=tk.DISABLED)
+        self.status_label.config(text='Cancelling conversion...')
+
+    def _perform_conversion(self, input_path, output_path, sheets_to_convert, omgeving, schema_event,
+                            profile=False):
+        """
+        Performs the actual conversion (runs in a separate thread).
+        It never touches the widgets, but posts its progress and result on self.messages.
+        If profile is set, the conversion is profiled and the profile is written next to the output file.
+        """
+        from src.read_excel import read_to_xml, ConversionCancelled
+        from src.instrumentation import Profiler
+
+        last_report = [0.0]
 
-            self.status_label.config(text=f'Converting your xls to xml...')
-            self.update_idletasks()
+        def progress(stage, done, total):
+            if self.cancel_event.is_set():
+                raise ConversionCancelled()
+            now = time.monotonic()
+            if now - last_report[0] >= self.PROGRESS_INTERVAL or done == total:
+                last_report[0] = now
+                self.messages.put(('progress', stage, done, total))
 
-            rapport = read_to_xml(input_path, output_path, xsd_source=self.omgeving.get(),
-                                  project_root=get_project_root(), xml_schema=self.SCHEMAS[self.omgeving.get()],
-                                  sheets=sheets_to_convert)
+        try:
+            # Wait for the schemas that are being loaded in the background, load them here if that failed
+            if not schema_event.is_set():
+                self.messages.put(('status', f'Loading schema for {omgeving}...'))
+                schema_event.wait()
+            if omgeving not in self.SCHEMAS:
+                self.messages.put(('status', f'Loading schema for {omgeving}...'))
+                self.SCHEMAS[omgeving] = get_XML_schema(omgeving, cache_dir=get_cache_dir())
+            if omgeving not in self.DFS_SCHEMAS:
+                self.DFS_SCHEMAS[omgeving] = get_dfs_schema(get_project_root(), xsd_source=omgeving)
+
+            if self.cancel_event.is_set():
+                raise ConversionCancelled()
+            self.messages.put(('status', 'Converting your xls to xml...'))
+
+            profiler = Profiler(output_path, sampling=True) if profile else None
+            with profiler or contextlib.nullcontext():
+                rapport = read_to_xml(input_path, output_path, xsd_source=omgeving,
+                                      project_root=get_project_root(), xml_schema=self.SCHEMAS[omgeving],
+                                      dfs_schema=self.DFS_SCHEMAS[omgeving], sheets=sheets_to_convert,
+                                      progress=progress)
+            error_rapport = rapport.get_error_rapport()
+            if profiler is not None:
+                error_rapport += f'\nProfile written to {profiler.filename}\n{profiler.get_top()}'
+            self.messages.put(('done', output_path, error_rapport))
+        except ConversionCancelled:
+            self.messages.put(('cancelled',))
+        except Exception as e:
+            print(f"Detailed Error:\n{traceback.format_exc()}")
+            self.messages.put(('error', e))
+
+    def _process_messages(self):
+        """Handles the messages of the conversion and schema threads on the Tk main loop."""
+        try:
+            while True:
+                message = self.messages.get_nowait()
+                kind = message[0]
+                if kind == 'status':
+                    self.status_label.config(text=message[1])
+                elif kind == 'progress':
+                    self._update_progress(*message[1:])
+                elif kind == 'schema':
+                    _, omgeving, error = message
+                    if error is not None:
+                        # Allow a new attempt when the omgeving is selected again
+                        self.schema_events.pop(omgeving, None)
+                        self.schema_errors[omgeving] = error
+                        if omgeving == self.omgeving.get():
+                            self.status_label.config(text=f'Could not load the schema for {omgeving}: {error}')
+                    self._update_run_button()
+                else:
+                    self._finish_conversion(message)
+        except queue.Empty:
+            pass
+
+        self.after(self.POLL_INTERVAL, self._process_messages)
+
+    def _update_progress(self, stage, done, total):
+        """Shows the overall progress of the conversion and the estimated time remaining."""
+        if stage == 'read':
+            self._sheet_progress = (done, total)
+            self._stage_fractions['read'] = done / total if total else 1
+        elif stage == 'partition':
+            sheet, n_sheets = self._sheet_progress
+            self._stage_fractions['read'] = (sheet + done / total) / n_sheets if total and n_sheets else 1
+        else:
+            for previous in self.STAGE_WEIGHTS:
+                if previous == stage:
+                    break
+                self._stage_fractions[previous] = 1
+            self._stage_fractions[stage] = done / total if total else 1
 
-            for _ in range(200):
-                time.sleep(0.01)
-                self.update_idletasks()
-            self.progressbar.stop()
-            self.progressbar['value'] = 0
+        fraction = sum(weight * self._stage_fractions[s] for s, weight in self.STAGE_WEIGHTS.items())
+        self.progressbar['value'] = 100 * fraction
 
+        if stage == 'write':
+            text = f'{self.STAGE_LABELS[stage]} ({done / 1e6:.1f}/{total / 1e6:.1f} MB)'
+        else:
+            text = f'{self.STAGE_LABELS[stage]} ({done}/{total})'
+        elapsed = time.monotonic() - self._start_time
+        if fraction > 0.02:
+            remaining = elapsed * (1 - fraction) / fraction
+            text += f' - about {int(remaining // 60)}:{int(remaining % 60):02d} remaining'
+        self.status_label.config(text=text)
+
+    def _finish_conversion(self, message):
+        """Resets the widgets and shows the result of the conversion thread."""
+        self.progressbar['value'] = 0
+        self.conversion_thread = None
+        self.run_button.config(command=self.run_xls2xml, state=tk.NORMAL)
+        self._update_run_button()
+        kind = message[0]
+
+        if kind == 'done':
+            _, output_path, error_rapport = message
+            self.status_label.config(text='Conversion complete.')
             self.show_custom_message('Conversion Complete!',
                                      f'The conversion was completed!\nYour XML file can be found at: {output_path}\n' +
-                                     f'Logs:\n{rapport.get_error_rapport()}'
+                                     f'Logs:\n{error_rapport}'
                                      )
-
-            self.status_label.config(text='Conversion complete.')
-        except Exception as e:
+        elif kind == 'cancelled':
+            self.status_label.config(text='Conversion cancelled.')
+        else:
+            self.status_label.config(text='Error: Conversion failed.')
             self.show_custom_message('Conversion Failed!',
                                      'The conversion to XML has failed.\n'
-                                     f'Reason: {e}\n'
+                                     f'Reason: {message[1]}\n'
                                      'Please check the console for more details.')
-            print(f"Detailed Error:\n{traceback.format_exc()}")
-            self.status_label.config(text='Error: Conversion failed.')
-        finally:
-            self.progressbar.stop()
-            self.progressbar['value'] = 0
-            self.run_button.config(state=tk.NORMAL)
 
     def generate_templates(self):
         """Generates standard Excel templates."""
         try:
+            from src.generate_excel_template import generate_standard_templates
             generate_standard_templates(project_root=get_project_root(), mode='online')
             mb.showinfo('Templates Generated', 'Templates were successfully generated.')
         except Exception as e:
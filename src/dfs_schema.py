@@ -1,14 +1,14 @@
+import functools
 import json
 import os
+import pickle
+import tempfile
+import threading
+import time
 from typing import List
-from xmlschema.validators.elements import XsdElement
-from xmlschema.validators.complex_types import XsdComplexType
-from xmlschema.validators.simple_types import XsdList, XsdUnion
-from xmlschema.validators.groups import XsdGroup
-from xmlschema.validators.attributes import XsdAttribute
-import xmlschema
 import math
 import sys
+from collections import deque
 from urllib.parse import urlparse
 import re
 
@@ -17,9 +17,20 @@ VERSION_RE = re.compile(r"^\d+(\.\d+)*$")
 # Global variables to store schema data
 TYPE_LIJST = dict()
 dov_schema_id = None
+TYPE_NODES = dict()  # expanded tree of every type id, see get_type_node
+TYPE_CONSTRAINTS = dict()  # constraint chain of every type id, see get_type_constraints
+XSD_CONTENTS = dict()  # content model, binding and enumeration of every XSD type, see init_xmlschema
+XSD_BINDINGS = dict()
+XSD_ENUMERATIONS = dict()
+XsdElement = XsdComplexType = XsdList = XsdUnion = XsdGroup = XsdAttribute = None  # imported by init_xmlschema
 DEFAULT_TYPE = "java.lang.Object"
+XSD_CACHE_MAX_AGE = 24 * 60 * 60  # seconds a compiled XSD schema is reused from the cache
+# The schema trees are built on the global variables above, threads (e.g. the preloading of the GUI) build them one at
+# a time
+SCHEMA_BUILD_LOCK = threading.RLock()
 
 
+@functools.lru_cache(maxsize=None)
 def namespace_root(url: str) -> str:
     if url in ("", 'http://www.w3.org/2001/XMLSchema') or 'urn:' in url:
         return "http://www.w3.org/2001/XMLSchema"
@@ -51,6 +62,44 @@ def init(project_root, config_filename="xsd_schema.json") -> None:
     TYPE_LIJST = {x["id"]: x for x in data["schemas"][0]["types"]}
     global dov_schema_id
     dov_schema_id = [x["id"] for x in data["schemas"][0]["types"] if x["name"] == "DovSchemaType"][0]
+    TYPE_NODES.clear()
+    TYPE_CONSTRAINTS.clear()
+
+
+def resolve_constraints(metadata) -> list:
+    """
+    Collects the constraints of a declaration and of the (super)types it refers to, breadth-first.
+
+    Args:
+        metadata (dict): Declaration or type in the schema.
+
+    Returns:
+        list: Constraints, starting with those of the declaration itself.
+    """
+    constraints = []
+    constraint_stack = deque([metadata])
+    while constraint_stack:
+        cm = constraint_stack.popleft()
+        constraints.append(cm["constraints"])
+        if "propertyType" in cm:
+            if 'ref' in cm['propertyType']:
+                constraint_stack.append(TYPE_LIJST[cm['propertyType']['ref']])
+            else:
+                constraint_stack.append(cm['propertyType'])
+        if "superType" in cm:
+            constraint_stack.append(TYPE_LIJST[cm['superType']['ref']])
+
+    return constraints
+
+
+def get_type_constraints(type_id) -> tuple:
+    """
+    Gets the constraints of a type, resolving them only once per type.
+    """
+    constraints = TYPE_CONSTRAINTS.get(type_id)
+    if constraints is None:
+        constraints = TYPE_CONSTRAINTS[type_id] = tuple(resolve_constraints(TYPE_LIJST[type_id]))
+    return constraints
 
 
 class Node:
@@ -81,19 +130,15 @@ class Node:
         self.name = metadata["name"]
         self.min_amount, self.max_amount = [math.inf if x == "n" else int(x) for x in
                                             metadata["constraints"]['cardinality'].split('..')]
-        constraint_stack = [metadata]
-        while constraint_stack:
-            cm = constraint_stack.pop(0)
-            self.constraints.append(cm["constraints"])
-            if "propertyType" in cm:
-                if 'ref' in cm['propertyType']:
-                    constraint_stack.append(TYPE_LIJST[cm['propertyType']['ref']])
-                else:
-                    constraint_stack.append(cm['propertyType'])
-            if "superType" in cm:
-                constraint_stack.append(TYPE_LIJST[cm['superType']['ref']])
+        if 'ref' in metadata.get('propertyType', {}) and "superType" not in metadata:
+            # The referenced type directly follows the declaration in the breadth-first order
+            self.constraints.append(metadata["constraints"])
+            self.constraints.extend(get_type_constraints(metadata['propertyType']['ref']))
+        else:
+            self.constraints.extend(resolve_constraints(metadata))
 
-            if 'xsd_attribute' in cm['constraints'] and cm['constraints']['xsd_attribute']:
+        for c in self.constraints:
+            if 'xsd_attribute' in c and c['xsd_attribute']:
                 self.name = '@'+self.name
         enums = [c['values'] for c in [c['enumeration']['@value'] for c in self.constraints if 'enumeration' in c] if
                  c['allowOthers'] == False]
@@ -105,6 +150,27 @@ class Node:
 
         self.binding = DEFAULT_TYPE if not bindings else bindings[0]
 
+    def clone(self, deep=True):
+        """
+        Copies the node, so the copy can be changed without changing the original.
+
+        Args:
+            deep (bool, optional): Whether the children are copied as well, otherwise the copy shares its children
+                with the original. Defaults to True.
+
+        Returns:
+            Node: Copy of the node.
+        """
+        # ChoiceNode and SequenceNode override __class__, so copy and pickle can not be used
+        node = object.__new__(type(self))
+        node.__dict__.update(self.__dict__)
+        # The copy can be changed, the values recorded in a schema artifact are derived again when needed
+        node.__dict__.pop('max_depth', None)
+        node.__dict__.pop('identifiers', None)
+        node.constraints = list(self.constraints)
+        node.children = [c.clone() for c in self.children] if deep else list(self.children)
+        return node
+
     def __str__(self) -> str:
         return f'Node(name="{self.name}", {self.min_amount}..{self.max_amount})'
 
@@ -155,6 +221,9 @@ class Node:
         Returns:
             int: Maximum depth of tree starting at this node.
         """
+        # Recorded for the root and the sheets of a tree loaded from a schema artifact
+        if 'max_depth' in self.__dict__:
+            return self.max_depth
         return 1 + max([0] + [c.get_max_depth() for c in self.children])
 
     def validate(self, children_bools: List[bool]) -> bool:
@@ -211,6 +280,7 @@ class SequenceNode(Node):
 def create_dfs_schema(node, old_node: Node = None) -> Node:
     """
     Recursively creates a depth-first schema tree starting from the given node.
+    The trees of referenced types are shared, see get_type_node.
 
     Args:
         node (dict): Dictionary representing the node in the schema.
@@ -233,13 +303,13 @@ def create_dfs_schema(node, old_node: Node = None) -> Node:
         current_node = old_node
 
     if "superType" in node:
-        create_dfs_schema(TYPE_LIJST[node['superType']['ref']], old_node=current_node)
+        current_node.children.extend(get_type_node(node['superType']['ref']).children)
 
     if "declares" in node:
         for child in node["declares"]:
             if "propertyType" in child:
                 if 'ref' in child['propertyType']:
-                    child_node = create_dfs_schema(TYPE_LIJST[child['propertyType']['ref']])
+                    child_node = get_type_node(child['propertyType']['ref']).clone(deep=False)
                 elif 'declares' in child['propertyType']:
                     child_node = create_dfs_schema(child['propertyType'])
                 else:
@@ -252,6 +322,23 @@ def create_dfs_schema(node, old_node: Node = None) -> Node:
     return current_node
 
 
+def get_type_node(type_id) -> Node:
+    """
+    Gets the expanded tree of a type, expanding every type only once.
+
+    Args:
+        type_id: Id of the type in TYPE_LIJST.
+
+    Returns:
+        Node: Tree of the type. Its subtrees are shared by all references to the type, so the tree should be
+            cloned before changing it.
+    """
+    node = TYPE_NODES.get(type_id)
+    if node is None:
+        node = TYPE_NODES[type_id] = create_dfs_schema(TYPE_LIJST[type_id])
+    return node
+
+
 CONVERTOR = {'boolean': 'java.lang.Boolean',
              'date': 'java.sql.Date',
              'decimal': 'java.math.BigDecimal',
@@ -263,7 +350,32 @@ CONVERTOR = {'boolean': 'java.lang.Boolean',
              None: DEFAULT_TYPE}
 
 
+def init_xmlschema() -> None:
+    """
+    Imports the xmlschema classes used to build the schema tree from an XSD and clears the type caches of the previous
+    build. xmlschema is only imported on this online path, importing it takes longer than building the local schema.
+    """
+    global XsdElement, XsdComplexType, XsdList, XsdUnion, XsdGroup, XsdAttribute
+    from xmlschema.validators.elements import XsdElement
+    from xmlschema.validators.complex_types import XsdComplexType
+    from xmlschema.validators.simple_types import XsdList, XsdUnion
+    from xmlschema.validators.groups import XsdGroup
+    from xmlschema.validators.attributes import XsdAttribute
+
+    XSD_CONTENTS.clear()
+    XSD_BINDINGS.clear()
+    XSD_ENUMERATIONS.clear()
+
+
 def get_content(current_type):
+    """
+    Gets the content model (child elements, groups and attributes) of an XSD type or group, resolving it only once
+    per type.
+    """
+    content = XSD_CONTENTS.get(current_type)
+    if content is not None:
+        return content
+
     content = []
 
     if not isinstance(current_type.content, XsdList):
@@ -281,7 +393,8 @@ def get_content(current_type):
     if current_type.local_name == 'PolygonType':
         content = content[2:] + content[:2]  # For some reason Polygon is in the wrong order? Bit of a dirty hack
 
-    return list(content)
+    XSD_CONTENTS[current_type] = content
+    return content
 
 
 def get_child_node(child_type, choices, sequences):
@@ -302,19 +415,46 @@ def get_child_node(child_type, choices, sequences):
 
 
 def get_binding(current_type):
+    binding = XSD_BINDINGS.get(current_type)
+    if binding is not None:
+        return binding
+
     if isinstance(current_type, XsdUnion):
-        return get_binding(current_type.member_types[0])
+        binding = get_binding(current_type.member_types[0])
+    elif isinstance(current_type, XsdAttribute):
+        binding = get_binding(current_type.type)
+    elif current_type.id == 'integer':
+        binding = 'java.math.BigInteger'
+    elif current_type.base_type:
+        binding = get_binding(current_type.base_type)
+    else:
+        binding = CONVERTOR[current_type.id]
 
-    if isinstance(current_type, XsdAttribute):
-        return get_binding(current_type.type)
+    XSD_BINDINGS[current_type] = binding
+    return binding
+
+
+def get_enumeration(current_type):
+    """
+    Gets the codes of an XSD type, resolving them only once per type.
 
-    if current_type.id == 'integer':
-        return 'java.math.BigInteger'
+    Returns:
+        List[str] | None: The codes, or None if the type has no codelijst.
+    """
+    if current_type in XSD_ENUMERATIONS:
+        return XSD_ENUMERATIONS[current_type]
 
-    if current_type.base_type:
-        return get_binding(current_type.base_type)
+    enum = None
+    try:
+        if isinstance(current_type, XsdUnion):
+            enum = [str(e) for member in current_type.member_types for e in member.enumeration]
+        elif current_type.enumeration:
+            enum = [str(e) for e in current_type.enumeration]
+    except AttributeError:
+        pass
 
-    return CONVERTOR[current_type.id]
+    XSD_ENUMERATIONS[current_type] = enum
+    return enum
 
 
 def recursive_fill(current_node, current_type, subgroup):
@@ -354,14 +494,19 @@ def recursive_fill(current_node, current_type, subgroup):
     else:
         current_node.namespace = namespace_root(current_type.default_namespace)
 
+    if content and isinstance(current_type.content, XsdGroup):
+        group = current_type.content
+        group_max = group.max_occurs if group.max_occurs is not None else math.inf
+    else:
+        group = None
+
     for child_type in content:
         child_node, choices, sequences = get_child_node(child_type, choices, sequences)
 
         child = recursive_fill(child_node, child_type, subgroup)
-        if isinstance(current_type.content, XsdGroup):
-            child.min_amount = min(child.min_amount, current_type.content.min_occurs)
-            child.max_amount = max(child.max_amount,
-                                   current_type.content.max_occurs if current_type.content.max_occurs is not None else math.inf)
+        if group is not None:
+            child.min_amount = min(child.min_amount, group.min_occurs)
+            child.max_amount = max(child.max_amount, group_max)
 
         current_node.children.append(child)
 
@@ -372,19 +517,18 @@ def recursive_fill(current_node, current_type, subgroup):
             current_node.binding = get_binding(current_type)
         except AttributeError:
             pass
-        try:
-            if isinstance(current_type, XsdUnion):
-                current_node.enum = [str(e) for member in current_type.member_types for e in member.enumeration]
-            else:
-                if current_type.enumeration:
-                    current_node.enum = [str(e) for e in current_type.enumeration]
-        except AttributeError:
-            pass
+        enum = get_enumeration(current_type)
+        if enum is not None:
+            current_node.enum = enum
 
     return current_node
 
 
 def clean_nodes(current_node, prev_node):
+    """
+    Prefixes the gml nodes and flattens the sequences into their parent, in a single pass over the tree.
+    Sequences are kept when they are a branch of a choice with more than one child.
+    """
     if current_node.namespace is None:
         current_node.namespace = prev_node.namespace
 
@@ -395,14 +539,16 @@ def clean_nodes(current_node, prev_node):
             current_node.children = []
             current_node.binding = 'java.util.List'
 
+    children = []
     for child_node in current_node.children:
         clean_nodes(child_node, current_node)
 
-    if isinstance(current_node, SequenceNode) and (
-            not isinstance(prev_node, ChoiceNode) or len(current_node.children) <= 1):
-        index = prev_node.children.index(current_node)
-        prev_node.children = prev_node.children[:index] + current_node.children + prev_node.children[index + 1:]
-
+        if isinstance(child_node, SequenceNode) and (
+                not isinstance(current_node, ChoiceNode) or len(child_node.children) <= 1):
+            children.extend(child_node.children)
+        else:
+            children.append(child_node)
+    current_node.children = children
 
 
 def compare_nodes(node1, node2):
@@ -421,14 +567,52 @@ def compare_nodes(node1, node2):
         compare_nodes(child1, child2)
 
 
+def get_identifiers(node, current_lijst, identifiers):
+    """
+    Retrieves identifiers for data partitioning.
+
+    Args:
+        node (Node): Current node in the schema tree.
+        current_lijst (List[str]): Current list of identifiers.
+        identifiers (List[str]): List to store final identifiers.
+    """
+    # if 'choice' in node.name:
+    #     return
+
+    # Recorded for the sheets of a tree loaded from a schema artifact
+    if not current_lijst and 'identifiers' in node.__dict__:
+        identifiers.extend(node.identifiers)
+        return
+
+    relevant_children = [c for c in node.children if c.max_amount <= 1]
+
+    for c in relevant_children:
+        current_lijst.append(c.name)
+        if not c.children:
+            identifiers.append('-'.join(current_lijst))
+        else:
+            get_identifiers(c, current_lijst, identifiers)
+        del current_lijst[-1]
+
+
 def get_dfs_schema_from_url(url, xml_schema=None):
+    import xmlschema
+
     if xml_schema is None:
         xml_schema = xmlschema.XMLSchema(url)
     root_node = Node()
     root_type = xml_schema.root_elements[0]
     sub_groups = xml_schema.substitution_groups.target_dict
 
-    recursive_fill(root_node, root_type, sub_groups)
+    with SCHEMA_BUILD_LOCK:
+        init_xmlschema()
+        try:
+            recursive_fill(root_node, root_type, sub_groups)
+        finally:
+            # The caches hold on to the types of the schema
+            XSD_CONTENTS.clear()
+            XSD_BINDINGS.clear()
+            XSD_ENUMERATIONS.clear()
     clean_nodes(root_node, None)
 
     return root_node
@@ -462,11 +646,66 @@ def get_project_root():
     return cw_dir
 
 
-def get_XML_schema(omgeving):
+def get_cache_dir() -> str:
+    """
+    Gets the directory in which compiled schemas are cached between runs.
+
+    Returns:
+        str: The XLS2XML_CACHE_DIR environment variable if set, otherwise the user cache directory of the platform.
+    """
+    if os.environ.get('XLS2XML_CACHE_DIR'):
+        return os.environ['XLS2XML_CACHE_DIR']
+    if sys.platform == 'win32' and os.environ.get('LOCALAPPDATA'):
+        return os.path.join(os.environ['LOCALAPPDATA'], 'xls2xml', 'cache')
+    return os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                        'xls2xml')
+
+
+def get_XML_schema(omgeving, cache_dir=None):
+    """
+    Gets the compiled XSD schema of an omgeving.
+
+    Args:
+        omgeving (str): 'productie', 'oefen' or 'ontwikkel'.
+        cache_dir (str, optional): Directory in which the compiled schema is cached for XSD_CACHE_MAX_AGE seconds.
+            Defaults to None, meaning the schema is always downloaded and compiled.
+
+    Returns:
+        XMLSchema: The compiled XSD schema.
+    """
+    import xmlschema
+
     if omgeving == 'productie':
         omgeving = 'www'
-    xml_schema = xmlschema.XMLSchema(f'https://{omgeving}.dov.vlaanderen.be/xdov/schema/latest/xsd/kern/dov.xsd',
-                                     )
+    url = f'https://{omgeving}.dov.vlaanderen.be/xdov/schema/latest/xsd/kern/dov.xsd'
+
+    if cache_dir is None:
+        return xmlschema.XMLSchema(url)
+
+    # Compiled schemas can only be loaded by the xmlschema version that pickled them
+    filename = os.path.join(cache_dir, f'xsd_{omgeving}_{xmlschema.__version__}.pickle')
+    if os.path.exists(filename) and time.time() - os.path.getmtime(filename) < XSD_CACHE_MAX_AGE:
+        try:
+            with open(filename, 'rb') as f:
+                return pickle.load(f)
+        except Exception:
+            pass
+
+    xml_schema = xmlschema.XMLSchema(url)
+    # Caching is only an optimisation, pickling the deep object graph of a schema can fail in many ways
+    part_filename = None
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=cache_dir, delete=False) as f:
+            part_filename = f.name
+            pickle.dump(xml_schema, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(part_filename, filename)
+        part_filename = None
+    except Exception as e:
+        print(f'Could not cache the XSD schema of {omgeving} in {cache_dir}: {e!r}')
+    finally:
+        if part_filename is not None and os.path.exists(part_filename):
+            os.remove(part_filename)
 
     return xml_schema
 
@@ -478,8 +717,9 @@ def get_dfs_schema_from_local(project_root, config_filename="xsd_schema.json") -
    Returns:
        Node: Root node of the depth-first schema tree.
    """
-    init(project_root=project_root, config_filename=config_filename)
-    root = create_dfs_schema(TYPE_LIJST[dov_schema_id])
+    with SCHEMA_BUILD_LOCK:
+        init(project_root=project_root, config_filename=config_filename)
+        root = create_dfs_schema(TYPE_LIJST[dov_schema_id]).clone()
     root.min_amount = 1
     root.max_amount = 1
     clean_nodes(root, None)
@@ -487,9 +727,12 @@ def get_dfs_schema_from_local(project_root, config_filename="xsd_schema.json") -
     return root
 
 
-def get_dfs_schema(project_root=None, xsd_source="productie", mode='local', xml_schema=None) -> Node:
+def get_dfs_schema(project_root=None, xsd_source="productie", mode='local', xml_schema=None,
+                   use_artifact=True) -> Node:
     """
    Gets the depth-first schema tree.
+   The prebuilt artifact of xsd_source is used if its schema-version matches config/config.ini and it was built in
+   mode, see src/schema_artifact.py, otherwise the tree is built from the local json schema or the online XSD.
 
    Returns:
        Node: Root node of the depth-first schema tree.
@@ -497,6 +740,24 @@ def get_dfs_schema(project_root=None, xsd_source="productie", mode='local', xml_
     assert xsd_source in ('productie', 'ontwikkel', 'oefen')
     assert mode in ('local', 'online')
 
+    if use_artifact and project_root is not None:
+        from src.schema_artifact import get_artifact_filename, read_schema_artifact
+        from src.validation_cache import get_schema_version
+
+        filename = get_artifact_filename(project_root, xsd_source)
+        if os.path.exists(filename):
+            try:
+                artifact = read_schema_artifact(filename)
+                if artifact.schema_version != get_schema_version(project_root):
+                    print(f'Schema artifact {filename} is outdated, rebuilding the schema tree')
+                elif artifact.source != (mode, xsd_source):
+                    print(f'Schema artifact {filename} was built in {artifact.source[0]} mode, building the schema '
+                          f'tree in {mode} mode')
+                else:
+                    return artifact.root
+            except (OSError, ValueError) as e:
+                print(f'Could not read schema artifact {filename}: {e}')
+
     if mode == 'local':
         file = f'xsd_schema{"" if xsd_source == "productie" else "_" + xsd_source}.json'
         root = get_dfs_schema_from_local(project_root, file)
@@ -0,0 +1,233 @@
+import io
+import json
+import logging
+import os
+import time
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+PROFILE_TOP = 25  # number of functions printed by Profiler.get_top
+
+
+class StageRecord:
+    """
+    Measurements of a single stage of a conversion.
+    """
+
+    def __init__(self, stage, sheet=None):
+        self.stage = stage
+        self.sheet = sheet
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.peak_memory = None
+        self.counts = {}
+
+    def to_dict(self) -> dict:
+        return {'stage': self.stage, 'sheet': self.sheet, 'wall': self.wall, 'cpu': self.cpu,
+                'peak_memory': self.peak_memory, 'counts': self.counts}
+
+    def __str__(self) -> str:
+        memory = '' if self.peak_memory is None else f', peak {self.peak_memory / 2 ** 20:.1f} MiB'
+        counts = ''.join(f', {value} {key}' for key, value in self.counts.items())
+        sheet = '' if self.sheet is None else f' [{self.sheet}]'
+        return f'{self.stage}{sheet}: {self.wall:.3f}s wall, {self.cpu:.3f}s cpu{memory}{counts}'
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class _Stage:
+    def __init__(self, instrumentation, record):
+        self.instrumentation = instrumentation
+        self.record = record
+
+    def __enter__(self) -> StageRecord:
+        self.trace_memory = self.instrumentation.trace_memory and tracemalloc.is_tracing()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        self.cpu = time.process_time()
+        self.wall = time.perf_counter()
+        return self.record
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.record.wall = time.perf_counter() - self.wall
+        self.record.cpu = time.process_time() - self.cpu
+        if self.trace_memory:
+            self.record.peak_memory = tracemalloc.get_traced_memory()[1]
+        self.instrumentation.records.append(self.record)
+        if self.instrumentation.log:
+            logger.info('%s', self.record, extra={'xls2xml_stage': self.record.to_dict()})
+        return False
+
+
+class _NoStage:
+    def __enter__(self) -> StageRecord:
+        return StageRecord(None)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+class Instrumentation:
+    """
+    Records wall time, CPU time, peak memory and counts of every stage of a conversion, per sheet.
+
+    read_sheets and read_to_xml enter it as a context manager, so memory allocations are only traced while they run:
+
+        instrumentation = Instrumentation()
+        rapport = read_to_xml(input_file, output_file, instrumentation=instrumentation)
+        print(instrumentation)
+    """
+
+    def __init__(self, trace_memory=True, log=False):
+        """
+        Args:
+            trace_memory (bool, optional): Record the peak memory allocated by Python in every stage, with
+                tracemalloc. This slows the conversion down. Defaults to True.
+            log (bool, optional): Emit every record as an INFO logging record of this module, with the record as
+                dict in its xls2xml_stage attribute. Defaults to False.
+        """
+        self.trace_memory = trace_memory
+        self.log = log
+        self.records = []
+        self._depth = 0
+        self._started_tracing = False
+
+    def __enter__(self):
+        if self._depth == 0 and self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._depth -= 1
+        if self._depth == 0 and self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        return False
+
+    def stage(self, stage, sheet=None) -> _Stage:
+        """
+        Measures a stage, the counts can be set on the StageRecord returned when entering the stage.
+
+        Args:
+            stage (str): Name of the stage.
+            sheet (str, optional): Sheet the stage works on. Defaults to None.
+        """
+        return _Stage(self, StageRecord(stage, sheet))
+
+    def get_totals(self) -> dict:
+        """
+        Sums the wall and CPU time of every stage over all sheets.
+
+        Returns:
+            Dict[str, Dict[str, float]]: Wall and CPU time, keyed by stage.
+        """
+        totals = {}
+        for record in self.records:
+            total = totals.setdefault(record.stage, {'wall': 0.0, 'cpu': 0.0})
+            total['wall'] += record.wall
+            total['cpu'] += record.cpu
+        return totals
+
+    def to_dict(self) -> dict:
+        return {'stages': [record.to_dict() for record in self.records], 'totals': self.get_totals()}
+
+    def to_json(self, filename) -> None:
+        with open(filename, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def __str__(self) -> str:
+        return '\n'.join(str(record) for record in self.records)
+
+    def __repr__(self) -> str:
+        return f'Instrumentation({len(self.records)} stages)'
+
+
+class NoInstrumentation:
+    """
+    Instrumentation that records nothing, used when a conversion is not instrumented.
+    """
+    records = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def stage(self, stage, sheet=None) -> _NoStage:
+        return NO_STAGE
+
+
+NO_STAGE = _NoStage()
+NO_INSTRUMENTATION = NoInstrumentation()
+
+
+class Profiler:
+    """
+    Profiles the code run in its context with cProfile, or with the pyinstrument sampling profiler if requested and
+    installed, and writes the profile next to the output file of the conversion:
+
+        with Profiler('results/result.xml') as profiler:
+            read_to_xml(input_file, 'results/result.xml')
+        print(profiler.get_top())
+
+    Profilers only see the thread in which they were entered, so enter it in the thread that runs the conversion.
+    """
+
+    def __init__(self, output_filename, sampling=False):
+        """
+        Args:
+            output_filename (str): Output file of the conversion, the profile is written to the same path with the
+                extension .pstats (cProfile) or .speedscope.json (pyinstrument).
+            sampling (bool, optional): Use pyinstrument, which has less overhead, instead of cProfile. Falls back to
+                cProfile if pyinstrument is not installed. Defaults to False.
+        """
+        self.base = os.path.splitext(output_filename)[0]
+        self.filename = None
+        self._profiler = None
+        self._sampler = None
+        if sampling:
+            try:
+                import pyinstrument
+                self._sampler = pyinstrument.Profiler()
+            except ImportError:
+                print('pyinstrument is not installed, profiling with cProfile')
+
+    def __enter__(self):
+        if self._sampler is not None:
+            self._sampler.start()
+        else:
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._sampler is not None:
+            from pyinstrument.renderers import SpeedscopeRenderer
+
+            self._sampler.stop()
+            self.filename = f'{self.base}.speedscope.json'
+            with open(self.filename, 'w', encoding='utf-8') as f:
+                f.write(self._sampler.output(SpeedscopeRenderer()))
+        else:
+            self._profiler.disable()
+            self.filename = f'{self.base}.pstats'
+            self._profiler.dump_stats(self.filename)
+        return False
+
+    def get_top(self, n=PROFILE_TOP) -> str:
+        """
+        Formats the n functions with the highest cumulative time, or the call tree of the sampling profiler.
+        """
+        if self._sampler is not None:
+            return self._sampler.output_text()
+
+        import pstats
+
+        stream = io.StringIO()
+        pstats.Stats(self._profiler, stream=stream).sort_stats('cumulative').print_stats(n)
+        return stream.getvalue()
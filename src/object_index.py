@@ -0,0 +1,155 @@
+import json
+import math
+import os
+
+INDEX_VERSION = 2
+
+
+def identifier_to_str(value):
+    """
+    Converts an identifier value to the text it is compared by, or None if it is empty. Numeric columns with empty
+    cells are read as floats, so integral floats are written without decimals: 12, 12.0 and '12' are the same value.
+    """
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def get_index_filename(filename) -> str:
+    """
+    Gets the path of the object index of a workbook, next to the workbook.
+    """
+    return f'{os.path.splitext(filename)[0]}.objects.json'
+
+
+def get_fingerprint(filename) -> list:
+    """
+    Identifies the version of a file by its size and modification time.
+    """
+    stat = os.stat(filename)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class ObjectIndex:
+    """
+    Index of the top-level objects of the sheets of a workbook. Every object is stored with the values of the
+    identifier columns of its first row (see get_identifiers) and the ranges of its Excel row numbers, so a selection
+    of objects can be converted by reading only their rows:
+
+        object_index = ObjectIndex.load('data/template.xlsx', 'productie:1.0')
+        rows = object_index.get_rows('boring', ['B-001', {'identificatie': 'B-002'}])
+
+    The index is stored as JSON next to the workbook, and is discarded when the workbook or the schema changes.
+    """
+
+    def __init__(self, filename, schema):
+        """
+        Args:
+            filename (str): Path to the Excel file.
+            schema (str): XSD source and version of the schema the objects were partitioned with.
+        """
+        self.filename = filename
+        self.schema = schema
+        self.fingerprint = get_fingerprint(filename)
+        self.sheets = {}
+        self.changed = False
+
+    @classmethod
+    def load(cls, filename, schema):
+        """
+        Loads the index of a workbook, or creates an empty index if it has none or the workbook or schema changed.
+
+        Args:
+            filename (str): Path to the Excel file.
+            schema (str): XSD source and version of the schema.
+
+        Returns:
+            ObjectIndex: The index.
+        """
+        object_index = cls(filename, schema)
+        index_filename = get_index_filename(filename)
+        if os.path.exists(index_filename):
+            try:
+                with open(index_filename, encoding='utf-8') as f:
+                    stored = json.load(f)
+            except (OSError, ValueError):
+                return object_index
+            if (stored.get('version') == INDEX_VERSION and stored.get('schema') == schema and
+                    stored.get('fingerprint') == object_index.fingerprint):
+                object_index.sheets = stored['sheets']
+        return object_index
+
+    def save(self) -> None:
+        """
+        Writes the index next to the workbook, if sheets were added since it was loaded.
+        """
+        if not self.changed:
+            return
+        with open(get_index_filename(self.filename), 'w', encoding='utf-8') as f:
+            json.dump({'version': INDEX_VERSION, 'schema': self.schema, 'fingerprint': self.fingerprint,
+                       'sheets': self.sheets}, f, ensure_ascii=False)
+        self.changed = False
+
+    def add_sheet(self, sheet, identifiers, objects) -> None:
+        """
+        Adds or replaces the objects of a sheet.
+
+        Args:
+            sheet (str): Name of the sheet.
+            identifiers (List[str]): Identifier columns of the sheet.
+            objects (List[Tuple[List[str | None], List[Tuple[int, int]]]]): Identifier values and row ranges of every
+                object, in the order of the sheet.
+        """
+        self.sheets[sheet] = {'identifiers': list(identifiers),
+                              'objects': [[list(values), [list(r) for r in rows]] for values, rows in objects]}
+        self.changed = True
+
+    def find(self, sheet, selectors) -> list:
+        """
+        Finds the objects of a sheet matching any of the selectors.
+
+        Args:
+            sheet (str): Name of an indexed sheet.
+            selectors (Iterable[str | Dict[str, str]]): A value of the first identifier column, or values of several
+                identifier columns, of every object to find.
+
+        Returns:
+            List[int]: Positions of the objects in the sheet.
+        """
+        identifiers = self.sheets[sheet]['identifiers']
+        objects = self.sheets[sheet]['objects']
+        if not identifiers:
+            raise ValueError(f'Sheet {sheet} has no identifiers to select objects by')
+        found = set()
+        for selector in selectors:
+            if not isinstance(selector, dict):
+                selector = {identifiers[0]: selector}
+            unknown = [column for column in selector if column not in identifiers]
+            if unknown:
+                raise ValueError(f'{", ".join(unknown)} are no identifiers of sheet {sheet}')
+            selector = [(identifiers.index(column), identifier_to_str(value)) for column, value in selector.items()]
+
+            matches = [i for i, (values, _) in enumerate(objects) if all(values[j] == value for j, value in selector)]
+            if not matches:
+                print(f'No {sheet} object {dict((identifiers[j], v) for j, v in selector)} found.')
+            found.update(matches)
+        return sorted(found)
+
+    def get_rows(self, sheet, selectors) -> list:
+        """
+        Gets the Excel row numbers of the objects of a sheet matching any of the selectors, see find.
+
+        Returns:
+            List[int]: Sorted row numbers.
+        """
+        objects = self.sheets[sheet]['objects']
+        return sorted(row for i in self.find(sheet, selectors)
+                      for first, last in objects[i][1] for row in range(first, last + 1))
+
+    def __contains__(self, sheet) -> bool:
+        return sheet in self.sheets
+
+    def __repr__(self) -> str:
+        return f'ObjectIndex({self.filename}, {len(self.sheets)} sheets)'
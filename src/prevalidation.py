@@ -0,0 +1,196 @@
+from src.dfs_schema import ChoiceNode, SequenceNode
+
+
+class PreValidationError(ValueError):
+    """
+    Raised for objects that violate constraints already known by the dfs schema.
+    """
+
+    def __init__(self, messages, element=None):
+        super().__init__('\n'.join(messages))
+        self.messages = messages
+        self.element = element
+
+
+def normalize_code(value):
+    """
+    Collapses whitespace in a code, the way the XSD token types normalize it.
+    """
+    return ' '.join(value.split())
+
+
+def is_required(node) -> bool:
+    """
+    Checks whether a branch of a choice needs at least one element when it is chosen.
+
+    Args:
+        node (Node): Branch of a choice.
+
+    Returns:
+        bool: True if an empty branch would be invalid.
+    """
+    if node.min_amount == 0:
+        return False
+    if isinstance(node, (ChoiceNode, SequenceNode)):
+        return any(is_required(c) for c in node.children)
+    return True
+
+
+def get_keys(node) -> list:
+    """
+    Retrieves the keys a (group) node contributes to the json dict of its parent element.
+    """
+    if isinstance(node, (ChoiceNode, SequenceNode)):
+        return [key for c in node.children for key in get_keys(c)]
+    return [node.name]
+
+
+def count_values(value) -> int:
+    if isinstance(value, list):
+        return len(value)
+    return 0 if value is None else 1
+
+
+class ElementChecker:
+    """
+    Checks the json dict of an element against the cardinalities and codelijsten of its dfs schema node.
+
+    Checkers are compiled once per schema node and only report violations that the XSD would report as well:
+    keys that occur more than once in the content model of an element are not checked, nor are non-string codes.
+    """
+
+    def __init__(self, node):
+        self.name = node.name
+        keys = get_keys(node)
+        self.ambiguous = {key for key in keys if keys.count(key) > 1}
+        self.children = {}
+        self.enums = {}
+        self.rules = []
+        self._compile_group(node, self.rules, required=True, factor=1)
+
+    def _compile_group(self, node, rules, required, factor):
+        for c in node.children:
+            if isinstance(c, ChoiceNode):
+                if self.ambiguous.intersection(get_keys(c)):
+                    continue
+                branches = []
+                for branch in c.children:
+                    branch_rules = []
+                    self._compile_group(_as_group(branch), branch_rules, required=c.max_amount <= 1,
+                                        factor=factor * c.max_amount)
+                    branches.append((branch, get_keys(branch), branch_rules))
+                rules.append(('choice', c, required, branches))
+            elif isinstance(c, SequenceNode):
+                self._compile_group(c, rules, required=required and c.min_amount > 0, factor=factor * c.max_amount)
+            elif c.name not in self.ambiguous:
+                rules.append(('element', c, required, factor * c.max_amount))
+                if c.children:
+                    self.children[c.name] = c
+                elif c.enum:
+                    self.enums[c.name] = set(c.enum)
+
+    def check(self, obj, path, messages, checkers) -> None:
+        """
+        Checks a json dict and appends a message for every violation.
+
+        Args:
+            obj (dict): Json dict of the element.
+            path (str): Path of the element, used in the messages.
+            messages (List[Tuple[str, str]]): Element names and messages of the violations, filled in place.
+            checkers (dict): Compiled checkers of the nested elements, keyed by schema node.
+        """
+        self._check_rules(self.rules, obj, path, messages)
+
+        for key, values in obj.items():
+            if not isinstance(values, list):
+                continue
+            if key in self.enums:
+                codes = self.enums[key]
+                for value in values:
+                    if isinstance(value, str) and value not in codes and normalize_code(value) not in codes:
+                        messages.append((key, f"Value '{value}' of {path}/{key} is not in the codelijst"))
+            elif key in self.children:
+                child_checker = get_checker(self.children[key], checkers)
+                for i, value in enumerate(values):
+                    if isinstance(value, dict):
+                        child_path = f'{path}/{key}' if len(values) == 1 else f'{path}/{key}[{i + 1}]'
+                        child_checker.check(value, child_path, messages, checkers)
+
+    def _check_rules(self, rules, obj, path, messages):
+        for rule in rules:
+            if rule[0] == 'element':
+                _, c, required, max_amount = rule
+                n = count_values(obj.get(c.name))
+                if required and c.min_amount > n:
+                    messages.append((c.name, f"Mandatory element '{c.name}' is missing in {path}"
+                                     if n == 0 else
+                                     f"'{c.name}' occurs {n} times in {path}, at least {c.min_amount} required"))
+                elif n > max_amount:
+                    messages.append((c.name, f"'{c.name}' occurs {n} times in {path}, at most {max_amount} allowed"))
+            else:
+                _, c, required, branches = rule
+                present = [any(key in obj for key in keys) for _, keys, _ in branches]
+                names = ', '.join(f"'{key}'" for branch, _, _ in branches for key in get_keys(branch))
+                if c.max_amount <= 1 and sum(present) > 1:
+                    messages.append((self.name, f'Only one of {names} is allowed in {path}'))
+                elif required and c.min_amount > 0 and not any(present) and \
+                        all(is_required(branch) for branch, _, _ in branches):
+                    messages.append((self.name, f'One of {names} is mandatory in {path}'))
+                elif c.max_amount <= 1 and c.validate(present):
+                    self._check_rules(branches[present.index(True)][2], obj, path, messages)
+
+
+def _as_group(node):
+    """
+    Wraps a plain branch of a choice into a sequence, so a branch can be compiled as a group.
+    """
+    if isinstance(node, (ChoiceNode, SequenceNode)):
+        return node
+    group = SequenceNode()
+    group.min_amount, group.max_amount = 1, 1
+    group.children = [node]
+    return group
+
+
+def get_checker(node, checkers) -> ElementChecker:
+    """
+    Retrieves the compiled checker of a schema node, compiling it on first use.
+    """
+    checker = checkers.get(node)
+    if checker is None:
+        checker = checkers[node] = ElementChecker(node)
+    return checker
+
+
+class PreValidator:
+    """
+    Validates objects against the dfs schema before the (much slower) XSD validation.
+    """
+
+    def __init__(self, dfs_schema):
+        self.dfs_schema = dfs_schema
+        self.checkers = {}
+
+    def check(self, key, subject):
+        """
+        Checks an object of a type.
+
+        Args:
+            key (str): Type of the object, i.e. the name of a child of the dfs schema root.
+            subject (dict): Json dict of the object.
+
+        Raises:
+            PreValidationError: If the object violates a constraint of the dfs schema.
+        """
+        try:
+            node = self.dfs_schema.get_specific_child(key)
+        except ValueError:
+            return
+        if not node.children or not isinstance(subject, dict):
+            return
+
+        messages = []
+        get_checker(node, self.checkers).check(subject, key, messages, self.checkers)
+        if messages:
+            raise PreValidationError([m for _, m in messages], element=messages[0][0])
+
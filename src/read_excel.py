@@ -1,20 +1,50 @@
+import datetime
+import functools
+import json
 import math
+import re
 from collections import defaultdict
 import xmlschema
 import pandas as pd
 import numpy as np
-from src.dfs_schema import ChoiceNode, SequenceNode, get_dfs_schema, get_XML_schema
+from src.dfs_schema import ChoiceNode, SequenceNode, get_dfs_schema, get_XML_schema, get_identifiers
 from pathlib import Path
 import os
 import warnings
 import dateutil.parser as parser
-from decimal import Decimal, getcontext
+from decimal import Decimal, Context, localcontext
 from ordered_set import OrderedSet
-from src.validation import Validator
+from src.validation import Validator, SourceLocation, CodelijstIssue
+from src.validation_cache import ValidationCache, get_schema_version
+from src.instrumentation import NO_INSTRUMENTATION
+from src.object_index import ObjectIndex, identifier_to_str
+from src.references import ReferenceIndex
+from src.xml_chunks import get_chunks
 
 warnings.filterwarnings("ignore", message="Data Validation extension is not supported and will be removed")
 
 PROJECT_ROOT = Path(os.path.dirname(os.path.dirname(__file__)))
+WRITE_CHUNK_SIZE = 1 << 20
+TABLE_EXTENSIONS = ('.parquet', '.csv')  # in order of preference when a directory holds both for a sheet
+RAW_BINDINGS = ('java.lang.Boolean', 'java.lang.Double')  # bindings of columns whose type is inferred by the reader
+SERIAL_BINDINGS = ('java.sql.Date', 'java.sql.Time')  # bindings of columns in which tabular sources hold Excel serials
+PARSE_CACHE_SIZE = 1 << 16  # number of distinct date and time strings of which the parsed value is kept
+EXCEL_EPOCH = datetime.datetime(1899, 12, 30)  # day 0 of Excel serial dates, day 60 is the non-existent 1900-02-29
+
+# Formats parsed without dateutil, with the same result as dateutil.parser.parse(..., dayfirst=True)
+_TIME_PATTERN = r'(\d{1,2}):(\d{2})(?::(\d{2})(?:\.\d+)?)?'
+DAYFIRST_DATE = re.compile(r'\s*(\d{1,2})([/.-])(\d{1,2})\2(\d{4})(?:[ T]' + _TIME_PATTERN + r')?\s*')
+ISO_DATE = re.compile(r'\s*(\d{4})-(\d{1,2})-(\d{1,2})(?:[ T]' + _TIME_PATTERN + r')?\s*')
+TIME = re.compile(r'\s*' + _TIME_PATTERN + r'\s*')
+PLAIN_DECIMAL = re.compile(r'([+-]?)([0-9]*)(?:\.([0-9]*))?')
+DECIMAL_PLACES = 50  # BigDecimal values are rounded to this number of decimal places
+DECIMAL_CONTEXT = Context()  # decimal context of parse_float, independent of the context of the calling thread
+
+
+class ConversionCancelled(Exception):
+    """
+    Raised by a progress callback to stop a running conversion.
+    """
 
 
 class DataNode:
@@ -26,6 +56,7 @@ class DataNode:
         self.name = name
         self.children = defaultdict(list)
         self.data = []
+        self.rows = []
 
     def is_empty(self) -> bool:
         """
@@ -52,31 +83,222 @@ class DataNode:
         for key in to_pop:
             self.children.pop(key)
 
+    def collect_rows(self, current_lijst, columns) -> None:
+        """
+        Collects the source rows of every leaf value below this node, per column.
+
+        Args:
+            current_lijst (List[str]): Current list of column name parts.
+            columns (defaultdict): Mapping of column name to a list of row ranges, filled in place.
+        """
+        if self.data:
+            columns['-'.join(current_lijst)] += self.rows
+
+        for key, property_children in self.children.items():
+            current_lijst.append(key)
+            for child in property_children:
+                child.collect_rows(current_lijst, columns)
+            del current_lijst[-1]
+
     def __repr__(self) -> str:
         return f'DataNode(name={self.name}, children=[{", ".join(str(key) + ":" + str(len(val)) for key, val in self.children.items() if len(val) > 0)}], data={self.data})'
 
 
+def get_row_ranges(rows) -> list:
+    """
+    Compresses sorted row numbers into inclusive (first, last) ranges.
+
+    Args:
+        rows (Iterable[int]): Sorted row numbers.
+
+    Returns:
+        List[Tuple[int, int]]: Inclusive row ranges.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    if rows.size == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(rows) != 1)
+    firsts = rows[np.concatenate(([0], breaks + 1))]
+    lasts = rows[np.concatenate((breaks, [rows.size - 1]))]
+    return list(zip(firsts.tolist(), lasts.tolist()))
+
+
+def match_datetime(s):
+    """
+    Parses the formats of DAYFIRST_DATE and ISO_DATE, which are most of the dates in the workbooks.
+
+    Args:
+        s (str): Date, optionally followed by a time.
+
+    Returns:
+        datetime.datetime: The date as dateutil parses it with dayfirst=True, or None if s has another format or is
+            not a valid date, to leave it (and its error) to dateutil.
+    """
+    match = DAYFIRST_DATE.fullmatch(s)
+    if match is not None:
+        day, _, month, year, hour, minute, second = match.groups()
+    else:
+        match = ISO_DATE.fullmatch(s)
+        if match is None:
+            return None
+        year, month, day, hour, minute, second = match.groups()
+        # dateutil reads yyyy-mm-dd as yyyy-dd-mm with dayfirst, unless the last number can not be a month
+        if int(day) <= 12:
+            month, day = day, month
+    if int(month) > 12:
+        # dateutil swaps day and month, or fails
+        return None
+
+    try:
+        return datetime.datetime(int(year), int(month), int(day), int(hour or 0), int(minute or 0),
+                                 int(second or 0))
+    except ValueError:
+        return None
+
+
+def from_excel_serial(serial) -> datetime.datetime:
+    return EXCEL_EPOCH + datetime.timedelta(seconds=round(serial * 86400))
+
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_date_string(s) -> str:
+    d = match_datetime(s)
+    if d is None:
+        d = parser.parse(s, dayfirst=True)
+    return d.strftime("%Y-%m-%d")
+
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_time_string(s) -> str:
+    match = TIME.fullmatch(s)
+    if match is not None:
+        hour, minute, second = (int(n or 0) for n in match.groups())
+        if hour < 24 and minute < 60 and second < 60:
+            return f'{hour:02d}:{minute:02d}:{second:02d}'
+        t = None
+    else:
+        t = match_datetime(s)
+    if t is None:
+        t = parser.parse(s, dayfirst=True)
+    return t.strftime("%H:%M:%S")
+
+
+def is_number(value) -> bool:
+    return isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, bool)
+
+
 def parse_date(d):
     if isinstance(d, str):
-        d = parser.parse(d, dayfirst=True)
+        return parse_date_string(d)
+    if is_number(d):
+        # A number typed in a date cell of a workbook, e.g. only the year, is not a date. Serial dates of tabular
+        # sources are converted by read_table.
+        raise ValueError(f'{d} is not a date')
     return d.strftime("%Y-%m-%d")
 
 
 def parse_time(t):
     if isinstance(t, str):
-        t = parser.parse(t, dayfirst=True)
+        return parse_time_string(t)
+    if is_number(t):
+        raise ValueError(f'{t} is not a time')
     return t.strftime("%H:%M:%S")
 
 
-def parse_float(f):
-    getcontext().prec = 26
-    f = str(f).replace(',', '.').replace(' ', '')
-    t = format(Decimal(f), '.50f').rstrip('0').rstrip('.')
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def format_decimal(s) -> str:
+    """
+    Formats a number as a BigDecimal, without exponent and with at least one decimal.
+
+    Args:
+        s (str): The number, with ',' or '.' as decimal separator and optionally spaces between the digits.
+
+    Returns:
+        str: The number rounded to DECIMAL_PLACES decimals, without trailing zeros.
+    """
+    s = s.replace(',', '.').replace(' ', '')
+    match = PLAIN_DECIMAL.fullmatch(s)
+    if match is not None:
+        sign, integer, fraction = match.groups()
+        fraction = fraction or ''
+        if (integer or fraction) and len(fraction) <= DECIMAL_PLACES:
+            return f"{'-' if sign == '-' else ''}{integer.lstrip('0') or '0'}.{fraction.rstrip('0') or '0'}"
+
+    # Exponents, long fractions and values that are not numbers
+    with localcontext(DECIMAL_CONTEXT):
+        t = format(Decimal(s), f'.{DECIMAL_PLACES}f').rstrip('0').rstrip('.')
     if '.' not in t:
         t += '.0'
     return t
 
 
+def parse_float(f):
+    return format_decimal(str(f))
+
+
+def parse_coordinates(cells):
+    """
+    Parses java.util.List cells, numbers separated by commas or spaces such as gml:posList, of a column at once.
+
+    Args:
+        cells (Sequence[str]): The cells.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The numbers of all cells as a single float array, and the offsets of the cells
+            in it, the numbers of cell i are coordinates[offsets[i]:offsets[i + 1]].
+    """
+    tokens = []
+    counts = []
+    for cell in cells:
+        cell_tokens = [token for token in cell.replace(',', ' ').split(' ') if token]
+        tokens += cell_tokens
+        counts.append(len(cell_tokens))
+    try:
+        coordinates = np.array(tokens, dtype=np.float64)
+    except ValueError:
+        # Raises the error of float for the invalid number
+        coordinates = np.array([float(token) for token in tokens], dtype=np.float64)
+    return coordinates, np.concatenate(([0], np.cumsum(counts, dtype=np.int64)))
+
+
+def parse_list(x):
+    return parse_coordinates([x])[0].tolist()
+
+
+def get_list_cells(cells):
+    """
+    Finds the java.util.List cells of a column that parse_coordinates parses at once.
+
+    Args:
+        cells (pd.Series): The cells.
+
+    Returns:
+        np.ndarray: Mask of the non-empty cells, or None if a cell is neither a string nor empty, which is left to
+            clean_data.
+    """
+    present = np.fromiter((isinstance(d, str) for d in cells), dtype=bool, count=len(cells))
+    if all(isinstance(d, float) and math.isnan(d) for d in cells[~present]):
+        return present
+    return None
+
+
+def unique_coordinates(coordinates) -> list:
+    """
+    Removes repeated numbers, keeping the first of each, like adding the numbers to an OrderedSet.
+
+    Args:
+        coordinates (np.ndarray): Float array.
+
+    Returns:
+        List[float]: The distinct numbers in the order of their first occurrence.
+    """
+    if np.isnan(coordinates).any():
+        # NaN is not equal to itself, so none of them is a repetition
+        return list(OrderedSet(coordinates.tolist()))
+    first = np.unique(coordinates, return_index=True)[1]
+    return coordinates[np.sort(first)].tolist()
+
+
 def parse_double(f):
     if isinstance(f, str):
         f = f.replace(',', '.').replace(' ', '')
@@ -108,7 +330,7 @@ def clean_data(data, schema_node):
                    'java.lang.String': lambda x: str(x),
                    'java.net.URI': lambda x: str(x),
                    'java.sql.Time': parse_time,
-                   'java.util.List': lambda x: list(float(l) for k in x.split(',') for l in k.split(' ') if l != ''),
+                   'java.util.List': parse_list,
                    'java.lang.Object': lambda x: str(x)}
 
         binding = schema_node.binding
@@ -124,90 +346,399 @@ def clean_data(data, schema_node):
         return data
 
 
-def get_identifiers(node, current_lijst, identifiers):
+def get_leaf_columns(node, current_lijst, columns):
     """
-    Retrieves identifiers for data partitioning.
+    Retrieves the column names of all leaves below a node, as used in the Excel templates.
 
     Args:
         node (Node): Current node in the schema tree.
-        current_lijst (List[str]): Current list of identifiers.
-        identifiers (List[str]): List to store final identifiers.
+        current_lijst (List[str]): Current list of column name parts.
+        columns (List[Tuple[str, Node]]): List to store the column names and their leaf nodes.
     """
-    # if 'choice' in node.name:
-    #     return
-
-    relevant_children = [c for c in node.children if c.max_amount <= 1]
-
-    for c in relevant_children:
+    for c in node.children:
         current_lijst.append(c.name)
         if not c.children:
-            identifiers.append('-'.join(current_lijst))
+            columns.append(('-'.join(current_lijst), c))
         else:
-            get_identifiers(c, current_lijst, identifiers)
+            get_leaf_columns(c, current_lijst, columns)
         del current_lijst[-1]
 
 
-def get_partition(df, filter, current_lijst, node):
+def check_codelijsten(df, sheet, node):
     """
-    Performs data partitioning based on identifiers.
+    Checks all codelijst columns of a sheet at once for codes that are not in the codelijst.
 
     Args:
-        df (pd.DataFrame): DataFrame containing data.
-        filter (np.ndarray): Boolean filter indicating relevant rows.
-        current_lijst (List[str]): Current list of identifiers.
-        node (Node): Current node in the schema tree.
+        df (pd.DataFrame): DataFrame containing the data of the sheet, indexed by row number.
+        sheet (str): Name of the sheet.
+        node (Node): Schema node of the sheet.
 
     Returns:
-        List[np.ndarray]: List of filters for data partitioning.
+        List[CodelijstIssue]: One issue per unknown code per column.
+    """
+    columns = []
+    get_leaf_columns(node, [], columns)
+
+    issues = []
+    for column, leaf in columns:
+        if not leaf.enum or column not in df.columns:
+            continue
+        values = df[column]
+        codes, uniques = factorize(values)
+        if len(uniques) == 0:
+            continue
+
+        enum = set(leaf.enum)
+        unknown = []
+        for i, value in enumerate(uniques):
+            code = clean_data(value, leaf)
+            if isinstance(code, str) and code not in enum and ' '.join(code.split()) not in enum:
+                unknown.append((i, code))
+        if not unknown:
+            continue
+
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        rows = values.index.to_numpy()
+        for i, code in unknown:
+            issues.append(CodelijstIssue(sheet, column, code, int(counts[i]), get_row_ranges(rows[codes == i])))
+    return issues
+
+
+def get_table_files(source):
+    """
+    Gets the CSV or Parquet file of every sheet of a tabular source.
+
+    Args:
+        source (str | dict): Directory holding a <sheet>.csv or <sheet>.parquet file per sheet, a single such file,
+            or a mapping of sheet name to file.
+
+    Returns:
+        Dict[str, str]: Path of the file of every sheet, or None if source is an Excel file.
+    """
+    if isinstance(source, dict):
+        return {sheet: os.fspath(path) for sheet, path in source.items()}
+
+    if os.path.isdir(source):
+        names = sorted(os.listdir(source))
+        files = {}
+        for extension in reversed(TABLE_EXTENSIONS):
+            files.update({os.path.splitext(name)[0]: os.path.join(source, name) for name in names
+                          if os.path.splitext(name)[1].lower() == extension})
+        return files
+
+    sheet, extension = os.path.splitext(os.path.basename(os.fspath(source)))
+    if extension.lower() in TABLE_EXTENSIONS:
+        return {sheet: os.fspath(source)}
+    return None
+
+
+def read_table(filename, node, engine=None) -> pd.DataFrame:
+    """
+    Reads the data of a sheet from a CSV or Parquet file whose columns are named like the first row of the Excel
+    templates, without header rows. CSV columns are read as text, unless the type of their leaf is better inferred by
+    the reader (RAW_BINDINGS), so clean_data sees the values as written. Numbers in date and time columns are read
+    as Excel serial dates and times.
+
+    Args:
+        filename (str): Path to the CSV or Parquet file.
+        node (Node): Schema node of the sheet.
+        engine (str, optional): Reader of CSV files, 'pyarrow' or 'c'. Defaults to None, meaning pyarrow if it is
+            installed.
+
+    Returns:
+        pd.DataFrame: Data of the sheet, indexed by line number (CSV) or row number (Parquet), missing values as NaN.
+    """
+    from importlib.util import find_spec
+
+    if engine is None:
+        engine = 'pyarrow' if find_spec('pyarrow') is not None else 'c'
+    columns = []
+    get_leaf_columns(node, [], columns)
+    if filename.lower().endswith('.parquet'):
+        df = pd.read_parquet(filename)
+        first_row = 1
+    else:
+        header = set(pd.read_csv(filename, nrows=0).columns)
+        text_columns = [column for column, leaf in columns if column in header and leaf.binding not in RAW_BINDINGS]
+        if engine == 'pyarrow':
+            from pyarrow import csv, string
+
+            # pandas would convert the values pyarrow inferred to str, e.g. 0012 to 12, so pyarrow reads text
+            # columns as strings itself
+            df = csv.read_csv(filename, convert_options=csv.ConvertOptions(
+                column_types={column: string() for column in text_columns}, strings_can_be_null=True)).to_pandas()
+        else:
+            df = pd.read_csv(filename, dtype={column: str for column in text_columns}, engine=engine)
+        first_row = 2
+
+    df = df.astype(object)
+    df = df.where(df.notna(), np.nan)
+    # Dates and times exported as numbers are Excel serials
+    for column, leaf in columns:
+        if column in df.columns and leaf.binding in SERIAL_BINDINGS:
+            # Kept as objects, so missing values stay NaN instead of NaT
+            df[column] = pd.Series([from_excel_serial(v) if is_number(v) and not math.isnan(v) else v
+                                    for v in df[column]], index=df.index, dtype=object)
+    df.index = pd.RangeIndex(first_row, first_row + df.shape[0])
+    return df
+
+
+def read_excel_rows(filename, sheet, rows) -> pd.DataFrame:
     """
+    Reads rows of a sheet by their Excel row numbers. The sheet is only read up to the last of the rows.
 
+    Args:
+        filename (str): Path to the Excel file.
+        sheet (str): Name of the sheet.
+        rows (List[int]): Sorted Excel row numbers, below the column names.
+
+    Returns:
+        pd.DataFrame: The rows, indexed by row number.
+    """
+    last = rows[-1] if rows else 1
+    df = pd.read_excel(filename, sheet_name=sheet, dtype={'meetnet': str}, nrows=last - 1)
+    df.index = pd.RangeIndex(2, 2 + df.shape[0])
+    return df.loc[rows]
+
+
+def get_object_identifiers(df, partition, node) -> tuple:
+    """
+    Gets the identifier values and rows of the top-level objects of a sheet, for an ObjectIndex.
+
+    Args:
+        df (pd.DataFrame): DataFrame containing the data of the sheet, indexed by row number.
+        partition (List[np.ndarray]): Filter of every object, see get_partition.
+        node (Node): Schema node of the sheet.
+
+    Returns:
+        Tuple[List[str], List[Tuple[List[str | None], List[Tuple[int, int]]]]]: The identifier columns of the sheet,
+            and the values of these columns in the first row and the row ranges of every object.
+    """
     identifiers = []
-    get_identifiers(node, current_lijst, identifiers)
-    possibilities = OrderedSet()
+    get_identifiers(node, [], identifiers)
     identifiers = [i for i in identifiers if i in df.columns]
 
-    last_row = None
-    for i, row in df[filter].loc[:, identifiers].iterrows():
-        if last_row is None or not all(
-                [(x == y or (isinstance(x, float) and math.isnan(x))) for x, y in zip(tuple(row), last_row)]):
-            last_row = tuple(row)
-            possibilities.add(tuple(row.replace(np.nan, None)))
+    index = df.index.to_numpy()
+    first_rows = df[identifiers].iloc[[int(np.argmax(part)) for part in partition]]
+    objects = []
+    for part, values in zip(partition, first_rows.itertuples(index=False, name=None)):
+        values = [identifier_to_str(v) for v in values]
+        objects.append((values, get_row_ranges(index[part])))
+    return identifiers, objects
 
-    pos2index = {pos: i for i, pos in enumerate(possibilities)}
-    new_filters = [np.zeros(df.shape[0], dtype=bool) for _ in possibilities]
 
-    prev_row = None
-    prev_pos = None
+def get_code_dtype(n_values):
+    """
+    Gets the smallest signed integer type that holds the codes of n_values values and the -1 of empty cells.
+    """
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_values <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def factorize(values) -> tuple:
+    """
+    Encodes a column as integer codes (-1 for empty cells) and its distinct values, in the order of their first row.
+    Unlike pd.factorize, values of a different type are distinct, as in recursive_data_read: 1, 1.0 and True are equal
+    but cleaned differently.
+
+    Args:
+        values (pd.Series): The column.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Code of every row, and the value of every code.
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    if values.dtype != object or len(uniques) == 0:
+        return codes, uniques
+    type_codes, types = pd.factorize(values.map(type, na_action='ignore'), use_na_sentinel=True)
+    if len(types) == 1:
+        return codes, uniques
+
+    # Codes of the (value, type) pairs
+    valid = codes >= 0
+    pair_codes = pd.factorize(codes[valid] * len(types) + type_codes[valid])[0]
+    codes = np.full(len(codes), -1, dtype=pair_codes.dtype)
+    codes[valid] = pair_codes
+    first = np.unique(pair_codes, return_index=True)[1]
+    return codes, values.to_numpy()[np.flatnonzero(valid)[first]]
+
+
+class ColumnarSheet:
+    """
+    Data of a sheet as dictionary encoded columns, an alternative to the object columns of a DataFrame. Every column
+    holds the integer code of the value of every row (-1 for empty cells) and the values of the codes, cleaned once
+    with clean_data according to the binding of their leaf. Selecting rows only selects row positions, the codes of a
+    column are taken when the column is read.
+    """
 
-    for i, (index, row) in enumerate(df.loc[:, identifiers].iterrows()):
+    def __init__(self, index, codes, values, positions=None):
+        self._index = index
+        self._codes = codes
+        self.values = values
+        self.positions = positions if positions is not None else np.arange(len(index))
 
-        if filter[i]:
+    @classmethod
+    def from_dataframe(cls, df, node):
+        """
+        Encodes the columns of a DataFrame.
 
-            if prev_row is not None and all([(x == y or (isinstance(x, float) and math.isnan(x))) for x, y in
-                                             zip(tuple(row), prev_row)]):
-                new_filters[prev_pos][i] = True
+        Args:
+            df (pd.DataFrame): DataFrame containing the data of the sheet, indexed by row number.
+            node (Node): Schema node of the sheet.
 
+        Returns:
+            ColumnarSheet: The encoded sheet.
+        """
+        columns = []
+        get_leaf_columns(node, [], columns)
+        leaves = dict(columns)
+
+        codes, values = {}, {}
+        for column in df.columns:
+            column_codes, uniques = factorize(df[column])
+            leaf = leaves.get(column)
+            if leaf is not None and leaf.binding == 'java.util.List' and all(isinstance(u, str) for u in uniques):
+                # Views into a single array of the numbers of the column
+                coordinates, offsets = parse_coordinates(uniques)
+                values[column] = [coordinates[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+            elif leaf is not None:
+                values[column] = [clean_data(u, leaf) for u in uniques]
             else:
-                j = pos2index[tuple(row.replace(np.nan, None))]
-                new_filters[j][i] = True
-                prev_row = tuple(row)
-                prev_pos = j
+                values[column] = list(uniques)
+            codes[column] = column_codes.astype(get_code_dtype(len(uniques)))
+        return cls(df.index.to_numpy(), codes, values)
+
+    @property
+    def columns(self):
+        return self._codes.keys()
+
+    @property
+    def shape(self):
+        return len(self.positions), len(self._codes)
+
+    @property
+    def index(self) -> np.ndarray:
+        return self._index[self.positions]
+
+    def get_codes(self, column) -> np.ndarray:
+        return self._codes[column][self.positions]
+
+    def get_memory_usage(self) -> int:
+        """
+        Gets the number of bytes of the codes of all rows, without the values of the codes.
+        """
+        return sum(codes.nbytes for codes in self._codes.values()) + self._index.nbytes
+
+    def __getitem__(self, mask):
+        return ColumnarSheet(self._index, self._codes, self.values, self.positions[mask])
+
+    def __repr__(self) -> str:
+        return f'ColumnarSheet({self.shape[0]} rows, {self.shape[1]} columns)'
 
-    new_filters = [filter * nf for nf in new_filters]
 
-    assert not new_filters or all(sum(new_filters) == filter), 'Not a perfect partition?'
+class IdentifierCodes:
+    """
+    Integer codes of the columns of a sheet DataFrame, factorized the first time get_partition needs them (-1 for
+    empty cells). The partitions at every depth of a sheet share these codes, by taking the codes of their rows.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self.codes = {}
+        # Rows are found by their offset in the index of the sheet, which is a range of row numbers
+        index = df.index
+        self.offset = index[0] if isinstance(index, pd.RangeIndex) and index.step == 1 and len(index) else None
+
+    def get_codes(self, column, df) -> np.ndarray:
+        """
+        Gets the codes of a column for the rows of a part of the sheet.
+
+        Args:
+            column (str): Name of the column.
+            df (pd.DataFrame): The sheet DataFrame, or a selection of its rows.
+
+        Returns:
+            np.ndarray: Code of every row of df.
+        """
+        codes = self.codes.get(column)
+        if codes is None:
+            codes = factorize(self.df[column])[0]
+            self.codes[column] = codes
+        if df is self.df:
+            return codes
+        if self.offset is not None:
+            return codes[df.index.to_numpy() - self.offset]
+        return codes[self.df.index.get_indexer(df.index)]
+
+
+def get_partition(df, filter, current_lijst, node, codes=None):
+    """
+    Performs data partitioning based on identifiers.
+
+    A row starts a new part unless each of its identifiers is equal to that of the row that started the previous
+    part, or empty. Parts with the same identifiers are merged. The identifiers are compared by their codes.
+
+    Args:
+        df (pd.DataFrame | ColumnarSheet): Data of the rows to partition.
+        filter (np.ndarray): Boolean filter indicating relevant rows.
+        current_lijst (List[str]): Current list of identifiers.
+        node (Node): Current node in the schema tree.
+        codes (IdentifierCodes, optional): Codes of the sheet df was selected from. Defaults to None, meaning the
+            identifiers of df are factorized.
+
+    Returns:
+        List[np.ndarray]: List of filters for data partitioning.
+    """
+
+    identifiers = []
+    get_identifiers(node, current_lijst, identifiers)
+    identifiers = [i for i in identifiers if i in df.columns]
+
+    positions = np.flatnonzero(filter)
+    if not identifiers:
+        rows = [()] * len(positions)
+    elif isinstance(df, ColumnarSheet):
+        rows = np.stack([df.get_codes(i)[positions] for i in identifiers], axis=1).tolist()
+    else:
+        if codes is None:
+            codes = IdentifierCodes(df)
+        rows = np.stack([codes.get_codes(i, df)[positions] for i in identifiers], axis=1).tolist()
+
+    pos2index = {}
+    parts = []
+    prev_row = None
+    prev_part = None
+    for position, row in zip(positions.tolist(), rows):
+        # A row continues the previous part if its identifiers are equal or empty
+        if prev_row is None or not all(x == y or x == -1 for x, y in zip(row, prev_row)):
+            prev_row = row
+            key = tuple(row)
+            if key not in pos2index:
+                pos2index[key] = len(parts)
+                parts.append([])
+            prev_part = parts[pos2index[key]]
+        prev_part.append(position)
+
+    new_filters = []
+    for part in parts:
+        new_filter = np.zeros(df.shape[0], dtype=bool)
+        new_filter[part] = True
+        new_filters.append(new_filter)
     return new_filters
 
 
-def recursive_data_read(df, schema_node, current_lijst) -> DataNode:
+def recursive_data_read(df, schema_node, current_lijst, codes=None) -> DataNode:
     """
     Recursively reads data from DataFrame and constructs data nodes.
 
     Args:
-        df (pd.DataFrame): DataFrame containing data.
-        filter (np.ndarray): Boolean filter indicating relevant rows.
+        df (pd.DataFrame | ColumnarSheet): DataFrame containing data.
         schema_node (Node): Current node in the schema tree.
         current_lijst (List[str]): Current list of identifiers.
+        codes (IdentifierCodes, optional): Codes of the sheet df was selected from, shared by the partitions of all
+            depths. Defaults to None.
 
     Returns:
         DataNode: Constructed data node.
@@ -218,26 +749,59 @@ def recursive_data_read(df, schema_node, current_lijst) -> DataNode:
     data_node = DataNode(node_name)
     if not schema_node.children:
         data = OrderedSet()
+        rows = []
         column = '-'.join(current_lijst)
-        if column in df.columns:
-            for d in df.loc[:, column]:
-                d = clean_data(d, schema_node)
-                if d is not None:
+        if isinstance(df, ColumnarSheet):
+            if column in df.columns:
+                codes = df.get_codes(column)
+                values = df.values[column]
+                valid = codes >= 0
+                # Codes in the order of their first row, which is the order of their values in the OrderedSet
+                present, first = np.unique(codes[valid], return_index=True)
+                present = present[np.argsort(first)].tolist()
+                if present and isinstance(values[present[0]], np.ndarray):
+                    data.update(unique_coordinates(np.concatenate([values[code] for code in present])))
+                else:
+                    for code in present:
+                        d = values[code]
+                        if isinstance(d, list):
+                            data.update(d)
+                        elif d is not None:
+                            data.add(d)
+                rows = [row for row, code in zip(df.index.tolist(), codes.tolist())
+                        if code >= 0 and values[code] is not None]
+        elif column in df.columns:
+            present = get_list_cells(df.loc[:, column]) if schema_node.binding == 'java.util.List' else None
+            if present is not None:
+                # All numbers of the object parsed at once
+                rows = df.index[present].tolist()
+                data.update(unique_coordinates(parse_coordinates(df.loc[present, column].tolist())[0]))
+            else:
+                # Objects mostly repeat their values down their rows, so only the distinct values are cleaned. The
+                # type is part of the key, as 1 and 1.0 are equal but cleaned differently.
+                distinct = {}
+                cell_codes = [distinct.setdefault((d.__class__, d), len(distinct)) for d in df.loc[:, column]]
+                cleaned = [clean_data(d, schema_node) for _, d in distinct]
+                for d in cleaned:
                     if isinstance(d, list):
                         data.update(d)
-                    else:
+                    elif d is not None:
                         data.add(d)
+                rows = [row for row, code in zip(df.index, cell_codes) if cleaned[code] is not None]
         data_node.data += list(data)
+        data_node.rows = get_row_ranges(rows)
+    else:
+        data_node.rows = get_row_ranges(df.index)
 
     for c in schema_node.children:
         current_lijst.append(c.name)
         if c.max_amount > 1 or (isinstance(schema_node, ChoiceNode) and schema_node.max_amount > 1):
-            partition = get_partition(df, np.ones(df.shape[0], dtype=bool), current_lijst, c)
+            partition = get_partition(df, np.ones(df.shape[0], dtype=bool), current_lijst, c, codes=codes)
         else:
             partition = [np.ones(df.shape[0], dtype=bool)]
 
         for part in partition:
-            data_node.children[c.name].append(recursive_data_read(df[part], c, current_lijst))
+            data_node.children[c.name].append(recursive_data_read(df[part], c, current_lijst, codes=codes))
         del current_lijst[-1]
     return data_node
 
@@ -282,100 +846,315 @@ def data_node_to_json(data_node, schema_node):
     return [json_dict]
 
 
-def read_sheets(filename, sheets, xml_schema=None, mode='local', xsd_source='productie', df_range=None):
+def read_sheets(filename, sheets, xml_schema=None, mode='local', xsd_source='productie', df_range=None,
+                validation_cache=None, progress=None, dfs_schema=None, instrumentation=None, columnar=False,
+                objects=None, object_index=None, encode=True):
     """
     Reads data from Excel sheets and generates filled XML.
 
     Args:
-        filename (str): Path to the Excel file.
+        filename (str | dict): Path to the Excel file, or a tabular source of CSV or Parquet files, see
+            get_table_files.
         sheets (List[str]): List of sheet names to be read.
+        validation_cache (str | ValidationCache, optional): Cache of validation outcomes, or the path of its SQLite
+            file. Defaults to None, meaning every object is validated.
+        progress (Callable[[str, int, int], None], optional): Called with a stage ('read', 'partition' or
+            'validate'), the amount of work done and the total amount of work of that stage. It can raise
+            ConversionCancelled to stop the conversion. Defaults to None.
+        dfs_schema (Node, optional): Depth-first schema tree of xsd_source, built if not given. Defaults to None.
+        instrumentation (Instrumentation, optional): Records the time, memory and counts of every stage, it is also
+            set as the instrumentation attribute of the returned Validator. Defaults to None.
+        columnar (bool, optional): Partition and read the objects from a ColumnarSheet instead of the DataFrame of
+            every sheet, which uses less memory and cleans every distinct value only once. Defaults to False.
+        objects (Dict[str, List[str | Dict[str, str]]], optional): Only convert these objects of every sheet, see
+            ObjectIndex.find. Requires object_index. Defaults to None, meaning all objects.
+        object_index (ObjectIndex, optional): Index of the workbook. Sheets that are read completely are added to it,
+            the objects of indexed sheets are read by their rows. Defaults to None.
+        encode (bool, optional): Assemble the XML document of the valid objects. Defaults to True, if False the
+            elements of the objects are only kept in the fragments of the Validator, e.g. for write_xml_chunks.
 
     Returns:
-        str: Filled XML data.
+        str: Filled XML data, None if encode is False.
     """
-
-    data_root = DataNode('schema')
-    if not sheets:
-        xl = pd.ExcelFile(filename)
-        sheets = xl.sheet_names
-        sheets.remove('Codelijsten')
-        sheets.remove('metadata')
-
-    root = get_dfs_schema(PROJECT_ROOT, xsd_source, mode)
-    for sheet in sheets:
-        sheet_available = False
-        try:
-            df = pd.read_excel(filename, sheet_name=sheet, dtype={'meetnet': str}).iloc[
-                root.get_specific_child(sheet).get_max_depth():,
-                :].reset_index(
-                drop=True)
-            sheet_available = True
-        except ValueError:
-            print(f'No {sheet} sheet found.')
-
-        if sheet_available:
+    if objects is not None and object_index is None:
+        raise ValueError('Selecting objects requires the object index of the workbook')
+    if instrumentation is None:
+        instrumentation = NO_INSTRUMENTATION
+
+    with instrumentation:
+        data_root = DataNode('schema')
+        sources = defaultdict(list)
+        codelijst_issues = []
+        tables = get_table_files(filename)
+        if not sheets and tables is not None:
+            sheets = list(tables)
+        elif not sheets:
+            xl = pd.ExcelFile(filename)
+            sheets = xl.sheet_names
+            sheets.remove('Codelijsten')
+            sheets.remove('metadata')
+
+        with instrumentation.stage('schema'):
+            root = dfs_schema if dfs_schema is not None else get_dfs_schema(PROJECT_ROOT, xsd_source, mode)
+        references = ReferenceIndex(root, sheets)
+        for i, sheet in enumerate(sheets):
+            if progress is not None:
+                progress('read', i, len(sheets))
+            sheet_available = False
+            selection = objects.get(sheet) if objects is not None else None
+            complete = True  # whether df holds all rows of the sheet
             try:
-                if df_range is not None:
-                    df = df.iloc[df_range[0]:df_range[1]]
-                base = root.get_specific_child(sheet)
-                partition = get_partition(df, np.ones(df.shape[0], dtype='bool'), [], base)
-                for part in partition:
-                    data_root.children[sheet].append(recursive_data_read(df[part], base, []))
-            except ValueError as e:
-                print(f'Conversion of sheet {sheet} failed')
-
-    data_root.delete_empty()
-
-    json_dict = data_node_to_json(data_root, root)[0]
-
-    if xml_schema is None:
-        xml_schema = get_XML_schema(xsd_source)
+                with instrumentation.stage('read', sheet) as record:
+                    if tables is not None:
+                        if sheet not in tables:
+                            raise ValueError(f'No file for sheet {sheet}')
+                        df = read_table(tables[sheet], root.get_specific_child(sheet))
+                    elif selection is not None and sheet in object_index:
+                        df = read_excel_rows(filename, sheet, object_index.get_rows(sheet, selection))
+                        # The rows only hold the selected objects
+                        selection = None
+                        complete = False
+                    else:
+                        header_rows = root.get_specific_child(sheet).get_max_depth()
+                        df = pd.read_excel(filename, sheet_name=sheet, dtype={'meetnet': str}).iloc[header_rows:, :]
+                        # Index the rows by their row number in Excel, below the column names and the header rows
+                        df.index = pd.RangeIndex(header_rows + 2, header_rows + 2 + df.shape[0])
+                    record.counts['rows'] = df.shape[0]
+                sheet_available = True
+            except ValueError:
+                print(f'No {sheet} sheet found.')
+
+            if sheet_available:
+                try:
+                    if df_range is not None:
+                        df = df.iloc[df_range[0]:df_range[1]]
+                        complete = False
+                    index_sheet = object_index is not None and complete and tables is None
+                    frame = df
+                    base = root.get_specific_child(sheet)
+                    with instrumentation.stage('references', sheet):
+                        references.add_sheet(sheet, df, complete=complete)
+                    with instrumentation.stage('codelijsten', sheet) as record:
+                        issues = check_codelijsten(df, sheet, base)
+                        record.counts['issues'] = len(issues)
+                    codelijst_issues += issues
+                    if columnar:
+                        with instrumentation.stage('columnar', sheet) as record:
+                            df = ColumnarSheet.from_dataframe(df, base)
+                            record.counts['bytes'] = df.get_memory_usage()
+                    codes = None if columnar else IdentifierCodes(df)
+                    with instrumentation.stage('partition', sheet) as record:
+                        partition = get_partition(df, np.ones(df.shape[0], dtype='bool'), [], base, codes=codes)
+                        record.counts['objects'] = len(partition)
+                    if index_sheet:
+                        with instrumentation.stage('index', sheet) as record:
+                            object_index.add_sheet(sheet, *get_object_identifiers(frame, partition, base))
+                            record.counts['objects'] = len(partition)
+                        if selection is not None:
+                            partition = [partition[j] for j in object_index.find(sheet, selection)]
+                    with instrumentation.stage('data_read', sheet) as record:
+                        for j, part in enumerate(partition):
+                            data_node = recursive_data_read(df[part], base, [], codes=codes)
+                            data_root.children[sheet].append(data_node)
+                            sources[sheet].append(SourceLocation(sheet, data_node))
+                            if progress is not None:
+                                progress('partition', j + 1, len(partition))
+                        record.counts['objects'] = len(partition)
+                except ValueError as e:
+                    print(f'Conversion of sheet {sheet} failed')
+
+        if progress is not None:
+            progress('read', len(sheets), len(sheets))
+
+        with instrumentation.stage('references') as record:
+            reference_issues = references.get_issues()
+            record.counts['issues'] = len(reference_issues)
+
+        with instrumentation.stage('to_json'):
+            data_root.delete_empty()
+            json_dict = data_node_to_json(data_root, root)[0]
+
+        if xml_schema is None:
+            with instrumentation.stage('xml_schema'):
+                xml_schema = get_XML_schema(xsd_source)
+
+        close_cache = isinstance(validation_cache, (str, os.PathLike))
+        if close_cache:
+            validation_cache = ValidationCache(validation_cache,
+                                               namespace=f'{xsd_source}:{get_schema_version(PROJECT_ROOT)}')
+
+        validator = Validator(json_dict, xml_schema, sources=sources, dfs_schema=root,
+                              codelijst_issues=codelijst_issues, cache=validation_cache,
+                              reference_issues=reference_issues)
+        try:
+            with instrumentation.stage('validate') as record:
+                validator.validate(progress=progress)
+                record.counts['objects'] = sum(len(v) for v in validator.corrected.values() if isinstance(v, list))
+                record.counts['errors'] = sum(len(v) for v in validator.errors.values())
+        finally:
+            if close_cache:
+                validation_cache.close()
+
+        filled_xml = None
+        if encode:
+            with instrumentation.stage('encode'):
+                filled_xml = validator.get_encoded()
+                if filled_xml is None:
+                    filled_xml = xml_schema.encode(validator.corrected, namespaces={
+                        'gml': 'http://www.opengis.net/gml/3.2',
+                    })
+
+    if instrumentation is not NO_INSTRUMENTATION:
+        validator.instrumentation = instrumentation
+    return filled_xml, validator
 
-    validator = Validator(json_dict, xml_schema)
-    validator.validate()
 
-    filled_xml = xml_schema.encode(validator.corrected, namespaces={
+def xml_to_string(xml) -> str:
+    """
+    Serializes XML data, with the XML declaration of the output files.
+    """
+    return '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n' + xmlschema.etree_tostring(xml, namespaces={
         'gml': 'http://www.opengis.net/gml/3.2',
     })
 
-    return filled_xml, validator
 
-
-def write_xml(xml, filename):
+def write_xml(xml, filename, progress=None):
     """
     Writes XML data to a file.
 
+    The data is written to a temporary file next to the output file first, so a failed or cancelled write never
+    leaves a truncated output file behind.
+
     Args:
         xml (Any): XML data to be written.
         filename (str): Path to the output file.
+        progress (Callable[[str, int, int], None], optional): Called with 'write', the bytes written and the total
+            amount of bytes. Defaults to None.
     """
 
-    with open(filename, 'w', encoding="utf-8") as f:
-        f.write('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n')
-        f.write(xmlschema.etree_tostring(xml, namespaces={
-            'gml': 'http://www.opengis.net/gml/3.2',
-        }))
+    text = xml_to_string(xml)
+    total = len(text.encode('utf-8')) if progress is not None else 0
+    written = 0
+
+    part_filename = f'{filename}.part'
+    try:
+        with open(part_filename, 'w', encoding="utf-8") as f:
+            for start in range(0, len(text), WRITE_CHUNK_SIZE):
+                chunk = text[start:start + WRITE_CHUNK_SIZE]
+                f.write(chunk)
+                if progress is not None:
+                    written += len(chunk.encode('utf-8'))
+                    progress('write', written, total)
+        os.replace(part_filename, filename)
+    finally:
+        if os.path.exists(part_filename):
+            os.remove(part_filename)
+
+
+def get_chunk_filename(filename, number) -> str:
+    base, extension = os.path.splitext(filename)
+    return f'{base}_{number:03d}{extension}'
+
+
+def get_manifest_filename(filename) -> str:
+    return f'{os.path.splitext(filename)[0]}.manifest.json'
+
+
+def write_xml_chunks(validator, filename, max_objects=None, max_bytes=None, progress=None) -> dict:
+    """
+    Writes the valid objects of a conversion to several XML files of limited size, see get_chunks, and a manifest of
+    these files. The files are named after filename, numbered from 1 (e.g. result_001.xml), and every file is a
+    complete document that validates on its own.
+
+    Args:
+        validator (Validator): Validator of the conversion, with its depth-first schema tree.
+        filename (str): Path to the output file the chunks are named after.
+        max_objects (int, optional): Maximum number of objects per file. Defaults to None, meaning no limit.
+        max_bytes (int, optional): Maximum size of the objects of a file in bytes. Defaults to None, meaning no limit.
+        progress (Callable[[str, int, int], None], optional): Called with 'write', the files written and the total
+            amount of files. Defaults to None.
+
+    Returns:
+        dict: The manifest, listing the file name, object counts per sheet and size of every file.
+    """
+    documents = get_chunks(validator, validator.dfs_schema, max_objects=max_objects, max_bytes=max_bytes)
+    manifest = {'max_objects': max_objects, 'max_bytes': max_bytes, 'chunks': []}
+    for number, (xml, chunk) in enumerate(documents, 1):
+        chunk_filename = get_chunk_filename(filename, number)
+        write_xml(xml, chunk_filename)
+        manifest['chunks'].append({'file': os.path.basename(chunk_filename), 'objects': chunk.get_counts(),
+                                   'bytes': os.path.getsize(chunk_filename)})
+        if progress is not None:
+            progress('write', number, len(documents))
+
+    with open(get_manifest_filename(filename), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
 
 
 def read_to_xml(input_filename, output_filename='./results/result.xml', sheets=None, mode='local',
-                xsd_source='productie', project_root=None, xml_schema=None, df_range=None) -> Validator:
+                xsd_source='productie', project_root=None, xml_schema=None, df_range=None,
+                validation_cache=None, progress=None, dfs_schema=None, instrumentation=None,
+                columnar=False, objects=None, index=False, max_objects=None, max_bytes=None) -> Validator:
     """
     Reads data from Excel sheets and generates filled XML.
 
     Args:
-        input_filename (str): Path to the input Excel file.
+        input_filename (str | dict): Path to the input Excel file, or a directory or mapping of per sheet CSV or
+            Parquet files, see get_table_files.
         output_filename (str, optional): Path to the output XML file. Defaults to './dist/result.xml'.
         sheets (List[str], optional): List of sheet names to be read. Defaults to None.
+        validation_cache (str | ValidationCache, optional): Cache of validation outcomes, or the path of its SQLite
+            file. Defaults to None.
+        progress (Callable[[str, int, int], None], optional): Called with a stage ('read', 'partition', 'validate'
+            or 'write'), the amount of work done and the total amount of work of that stage. Raising
+            ConversionCancelled from it stops the conversion without writing the output file. Defaults to None.
+        instrumentation (Instrumentation, optional): Records the time, memory and counts of every stage, available as
+            the instrumentation attribute of the returned Validator. Defaults to None, meaning nothing is recorded.
+        columnar (bool, optional): Read the sheets through a ColumnarSheet, see read_sheets. Defaults to False.
+        objects (Dict[str, List[str | Dict[str, str]]], optional): Only convert these objects, by the value of the
+            first identifier column or a dict of identifier values, of the sheets given as keys. The rows of the
+            objects are looked up in the object index of the workbook, which is built when a sheet is not indexed
+            yet. Defaults to None, meaning all objects of all sheets.
+        index (bool, optional): Store the object index of the sheets next to the input file, for later conversions
+            of selected objects. Defaults to False.
+        max_objects (int, optional): Split the output into files of at most this many objects, see write_xml_chunks.
+            Defaults to None.
+        max_bytes (int, optional): Split the output into files of at most this many bytes of objects, see
+            write_xml_chunks. Defaults to None.
     """
     if project_root is not None:
         global PROJECT_ROOT
         PROJECT_ROOT = project_root
 
-    filled_xml, rapport = read_sheets(input_filename, sheets=sheets, mode=mode, xsd_source=xsd_source,
-                                      xml_schema=xml_schema,
-                                      df_range=df_range)
-
-    write_xml(filled_xml, output_filename)
+    object_index = None
+    if objects is not None or index:
+        if get_table_files(input_filename) is not None or df_range is not None:
+            raise ValueError('Objects can only be indexed and selected in complete Excel sheets')
+        object_index = ObjectIndex.load(input_filename, f'{xsd_source}:{get_schema_version(PROJECT_ROOT)}')
+        if objects is not None and not sheets:
+            sheets = list(objects)
+
+    if instrumentation is None:
+        instrumentation = NO_INSTRUMENTATION
+    chunked = max_objects is not None or max_bytes is not None
+
+    with instrumentation:
+        filled_xml, rapport = read_sheets(input_filename, sheets=sheets, mode=mode, xsd_source=xsd_source,
+                                          xml_schema=xml_schema,
+                                          df_range=df_range, validation_cache=validation_cache, progress=progress,
+                                          dfs_schema=dfs_schema, instrumentation=instrumentation,
+                                          columnar=columnar, objects=objects, object_index=object_index,
+                                          encode=not chunked)
+        if object_index is not None:
+            object_index.save()
+
+        with instrumentation.stage('write'):
+            if chunked:
+                write_xml_chunks(rapport, output_filename, max_objects=max_objects, max_bytes=max_bytes,
+                                 progress=progress)
+            else:
+                write_xml(filled_xml, output_filename, progress=progress)
 
     return rapport
 
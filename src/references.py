@@ -0,0 +1,164 @@
+"""
+References between the sheets of a workbook, such as the grondwaterlocatie of a filter or the filter (identificatie and
+filtertype) of a filtermeting. The schema does not mark references, they are recognised by their names:
+
+    - a leaf named after another sheet, holding the value of the first identifier column of that sheet
+      (e.g. filter-grondwaterlocatie, the identificatie of a grondwaterlocatie);
+    - a node named after another sheet, or after another sheet prefixed with ref_, whose leaves are named after
+      identifier columns of that sheet (e.g. filtermeting-filter-identificatie, bodemlocatie-ref_bodemsite-naam).
+"""
+
+from collections import defaultdict
+
+from src.dfs_schema import get_identifiers
+from src.object_index import identifier_to_str
+from src.validation import ReferenceIssue, merge_row_ranges
+
+REFERENCE_PREFIX = 'ref_'
+
+
+class Reference:
+    """
+    Columns of a sheet that refer to the identifier columns of another sheet.
+    """
+
+    def __init__(self, columns, target, target_columns):
+        self.columns = tuple(columns)
+        self.target = target
+        self.target_columns = tuple(target_columns)
+
+    def __repr__(self) -> str:
+        return f"Reference({', '.join(self.columns)} -> {self.target}: {', '.join(self.target_columns)})"
+
+
+def get_sheet_identifiers(root) -> dict:
+    identifiers = {}
+    for node in root.children:
+        identifiers[node.name] = []
+        get_identifiers(node, [], identifiers[node.name])
+    return identifiers
+
+
+def get_references(root, sheet, identifiers=None) -> list:
+    """
+    Finds the references of a sheet to the other sheets of the schema.
+
+    Args:
+        root (Node): Root node of the depth-first schema tree.
+        sheet (str): Name of the sheet.
+        identifiers (Dict[str, List[str]], optional): Identifier columns of every sheet. Defaults to None, meaning
+            they are retrieved from root.
+
+    Returns:
+        List[Reference]: The references, in the order of the columns of the sheet.
+    """
+    if identifiers is None:
+        identifiers = get_sheet_identifiers(root)
+
+    references = []
+    find_references(root.get_specific_child(sheet), [], sheet, identifiers, references)
+    return references
+
+
+def find_references(node, current_lijst, sheet, identifiers, references) -> None:
+    for c in node.children:
+        current_lijst.append(c.name)
+        target = c.name[len(REFERENCE_PREFIX):] if c.name.startswith(REFERENCE_PREFIX) else c.name
+        if target == sheet or target not in identifiers or not identifiers[target]:
+            get_children = bool(c.children)
+        elif not c.children:
+            references.append(Reference(['-'.join(current_lijst)], target, identifiers[target][:1]))
+            get_children = False
+        elif c.name.startswith(REFERENCE_PREFIX) or all(not g.children for g in c.children):
+            leaves = [g.name for g in c.children if not g.children and g.name in identifiers[target]]
+            if leaves:
+                references.append(Reference(['-'.join(current_lijst + [g]) for g in leaves], target, leaves))
+            # References can hold references themselves, e.g. ref_bodemmonster-choice_1-ref_bodemsite
+            get_children = c.name.startswith(REFERENCE_PREFIX)
+        else:
+            get_children = True
+
+        if get_children:
+            find_references(c, current_lijst, sheet, identifiers, references)
+        del current_lijst[-1]
+
+
+def get_values(df, columns):
+    """
+    Gets the values of columns as tuples of strings, see identifier_to_str, for the rows in which none of them is
+    empty.
+
+    Returns:
+        Tuple[List[int], List[Tuple[str, ...]]]: Row numbers and values.
+    """
+    present = df[list(columns)].notna().all(axis=1).to_numpy()
+    values = zip(*(df.loc[present, column].map(identifier_to_str) for column in columns))
+    return df.index[present].tolist(), list(values)
+
+
+class ReferenceIndex:
+    """
+    Resolves the references between the sheets of a conversion. Every sheet is added once it is read, which keeps the
+    identifiers that other sheets refer to as sets and the distinct values of its own references with their rows.
+    Once all sheets are added, every reference value is looked up in the set of its target sheet.
+
+    References to sheets that are not part of the conversion are not checked, they can refer to objects in DOV.
+    """
+
+    def __init__(self, root, sheets):
+        """
+        Args:
+            root (Node): Root node of the depth-first schema tree.
+            sheets (Iterable[str]): Sheets of the conversion.
+        """
+        identifiers = get_sheet_identifiers(root)
+        self.references = {sheet: get_references(root, sheet, identifiers) for sheet in sheets if sheet in identifiers}
+        self.targets = defaultdict(set)
+        for references in self.references.values():
+            for reference in references:
+                self.targets[reference.target].add(reference.target_columns)
+
+        self.keys = {}  # (target, target columns): set of identifier values
+        self.values = []  # (sheet, reference, {value: rows})
+
+    def add_sheet(self, sheet, df, complete=True) -> None:
+        """
+        Adds the identifiers and references of a sheet.
+
+        Args:
+            sheet (str): Name of the sheet.
+            df (pd.DataFrame): DataFrame containing the data of the sheet, indexed by row number.
+            complete (bool, optional): Whether df holds all rows of the sheet. The identifiers of a part of a sheet
+                are not used to resolve references. Defaults to True.
+        """
+        if complete:
+            for target_columns in self.targets.get(sheet, ()):
+                if all(column in df.columns for column in target_columns):
+                    self.keys[(sheet, target_columns)] = set(get_values(df, target_columns)[1])
+
+        for reference in self.references.get(sheet, ()):
+            if not all(column in df.columns for column in reference.columns):
+                continue
+            rows_by_value = defaultdict(list)
+            for row, value in zip(*get_values(df, reference.columns)):
+                rows_by_value[value].append(row)
+            if rows_by_value:
+                self.values.append((sheet, reference, rows_by_value))
+
+    def get_issues(self) -> list:
+        """
+        Gets the references to objects that are not in their target sheet.
+
+        Returns:
+            List[ReferenceIssue]: One issue per unknown value per reference.
+        """
+        issues = []
+        for sheet, reference, rows_by_value in self.values:
+            keys = self.keys.get((reference.target, reference.target_columns))
+            if keys is None:
+                continue
+            for value, rows in rows_by_value.items():
+                if value not in keys:
+                    issues.append(ReferenceIssue(sheet, list(reference.columns), list(value), reference.target,
+                                                 len(rows), merge_row_ranges((row, row) for row in rows)))
+        return issues
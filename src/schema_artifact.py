@@ -0,0 +1,230 @@
+"""
+Binary artifact of a finished depth-first schema tree, so the tree does not have to be rebuilt from the json schema or
+the XSD on every run. Build the artifacts with:
+
+python -m src.schema_artifact [-m MODE] [-omg OMGEVING [OMGEVING ...]]
+
+The file starts with a header, followed by these sections:
+    string offsets (n_strings + 1 x uint32) and the utf-8 encoded strings they point in
+    nodes (n_nodes x NODE), in depth-first order, the children of a node follow it
+    enumerations (n_enums x uint32), string indices of the codes of all nodes
+    sheets (n_sheets x SHEET), the children of the root with their max depth and identifiers
+    identifiers (n_identifiers x uint32), string indices of the identifier columns of all sheets
+"""
+
+import argparse
+import math
+import mmap
+import os
+import struct
+from array import array
+
+from src.dfs_schema import Node, ChoiceNode, SequenceNode, get_dfs_schema, get_identifiers
+from src.validation_cache import get_schema_version
+
+
+MAGIC = b'XLS2XMLS'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sHHIIIIIIII')
+NODE = struct.Struct('<BxxxIIIIIIII')
+SHEET = struct.Struct('<IIIHxx')
+NONE = 0xFFFFFFFF  # missing string, enumeration or infinite cardinality
+
+NODE_KINDS = (Node, ChoiceNode, SequenceNode)
+
+
+class SchemaArtifact:
+    """
+    Depth-first schema tree loaded from an artifact, with the metadata recorded when it was built.
+    """
+
+    def __init__(self, root, schema_version, source, max_depth, sheets):
+        self.root = root
+        self.schema_version = schema_version
+        self.source = source
+        self.max_depth = max_depth
+        self.sheets = sheets
+
+    def __str__(self):
+        return f'SchemaArtifact({self.source[1]}, schema-version={self.schema_version})'
+
+    def __repr__(self):
+        return self.__str__()
+
+
+def get_artifact_filename(project_root, xsd_source='productie') -> str:
+    return os.path.join(project_root, 'config', 'schemas',
+                        f'xsd_schema{"" if xsd_source == "productie" else "_" + xsd_source}.bin')
+
+
+def write_schema_artifact(root, filename, schema_version) -> None:
+    """
+    Writes a depth-first schema tree to an artifact.
+
+    Args:
+        root (Node): Root node of the depth-first schema tree, with its source set by get_dfs_schema.
+        filename (str): Path of the artifact.
+        schema_version (str): Version of the schema the tree was built from, see config/config.ini.
+    """
+    strings = {}
+
+    def index(value):
+        if value is None:
+            return NONE
+        if value not in strings:
+            strings[value] = len(strings)
+        return strings[value]
+
+    def amount(value):
+        return NONE if value == math.inf else value
+
+    nodes = bytearray()
+    enums = array('I')
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node.enum is None:
+            enum_start, enum_count = NONE, 0
+        else:
+            enum_start, enum_count = len(enums), len(node.enum)
+            enums.extend(index(code) for code in node.enum)
+        nodes += NODE.pack(NODE_KINDS.index(type(node)), index(node.name), amount(node.min_amount),
+                           amount(node.max_amount), index(node.binding), index(node.namespace), enum_start,
+                           enum_count, len(node.children))
+        stack.extend(reversed(node.children))
+
+    sheets = bytearray()
+    identifiers = array('I')
+    for sheet in root.children:
+        sheet_identifiers = []
+        get_identifiers(sheet, [], sheet_identifiers)
+        sheets += SHEET.pack(index(sheet.name), len(identifiers), len(sheet_identifiers), sheet.get_max_depth())
+        identifiers.extend(index(identifier) for identifier in sheet_identifiers)
+
+    mode, xsd_source = root.source
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, root.get_max_depth(), index(schema_version), index(mode),
+                         index(xsd_source), len(strings), len(nodes) // NODE.size, len(enums),
+                         len(root.children), len(identifiers))
+
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = array('I', [0])
+    for s in encoded:
+        offsets.append(offsets[-1] + len(s))
+
+    os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+    with open(filename + '.part', 'wb') as f:
+        for section in (header, offsets.tobytes(), b''.join(encoded), nodes, enums.tobytes(), sheets,
+                        identifiers.tobytes()):
+            f.write(section)
+    os.replace(filename + '.part', filename)
+
+
+def read_schema_artifact(filename) -> SchemaArtifact:
+    """
+    Reads a depth-first schema tree from an artifact, using a memory map of the file.
+
+    Args:
+        filename (str): Path of the artifact.
+
+    Returns:
+        SchemaArtifact: The tree and its metadata.
+
+    Raises:
+        ValueError: If the file is not an artifact of this format version.
+    """
+    with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        if len(buffer) < HEADER.size:
+            raise ValueError(f'{filename} is not a schema artifact')
+        (magic, format_version, max_depth, version_index, mode_index, source_index, n_strings, n_nodes, n_enums,
+         n_sheets, n_identifiers) = HEADER.unpack_from(buffer)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError(f'{filename} is not a schema artifact of format version {FORMAT_VERSION}')
+
+        position = HEADER.size
+        offsets = array('I', buffer[position:position + 4 * (n_strings + 1)])
+        position += 4 * (n_strings + 1)
+        blob = buffer[position:position + offsets[-1]]
+        position += offsets[-1]
+        strings = [blob[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(n_strings)]
+
+        records = list(NODE.iter_unpack(buffer[position:position + NODE.size * n_nodes]))
+        position += NODE.size * n_nodes
+        enums = array('I', buffer[position:position + 4 * n_enums])
+        position += 4 * n_enums
+        sheet_records = list(SHEET.iter_unpack(buffer[position:position + SHEET.size * n_sheets]))
+        position += SHEET.size * n_sheets
+        identifiers = array('I', buffer[position:position + 4 * n_identifiers])
+
+    root = None
+    stack = []  # parents that still expect children, with the number of children they expect
+    for kind, name, min_amount, max_amount, binding, namespace, enum_start, enum_count, n_children in records:
+        node = object.__new__(NODE_KINDS[kind])
+        node.__dict__ = {
+            'children': [],
+            'min_amount': math.inf if min_amount == NONE else min_amount,
+            'max_amount': math.inf if max_amount == NONE else max_amount,
+            'name': None if name == NONE else strings[name],
+            'constraints': [],
+            'enum': None if enum_start == NONE else [strings[i] for i in enums[enum_start:enum_start + enum_count]],
+            'binding': None if binding == NONE else strings[binding],
+            'priority': None,
+            'source': None,
+            'namespace': None if namespace == NONE else strings[namespace],
+        }
+        if stack:
+            parent = stack[-1]
+            parent[0].children.append(node)
+            parent[1] -= 1
+            if not parent[1]:
+                stack.pop()
+        else:
+            root = node
+        if n_children:
+            stack.append([node, n_children])
+
+    sheets = {strings[name]: (depth, [strings[i] for i in identifiers[start:start + count]])
+              for name, start, count, depth in sheet_records}
+    # The sheets keep their max depth and identifiers, so they are not derived from the tree on every conversion
+    for sheet in root.children:
+        if sheet.name in sheets:
+            sheet.max_depth, sheet.identifiers = sheets[sheet.name]
+    root.max_depth = max_depth
+    source = (strings[mode_index], strings[source_index])
+    root.source = source
+
+    return SchemaArtifact(root, strings[version_index], source, max_depth, sheets)
+
+
+def build_schema_artifact(project_root, xsd_source='productie', mode='local') -> str:
+    """
+    Builds the depth-first schema tree of an omgeving and writes it to its artifact.
+
+    Args:
+        project_root (str): Project root, containing the config directory.
+        xsd_source (str, optional): 'productie', 'oefen' or 'ontwikkel'. Defaults to 'productie'.
+        mode (str, optional): Build the tree from the 'local' json schema or the 'online' XSD. Defaults to 'local'.
+
+    Returns:
+        str: Path of the artifact.
+    """
+    root = get_dfs_schema(project_root, xsd_source=xsd_source, mode=mode, use_artifact=False)
+    filename = get_artifact_filename(project_root, xsd_source)
+    write_schema_artifact(root, filename, get_schema_version(project_root))
+    return filename
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='schema_artifact',
+                                     description='Builds the binary artifacts of the depth-first schema trees')
+    parser.add_argument("-m", "--mode",
+                        help="Build from the local json schema or the online XSD, options are 'local' and 'online', "
+                             "default: local",
+                        default='local')
+    parser.add_argument("-omg", "--omgeving", nargs='+',
+                        help="Omgeving(en) to build, options are 'ontwikkel','oefen' and 'productie', default: all",
+                        default=['productie', 'oefen', 'ontwikkel'])
+    args = parser.parse_args()
+
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for omgeving in args.omgeving:
+        print(f'Built {build_schema_artifact(project_root, xsd_source=omgeving, mode=args.mode)}')
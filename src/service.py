@@ -0,0 +1,329 @@
+"""
+Conversion service that keeps the schemas of every omgeving loaded, so a conversion does not pay for starting Python,
+importing pandas and compiling the XSD. Start it with:
+
+python -m src.service [--host HOST] [-p PORT] [-w WORKERS] [-q QUEUE] [-omg OMGEVING [OMGEVING ...]]
+
+Endpoints:
+    POST /convert?omgeving=productie&sheets=filter,filtermeting&start=0&end=100
+        Converts the workbook in the request body. Returns JSON with the XML ('xml'), the structured report
+        ('report', see Validator.to_dict) and the text report ('rapport'). Only omgeving is required.
+    GET /metrics
+        Throughput, latency and number of conversions in progress of the service.
+    GET /health
+        Returns 200 once the service accepts conversions.
+
+Conversions run in a pool of worker processes that each load the schemas once. Requests wait in a queue of limited
+length for a free worker, a request that does not fit in the queue is refused with 503.
+"""
+
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OMGEVINGEN = ('productie', 'oefen', 'ontwikkel')
+MAX_UPLOAD_SIZE = 200 * 2 ** 20  # bytes
+LATENCY_WINDOW = 1000  # number of recent conversions the latency percentiles are computed on
+PRELOAD_TIMEOUT = 600  # seconds a worker may take to load the schemas when the service starts
+
+# Schemas of the worker process, see load_schemas
+XML_SCHEMAS = dict()
+DFS_SCHEMAS = dict()
+
+
+def load_schemas(project_root, omgevingen, ready=None) -> None:
+    """
+    Loads the compiled XSD and dfs schema of every omgeving, and the conversion modules, in a worker process.
+
+    Args:
+        project_root (str): Project root, containing the config directory.
+        omgevingen (Iterable[str]): Omgevingen of which the schemas are loaded.
+        ready (multiprocessing.Queue, optional): Queue on which the process id of the worker is put once its schemas
+            are loaded. Defaults to None.
+    """
+    from src.dfs_schema import get_XML_schema, get_dfs_schema, get_cache_dir
+    import src.read_excel  # noqa: F401, imports pandas and xmlschema before the first conversion
+
+    for omgeving in omgevingen:
+        XML_SCHEMAS[omgeving] = get_XML_schema(omgeving, cache_dir=get_cache_dir())
+        DFS_SCHEMAS[omgeving] = get_dfs_schema(project_root, xsd_source=omgeving)
+    if ready is not None:
+        ready.put(os.getpid())
+
+
+def is_ready() -> bool:
+    return bool(XML_SCHEMAS)
+
+
+def convert(filename, omgeving, sheets=None, df_range=None) -> dict:
+    """
+    Converts a workbook in a worker process.
+
+    Args:
+        filename (str): Path to the Excel file.
+        omgeving (str): 'productie', 'oefen' or 'ontwikkel', one of the omgevingen loaded by load_schemas.
+        sheets (List[str], optional): Sheets to convert. Defaults to None, meaning all sheets.
+        df_range (Tuple[int, int], optional): Range of data rows to convert of every sheet. Defaults to None.
+
+    Returns:
+        dict: The XML, the structured report and the text report.
+    """
+    from src.read_excel import read_sheets, xml_to_string
+
+    filled_xml, validator = read_sheets(filename, sheets, xml_schema=XML_SCHEMAS[omgeving], xsd_source=omgeving,
+                                        df_range=df_range, dfs_schema=DFS_SCHEMAS[omgeving])
+    return {'xml': xml_to_string(filled_xml), 'report': validator.to_dict(),
+            'rapport': validator.get_error_rapport()}
+
+
+class ServiceMetrics:
+    """
+    Counts the requests of the service and the latency of the recent conversions, safe to use from several threads.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.in_progress = 0  # conversions that are waiting for or running in a worker
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+
+    def update(self, **changes) -> None:
+        with self.lock:
+            for name, change in changes.items():
+                setattr(self, name, getattr(self, name) + change)
+
+    def add_latency(self, seconds) -> None:
+        with self.lock:
+            self.latencies.append(seconds)
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            uptime = time.monotonic() - self.started
+            latencies = sorted(self.latencies)
+            metrics = {'uptime': uptime, 'completed': self.completed, 'failed': self.failed,
+                       'rejected': self.rejected, 'in_progress': self.in_progress,
+                       'throughput': self.completed / uptime if uptime else 0.0}
+
+        if latencies:
+            metrics['latency'] = {'mean': sum(latencies) / len(latencies),
+                                  'p50': latencies[len(latencies) // 2],
+                                  'p95': latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))],
+                                  'max': latencies[-1]}
+        else:
+            metrics['latency'] = None
+        return metrics
+
+
+class ConversionService:
+    """
+    Pool of worker processes with warm schemas, with a queue of limited length in front of it.
+    """
+
+    def __init__(self, project_root=PROJECT_ROOT, omgevingen=OMGEVINGEN, workers=2, queue_size=8, preload=True):
+        """
+        Args:
+            project_root (str, optional): Project root, containing the config directory. Defaults to PROJECT_ROOT.
+            omgevingen (Iterable[str], optional): Omgevingen of which the schemas are kept loaded. Defaults to all.
+            workers (int, optional): Number of worker processes. Defaults to 2.
+            queue_size (int, optional): Number of requests that can wait for a free worker. Defaults to 8.
+            preload (bool, optional): Start the workers and load their schemas before accepting requests, instead of
+                on the first requests. Defaults to True.
+        """
+        self.project_root = project_root
+        self.omgevingen = tuple(omgevingen)
+        self.workers = workers
+        self.ready = multiprocessing.Queue() if preload else None
+        self.pool_lock = threading.Lock()
+        self.pool = self.create_pool()
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self.metrics = ServiceMetrics()
+        if preload:
+            # The tasks start the workers, but a single worker can run all of them, so every worker reports itself
+            # once its schemas are loaded
+            for future in [self.pool.submit(is_ready) for _ in range(workers)]:
+                future.result()
+            for _ in range(workers):
+                self.ready.get(timeout=PRELOAD_TIMEOUT)
+            self.ready = None
+
+    def create_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=load_schemas,
+                                   initargs=(self.project_root, self.omgevingen, self.ready))
+
+    def replace_pool(self, pool) -> None:
+        """
+        Replaces a pool that broke because a worker process died, unless another thread already replaced it.
+        """
+        with self.pool_lock:
+            if self.pool is pool:
+                self.pool = self.create_pool()
+        pool.shutdown(wait=False)
+
+    def convert(self, data, omgeving, sheets=None, df_range=None):
+        """
+        Converts a workbook in the pool, waiting for a free worker.
+
+        Args:
+            data (bytes): Contents of the Excel file.
+            omgeving (str): One of the omgevingen of the service.
+            sheets (List[str], optional): Sheets to convert. Defaults to None, meaning all sheets.
+            df_range (Tuple[int, int], optional): Range of data rows to convert of every sheet. Defaults to None.
+
+        Returns:
+            dict: Result of convert, or None if the queue is full.
+        """
+        if omgeving not in self.omgevingen:
+            raise ValueError(f'Omgeving {omgeving} is not loaded, options are {", ".join(self.omgevingen)}')
+        if not self.slots.acquire(blocking=False):
+            self.metrics.update(rejected=1)
+            return None
+
+        start = time.monotonic()
+        self.metrics.update(in_progress=1)
+        f = tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False)
+        try:
+            with f:
+                f.write(data)
+            pool = self.pool
+            try:
+                result = pool.submit(convert, f.name, omgeving, sheets, df_range).result()
+            except BrokenProcessPool:
+                # A crashed worker breaks the whole pool, the next conversions get a new one
+                self.metrics.update(failed=1)
+                self.replace_pool(pool)
+                raise
+            except Exception:
+                self.metrics.update(failed=1)
+                raise
+            self.metrics.update(completed=1)
+            self.metrics.add_latency(time.monotonic() - start)
+            return result
+        finally:
+            self.metrics.update(in_progress=-1)
+            self.slots.release()
+            os.remove(f.name)
+
+    def close(self) -> None:
+        self.pool.shutdown(wait=True)
+
+
+def get_df_range(query):
+    """
+    Gets the range of data rows to convert from the start and end parameters of a request.
+
+    Returns:
+        Tuple[int, int | None]: The range, or None if neither parameter is given.
+
+    Raises:
+        ValueError: If start or end is not an integer.
+    """
+    if 'start' not in query and 'end' not in query:
+        return None
+    try:
+        return int(query.get('start', [0])[0]), int(query['end'][0]) if 'end' in query else None
+    except ValueError:
+        raise ValueError('start and end have to be integers') from None
+
+
+class ConversionRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'xls2xml'
+
+    def send_json(self, status, body) -> None:
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/metrics':
+            self.send_json(200, self.server.service.metrics.to_dict())
+        elif path == '/health':
+            self.send_json(200, {'status': 'ok', 'omgevingen': list(self.server.service.omgevingen)})
+        else:
+            self.send_json(404, {'error': f'Unknown path {path}'})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/convert':
+            self.send_json(404, {'error': f'Unknown path {url.path}'})
+            return
+
+        query = parse_qs(url.query)
+        length = int(self.headers.get('Content-Length') or 0)
+        if length == 0:
+            self.send_json(400, {'error': 'The request body has to contain the workbook'})
+            return
+        if length > MAX_UPLOAD_SIZE:
+            self.send_json(413, {'error': f'Workbooks are limited to {MAX_UPLOAD_SIZE} bytes'})
+            return
+        data = self.rfile.read(length)
+
+        omgeving = query.get('omgeving', ['productie'])[0]
+        sheets = [sheet for value in query.get('sheets', []) for sheet in value.split(',') if sheet] or None
+
+        try:
+            df_range = get_df_range(query)
+            result = self.server.service.convert(data, omgeving, sheets=sheets, df_range=df_range)
+        except ValueError as e:
+            self.send_json(400, {'error': str(e)})
+            return
+        except Exception as e:
+            self.send_json(500, {'error': f'Conversion failed: {e}'})
+            return
+
+        if result is None:
+            self.send_json(503, {'error': 'Too many conversions are waiting, try again later'})
+        else:
+            self.send_json(200, result)
+
+
+def create_server(service, host='127.0.0.1', port=8080) -> ThreadingHTTPServer:
+    """
+    Creates the HTTP server of a conversion service, serve it with serve_forever.
+    """
+    server = ThreadingHTTPServer((host, port), ConversionRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='service',
+                                     description='Serves conversions of xlsx-files to XML over HTTP with warm schemas')
+    parser.add_argument("--host", help="Address to listen on, default: 127.0.0.1", default='127.0.0.1')
+    parser.add_argument("-p", "--port", type=int, help="Port to listen on, default: 8080", default=8080)
+    parser.add_argument("-w", "--workers", type=int, help="Number of worker processes, default: 2", default=2)
+    parser.add_argument("-q", "--queue", type=int,
+                        help="Number of conversions that can wait for a free worker, default: 8", default=8)
+    parser.add_argument("-omg", "--omgeving", nargs='+', choices=OMGEVINGEN,
+                        help="Omgeving(en) of which the schemas are kept loaded, default: all",
+                        default=list(OMGEVINGEN))
+    args = parser.parse_args()
+
+    conversion_service = ConversionService(omgevingen=args.omgeving, workers=args.workers, queue_size=args.queue)
+    http_server = create_server(conversion_service, args.host, args.port)
+    print(f'Serving conversions on http://{args.host}:{args.port}')
+    try:
+        http_server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        http_server.server_close()
+        conversion_service.close()
@@ -1,31 +1,304 @@
 from xmlschema import XMLSchema
 from xmlschema import XMLSchemaValidationError
 from collections import defaultdict
+from src.prevalidation import PreValidator, PreValidationError
+from src.validation_cache import CachedValidationError
+
+NAMESPACES = {
+    'gml': 'http://www.opengis.net/gml/3.2',
+}
+
+
+def merge_row_ranges(ranges) -> list:
+    """
+    Merges overlapping or adjacent row ranges.
+
+    Args:
+        ranges (Iterable[Tuple[int, int]]): Inclusive row ranges.
+
+    Returns:
+        List[Tuple[int, int]]: Sorted, non-overlapping row ranges.
+    """
+    merged = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(last, merged[-1][1]))
+        else:
+            merged.append((first, last))
+    return merged
+
+
+def format_row_ranges(ranges) -> str:
+    return ', '.join(str(first) if first == last else f'{first}-{last}' for first, last in ranges)
+
+
+class SourceLocation:
+    """
+    Location of a converted object in the source workbook, as compact row ranges.
+    """
+
+    def __init__(self, sheet, data_node):
+        self.sheet = sheet
+        self.rows = merge_row_ranges(data_node.rows)
+        self._data_node = data_node
+        self._columns = None
+
+    @property
+    def columns(self) -> dict:
+        """
+        Row ranges of the values in every column of the object, computed on first access.
+        """
+        if self._columns is None:
+            columns = defaultdict(list)
+            self._data_node.collect_rows([], columns)
+            self._columns = {column: merge_row_ranges(ranges) for column, ranges in columns.items()}
+            self._data_node = None
+        return self._columns
+
+    def get_rows(self, name=None) -> list:
+        """
+        Retrieves the rows holding the values of a (nested) property of the object.
+
+        Args:
+            name (str, optional): Name of an element in the object. Defaults to None, meaning the whole object.
+
+        Returns:
+            List[Tuple[int, int]]: Inclusive row ranges, the rows of the whole object if name was not found.
+        """
+        if name is not None:
+            ranges = [r for column, column_ranges in self.columns.items()
+                      if name in (part.split(':')[-1] for part in column.split('-')) for r in column_ranges]
+            if ranges:
+                return merge_row_ranges(ranges)
+        return self.rows
+
+    def to_dict(self) -> dict:
+        return {'sheet': self.sheet, 'rows': self.rows, 'columns': self.columns}
+
+    def __str__(self) -> str:
+        if not self.rows:
+            return f"sheet '{self.sheet}'"
+        return f"sheet '{self.sheet}', rows {format_row_ranges(self.rows)}"
+
+    def __repr__(self) -> str:
+        return f'SourceLocation({self})'
+
+
+class CodelijstIssue:
+    """
+    Summary of a code in a codelijst column that is not in the codelijst.
+    """
+
+    def __init__(self, sheet, column, code, count, rows):
+        self.sheet = sheet
+        self.column = column
+        self.code = code
+        self.count = count
+        self.rows = rows
+
+    def to_dict(self) -> dict:
+        return {'sheet': self.sheet, 'column': self.column, 'code': self.code, 'count': self.count,
+                'rows': self.rows}
+
+    def __str__(self) -> str:
+        return f"sheet '{self.sheet}', column '{self.column}': unknown code '{self.code}' " \
+               f"({self.count}x, rows {format_row_ranges(self.rows)})"
+
+    def __repr__(self) -> str:
+        return f'CodelijstIssue({self})'
+
+
+class ReferenceIssue:
+    """
+    Summary of a reference to an object of another sheet that is not in that sheet.
+    """
+
+    def __init__(self, sheet, columns, value, target, count, rows):
+        self.sheet = sheet
+        self.columns = columns
+        self.value = value
+        self.target = target
+        self.count = count
+        self.rows = rows
+
+    def to_dict(self) -> dict:
+        return {'sheet': self.sheet, 'columns': self.columns, 'value': self.value, 'target': self.target,
+                'count': self.count, 'rows': self.rows}
+
+    def __str__(self) -> str:
+        return f"sheet '{self.sheet}', column '{', '.join(self.columns)}': '{', '.join(self.value)}' is not in " \
+               f"sheet '{self.target}' ({self.count}x, rows {format_row_ranges(self.rows)})"
+
+    def __repr__(self) -> str:
+        return f'ReferenceIssue({self})'
+
+
+def get_error_element_name(error):
+    """
+    Retrieves the local name of the element a validation error was raised on, if known.
+    """
+    if isinstance(error, (PreValidationError, CachedValidationError)):
+        return error.element.split(':')[-1] if error.element else None
+    elem = getattr(error, 'elem', None)
+    if elem is None or not isinstance(elem.tag, str):
+        return None
+    return elem.tag.rsplit('}', 1)[-1].split(':')[-1]
 
 
 class Validator:
-    def __init__(self, json_dict: dict, xml_schema: XMLSchema):
+    def __init__(self, json_dict: dict, xml_schema: XMLSchema, sources: dict = None, dfs_schema=None,
+                 codelijst_issues: list = None, cache=None, reference_issues: list = None):
         self.json_dict = json_dict
         self.xml_schema = xml_schema
+        self.sources = sources if sources is not None else {}
+        self.codelijst_issues = codelijst_issues if codelijst_issues is not None else []
+        self.reference_issues = reference_issues if reference_issues is not None else []
+        self.dfs_schema = dfs_schema
+        self.prevalidator = PreValidator(dfs_schema) if dfs_schema is not None else None
+        self.cache = cache
         self.corrected = defaultdict(list)
+        self.fragments = defaultdict(list)
         self.errors = defaultdict(list)
+        self.error_locations = defaultdict(list)
+        self.instrumentation = None
+
+    def validate(self, progress=None):
+        """
+        Validates every object, optionally reporting progress.
 
-    def validate(self):
+        Args:
+            progress (Callable[[str, int, int], None], optional): Called with 'validate', the number of validated
+                objects and the total number of objects after every object. Defaults to None.
+        """
+        total = sum(len(subjects) for subjects in self.json_dict.values() if isinstance(subjects, list))
+        done = 0
         for key, subjects in self.json_dict.items():
             if isinstance(subjects, list):
-                for subject in subjects:
+                locations = self.sources.get(key, [])
+                for i, subject in enumerate(subjects):
+                    if progress is not None:
+                        progress('validate', done, total)
+                    done += 1
                     try:
-                        self.xml_schema.encode({key: [subject]}, namespaces={
-                            'gml': 'http://www.opengis.net/gml/3.2',
-                        })
+                        if self.prevalidator is not None:
+                            self.prevalidator.check(key, subject)
+                        elem = self._encode(key, subject)
                         self.corrected[key].append(subject)
-                    except XMLSchemaValidationError as e:
+                        self.fragments[key].append(elem)
+                    except (PreValidationError, CachedValidationError, XMLSchemaValidationError) as e:
                         self.errors[key].append((subject, e))
+                        self.error_locations[key].append(locations[i] if i < len(locations) else None)
             else:
                 self.corrected[key] = subjects
 
+        if progress is not None:
+            progress('validate', total, total)
+        if self.cache is not None:
+            self.cache.commit()
+
+    def _encode(self, key, subject):
+        """
+        Encodes a single object to validate it, through the validation cache if there is one.
+
+        Returns:
+            Element: The encoded element of the object.
+        """
+        if self.cache is None:
+            return self.xml_schema.encode({key: [subject]}, namespaces=NAMESPACES)[0]
+
+        key_hash = self.cache.get_hash(key, subject)
+        cached = self.cache.get(key_hash)
+        if cached is not None:
+            elem, error = cached
+            if error is not None:
+                raise error
+            return elem
+
+        try:
+            elem = self.xml_schema.encode({key: [subject]}, namespaces=NAMESPACES)[0]
+        except XMLSchemaValidationError as e:
+            self.cache.put(key_hash, error=e, element=get_error_element_name(e))
+            raise
+        self.cache.put(key_hash, elem=elem)
+        return elem
+
+    def get_encoded(self):
+        """
+        Assembles the XML document from the elements encoded during validation, without encoding them again.
+
+        Returns:
+            Element: Root element holding all valid objects, or None if there are none.
+        """
+        if not self.fragments:
+            return None
+        root = self.xml_schema.encode({key: value for key, value in self.corrected.items()
+                                       if not isinstance(value, list)}, validation='skip', namespaces=NAMESPACES)
+        for elems in self.fragments.values():
+            root.extend(elems)
+        return root
+
+    def get_error_location(self, key, i):
+        """
+        Retrieves the source location of the i-th error of a type, or None if unknown.
+        """
+        locations = self.error_locations[key]
+        return locations[i] if i < len(locations) else None
+
+    def get_error_rows(self):
+        """
+        Collects the source rows of all objects that failed validation, per sheet.
+
+        Returns:
+            dict: Mapping of sheet name to the inclusive (first, last) row ranges of the failed objects.
+        """
+        rows = defaultdict(list)
+        for key in self.errors:
+            for location in self.error_locations[key]:
+                if location is not None:
+                    rows[location.sheet] += location.rows
+
+        return {sheet: merge_row_ranges(ranges) for sheet, ranges in rows.items()}
+
+    def to_dict(self) -> dict:
+        """
+        Gets the outcome of the validation as a structured report, the counterpart of get_error_rapport.
+
+        Returns:
+            dict: Number of detected, converted and failed objects per type, every error with its source location and
+                the unknown codes.
+        """
+        keys = (set(self.corrected.keys()) | set(self.errors.keys())) - {'@xmlns:gml'}
+        summary = {key: {'objects': len(self.corrected[key]) + len(self.errors[key]),
+                         'converted': len(self.corrected[key]), 'errors': len(self.errors[key])} for key in keys}
+        errors = []
+        for key in keys:
+            for i, (_, error) in enumerate(self.errors[key]):
+                location = self.get_error_location(key, i)
+                errors.append({'type': key, 'element': get_error_element_name(error), 'message': str(error),
+                               'source': location.to_dict() if location is not None else None})
+        report = {'summary': summary, 'errors': errors,
+                  'codelijsten': [issue.to_dict() for issue in self.codelijst_issues],
+                  'references': [issue.to_dict() for issue in self.reference_issues]}
+        if self.instrumentation is not None:
+            report['instrumentation'] = self.instrumentation.to_dict()
+        return report
+
     def get_error_rapport(self):
         rapport = ''
+        if self.codelijst_issues:
+            rapport += f'# Codelijsten: {len(self.codelijst_issues)} unknown code' + \
+                       f'{"s" if len(self.codelijst_issues) > 1 else ""} detected\n'
+            for issue in self.codelijst_issues:
+                rapport += f'\t{issue}\n'
+            rapport += '-------------------------------------\n'
+
+        if self.reference_issues:
+            rapport += f'# References: {len(self.reference_issues)} unknown object' + \
+                       f'{"s" if len(self.reference_issues) > 1 else ""} referenced\n'
+            for issue in self.reference_issues:
+                rapport += f'\t{issue}\n'
+            rapport += '-------------------------------------\n'
+
         for key in (set(self.corrected.keys()) | set(self.errors.keys())) - {'@xmlns:gml'}:
             correct = self.corrected[key]
             wrong = self.errors[key]
@@ -42,7 +315,15 @@ class Validator:
                 for i, error in enumerate(wrong):
                     o, e = error
                     e = str(e).replace("\n", "\n\t\t")
-                    rapport += f'\t {i + 1}. {key} with values {o}:\n\tThe following error occured:\n'
+                    rapport += f'\t {i + 1}. {key} with values {o}:\n'
+                    location = self.get_error_location(key, i)
+                    if location is not None:
+                        rapport += f'\tSource: {location}'
+                        name = get_error_element_name(error[1])
+                        if name is not None and location.get_rows(name) != location.rows:
+                            rapport += f' ({name}: rows {format_row_ranges(location.get_rows(name))})'
+                        rapport += '\n'
+                    rapport += '\tThe following error occured:\n'
                     rapport += f'\t\t{e}\n'
                     rapport += '-------------------------------------\n'
 
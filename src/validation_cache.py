@@ -0,0 +1,136 @@
+import configparser
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import xml.etree.ElementTree as ET
+
+
+def get_schema_version(project_root) -> str:
+    """
+    Reads the schema version the templates were generated for from config/config.ini.
+    """
+    config = configparser.ConfigParser()
+    config.read(os.path.join(project_root, 'config', 'config.ini'))
+    return config.get('generation', 'schema-version', fallback='unknown')
+
+
+class CachedValidationError(ValueError):
+    """
+    Validation error of an object that was recorded in the validation cache.
+    """
+
+    def __init__(self, message, element=None):
+        super().__init__(message)
+        self.element = element
+
+
+class ValidationCache:
+    """
+    Persistent cache of XSD validation outcomes, keyed by a hash of the object and the schema it was validated
+    against. The least recently used entries are evicted once the cache holds more than max_entries objects.
+    """
+
+    def __init__(self, filename, namespace='', max_entries=100000):
+        self.filename = filename
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(filename))
+        os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(filename, check_same_thread=False)
+        self._connection.execute('CREATE TABLE IF NOT EXISTS validation ('
+                                 'hash TEXT PRIMARY KEY, valid INTEGER, fragment TEXT, error TEXT, element TEXT, '
+                                 'last_used REAL)')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS validation_last_used ON validation (last_used)')
+        self._connection.commit()
+
+    def get_hash(self, key, subject) -> str:
+        """
+        Computes the canonical hash of an object of a type.
+
+        Args:
+            key (str): Type of the object.
+            subject (dict): Json dict of the object.
+
+        Returns:
+            str: Hex digest identifying the object and the schema of the cache.
+        """
+        canonical = json.dumps([self.namespace, key, subject], sort_keys=True, separators=(',', ':'),
+                               ensure_ascii=False, default=str)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def get(self, key_hash):
+        """
+        Looks up the validation outcome of an object.
+
+        Args:
+            key_hash (str): Hash of the object, see get_hash.
+
+        Returns:
+            Tuple[Element, None] | Tuple[None, CachedValidationError] | None: The encoded element of a valid
+            object, the error of an invalid object, or None if the object is not in the cache.
+        """
+        with self._lock:
+            row = self._connection.execute('SELECT valid, fragment, error, element FROM validation WHERE hash = ?',
+                                           (key_hash,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._connection.execute('UPDATE validation SET last_used = ? WHERE hash = ?', (time.time(), key_hash))
+
+        valid, fragment, error, element = row
+        if valid:
+            return ET.fromstring(fragment), None
+        return None, CachedValidationError(error, element)
+
+    def put(self, key_hash, elem=None, error=None, element=None) -> None:
+        """
+        Stores the validation outcome of an object.
+
+        Args:
+            key_hash (str): Hash of the object, see get_hash.
+            elem (Element, optional): Encoded element of a valid object.
+            error (Exception, optional): Validation error of an invalid object.
+            element (str, optional): Name of the element the error was raised on.
+        """
+        fragment = ET.tostring(elem, encoding='unicode') if elem is not None else None
+        with self._lock:
+            self._connection.execute('INSERT OR REPLACE INTO validation VALUES (?, ?, ?, ?, ?, ?)',
+                                     (key_hash, int(error is None), fragment,
+                                      None if error is None else str(error), element, time.time()))
+
+    def evict(self) -> None:
+        """
+        Removes the least recently used entries above max_entries.
+        """
+        with self._lock:
+            n = self._connection.execute('SELECT COUNT(*) FROM validation').fetchone()[0]
+            if n > self.max_entries:
+                self._connection.execute('DELETE FROM validation WHERE hash IN '
+                                         '(SELECT hash FROM validation ORDER BY last_used LIMIT ?)',
+                                         (n - self.max_entries,))
+
+    def commit(self) -> None:
+        """
+        Evicts entries above the size cap and writes the cache to disk.
+        """
+        self.evict()
+        with self._lock:
+            self._connection.commit()
+
+    def close(self) -> None:
+        self.commit()
+        self._connection.close()
+
+    def __str__(self):
+        return f'ValidationCache({self.filename}, hits={self.hits}, misses={self.misses})'
+
+    def __repr__(self):
+        return self.__str__()
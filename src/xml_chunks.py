@@ -0,0 +1,174 @@
+"""
+Splitting of the converted objects over several XML documents of limited size. Objects that refer to each other, such
+as a filter, its grondwaterlocatie and its filtermetingen (see src.references), are kept in the same document.
+"""
+
+import xml.etree.ElementTree as ET
+from collections import defaultdict
+
+from src.dfs_schema import ChoiceNode, SequenceNode
+from src.references import get_references, get_sheet_identifiers
+from src.validation import NAMESPACES
+
+
+def get_json_path(node, column) -> list:
+    """
+    Gets the keys of a column in the json dict of an object, in which choices and sequences are flattened.
+
+    Args:
+        node (Node): Schema node of the sheet.
+        column (str): Name of the column.
+
+    Returns:
+        List[str]: The keys.
+    """
+    path = []
+    for name in column.split('-'):
+        node = node.get_specific_child(name)
+        if not isinstance(node, (ChoiceNode, SequenceNode)):
+            path.append(name)
+    return path
+
+
+def get_json_value(subject, path):
+    """
+    Gets the first value at a path of keys in the json dict of an object, or None if it has no value there.
+    """
+    value = subject
+    for name in path:
+        if not isinstance(value, dict) or not value.get(name):
+            return None
+        value = value[name][0]
+    return None if isinstance(value, dict) else value
+
+
+def get_object_groups(corrected, root) -> list:
+    """
+    Groups the objects that refer to each other, directly or through other objects.
+
+    Args:
+        corrected (dict): Json dict of the valid objects, keyed by sheet, see Validator.corrected.
+        root (Node): Root node of the depth-first schema tree.
+
+    Returns:
+        List[List[Tuple[str, int]]]: Sheet and position of the objects of every group, in the order of their first
+            object.
+    """
+    objects = [(key, i) for key, subjects in corrected.items() if isinstance(subjects, list)
+               for i in range(len(subjects))]
+    ids = {obj: n for n, obj in enumerate(objects)}
+    parent = list(range(len(objects)))
+
+    def find(n):
+        while parent[n] != n:
+            parent[n] = parent[parent[n]]
+            n = parent[n]
+        return n
+
+    def union(a, b):
+        a, b = find(a), find(b)
+        if a != b:
+            parent[max(a, b)] = min(a, b)
+
+    identifiers = get_sheet_identifiers(root)
+    targets = {}  # (target, target columns): {value: id of the first object with that value}
+    for key, subjects in corrected.items():
+        if not isinstance(subjects, list) or key not in identifiers:
+            continue
+        node = root.get_specific_child(key)
+        for reference in get_references(root, key, identifiers):
+            if not isinstance(corrected.get(reference.target), list):
+                continue
+            target_key = (reference.target, reference.target_columns)
+            if target_key not in targets:
+                target_node = root.get_specific_child(reference.target)
+                paths = [get_json_path(target_node, column) for column in reference.target_columns]
+                lookup = {}
+                for i, subject in enumerate(corrected[reference.target]):
+                    value = tuple(get_json_value(subject, path) for path in paths)
+                    if None not in value:
+                        union(lookup.setdefault(value, ids[(reference.target, i)]), ids[(reference.target, i)])
+                targets[target_key] = lookup
+
+            paths = [get_json_path(node, column) for column in reference.columns]
+            for i, subject in enumerate(subjects):
+                target = targets[target_key].get(tuple(get_json_value(subject, path) for path in paths))
+                if target is not None:
+                    union(ids[(key, i)], target)
+
+    groups = defaultdict(list)
+    for n, obj in enumerate(objects):
+        groups[find(n)].append(obj)
+    return [groups[n] for n in sorted(groups)]
+
+
+class XmlChunk:
+    """
+    Objects that are written to the same XML document.
+    """
+
+    def __init__(self):
+        self.objects = []
+        self.size = 0
+
+    def get_counts(self) -> dict:
+        counts = defaultdict(int)
+        for key, _ in self.objects:
+            counts[key] += 1
+        return dict(counts)
+
+    def __len__(self) -> int:
+        return len(self.objects)
+
+    def __repr__(self) -> str:
+        return f'XmlChunk({len(self.objects)} objects, {self.size} bytes)'
+
+
+def get_chunks(validator, root, max_objects=None, max_bytes=None) -> list:
+    """
+    Divides the valid objects of a conversion over XML documents. A group of objects that refer to each other is
+    never divided, so a document only exceeds the limits if it holds a single group that exceeds them.
+
+    Args:
+        validator (Validator): Validator of the conversion.
+        root (Node): Root node of the depth-first schema tree.
+        max_objects (int, optional): Maximum number of objects per document. Defaults to None, meaning no limit.
+        max_bytes (int, optional): Maximum size of the objects of a document in bytes, as serialized separately.
+            Defaults to None, meaning no limit.
+
+    Returns:
+        List[Tuple[Element, XmlChunk]]: The root element of every document and its objects.
+
+    Raises:
+        ValueError: If a limit is not positive.
+    """
+    if max_objects is not None and max_objects < 1:
+        raise ValueError(f'The maximum number of objects per document has to be positive, not {max_objects}')
+    if max_bytes is not None and max_bytes < 1:
+        raise ValueError(f'The maximum size of a document has to be positive, not {max_bytes}')
+
+    corrected = validator.corrected
+    keys = [key for key, subjects in corrected.items() if isinstance(subjects, list)]
+    # The elements encoded during validation, in the order of the valid objects
+    elements = validator.fragments
+
+    chunks = [XmlChunk()]
+    for group in get_object_groups(corrected, root):
+        size = sum(len(ET.tostring(elements[key][i], encoding='utf-8')) for key, i in group) if max_bytes else 0
+        chunk = chunks[-1]
+        if chunk.objects and ((max_objects is not None and len(chunk) + len(group) > max_objects) or
+                              (max_bytes is not None and chunk.size + size > max_bytes)):
+            chunk = XmlChunk()
+            chunks.append(chunk)
+        chunk.objects += group
+        chunk.size += size
+
+    attributes = {key: value for key, value in corrected.items() if not isinstance(value, list)}
+    order = {key: n for n, key in enumerate(keys)}
+    documents = []
+    for chunk in chunks:
+        chunk.objects.sort(key=lambda obj: (order[obj[0]], obj[1]))
+        xml = validator.xml_schema.encode(attributes, validation='skip', namespaces=NAMESPACES)
+        xml.extend(elements[key][i] for key, i in chunk.objects)
+        documents.append((xml, chunk))
+    return documents
@@ -0,0 +1,138 @@
+import os
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from ordered_set import OrderedSet
+
+from src.dfs_schema import Node, get_dfs_schema
+from src.read_excel import ColumnarSheet, IdentifierCodes, get_partition, recursive_data_read, data_node_to_json, \
+    parse_coordinates, clean_data
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ColumnarSheetTest(unittest.TestCase):
+    def setUp(self):
+        self.node = get_dfs_schema(PROJECT_ROOT, 'productie').get_specific_child('filter')
+        self.df = pd.DataFrame({
+            'identificatie': ['F1', np.nan, 'F2', 'F1', np.nan],
+            'grondwaterlocatie': ['GW1', np.nan, 'GW2', 'GW1', np.nan],
+            'filtertype': ['peilfilter', np.nan, 'pompfilter', 'peilfilter', np.nan],
+            'onbekend': [1, 2, 3, 4, 5],
+        }, index=pd.RangeIndex(10, 15), dtype=object)
+
+    def read(self, df, codes=None):
+        partition = get_partition(df, np.ones(df.shape[0], dtype=bool), [], self.node, codes=codes)
+        objects = []
+        for part in partition:
+            data_node = recursive_data_read(df[part], self.node, [], codes=codes)
+            # As in read_sheets, the leaves without data are removed before the conversion to json
+            data_node.delete_empty()
+            objects.append(data_node_to_json(data_node, self.node))
+        return partition, objects
+
+    def test_same_objects(self):
+        sheet = ColumnarSheet.from_dataframe(self.df, self.node)
+        self.assertEqual(sheet.shape, self.df.shape)
+        self.assertEqual(sheet.get_codes('identificatie').dtype, np.int8)
+
+        partition, objects = self.read(self.df)
+        columnar_partition, columnar_objects = self.read(sheet)
+        self.assertEqual([p.tolist() for p in partition], [p.tolist() for p in columnar_partition])
+        self.assertEqual(objects, columnar_objects)
+        self.assertEqual(len(objects), 2)
+
+    def test_identifier_codes(self):
+        codes = IdentifierCodes(self.df)
+        partition, objects = self.read(self.df, codes)
+        self.assertEqual([p.tolist() for p in partition],
+                         [[True, True, False, True, True], [False, False, True, False, False]])
+        self.assertEqual(objects, self.read(self.df)[1])
+        self.assertEqual(objects, [
+            [{'identificatie': ['F1'], 'filtertype': ['peilfilter'], 'grondwaterlocatie': ['GW1']}],
+            [{'identificatie': ['F2'], 'filtertype': ['pompfilter'], 'grondwaterlocatie': ['GW2']}],
+        ])
+        self.assertIn('identificatie', codes.codes)
+
+        # Selections of rows take the codes of the sheet instead of factorizing again
+        selection = self.df[np.array([False, False, True, True, True])]
+        self.assertEqual(codes.get_codes('identificatie', selection).tolist(), [1, 0, -1])
+
+    def test_mixed_type_identifiers(self):
+        # Equal values of a different type are different identifiers, as their leaves are cleaned differently
+        self.df['identificatie'] = pd.Series([1, np.nan, 1.0, True, np.nan], index=self.df.index, dtype=object)
+        sheet = ColumnarSheet.from_dataframe(self.df, self.node)
+        self.assertEqual(sheet.values['identificatie'], ['1', '1.0', 'True'])
+
+        partition, objects = self.read(self.df, IdentifierCodes(self.df))
+        columnar_partition, columnar_objects = self.read(sheet)
+        self.assertEqual([p.tolist() for p in partition], [p.tolist() for p in columnar_partition])
+        self.assertEqual(objects, columnar_objects)
+        self.assertEqual(objects, self.read(self.df)[1])
+        self.assertEqual([o[0]['identificatie'] for o in objects], [['1'], ['1.0'], ['True']])
+
+    def test_selection(self):
+        sheet = ColumnarSheet.from_dataframe(self.df, self.node)
+        selection = sheet[np.array([False, True, True, False, True])][np.array([False, True, True])]
+        self.assertEqual(selection.index.tolist(), [12, 14])
+        self.assertEqual([sheet.values['identificatie'][c] if c >= 0 else None
+                          for c in selection.get_codes('identificatie').tolist()], ['F2', None])
+
+
+class LeafTest(unittest.TestCase):
+    def test_distinct_values(self):
+        leaf = Node()
+        leaf.name, leaf.binding, leaf.max_amount = 'opmerking', 'java.lang.String', 1
+        node = Node()
+        node.name, node.max_amount, node.children = 'filter', 1, [leaf]
+        df = pd.DataFrame({'opmerking': ['a', 'a', np.nan, 1, 1.0, 'b', 'a', np.nan]}, index=pd.RangeIndex(10, 18),
+                          dtype=object)
+
+        # Every cell cleaned separately, as the leaves were read before the deduplication
+        expected, rows = OrderedSet(), []
+        for row, d in zip(df.index, df['opmerking']):
+            d = clean_data(d, leaf)
+            if d is not None:
+                expected.add(d)
+                rows.append(row)
+
+        data_node = recursive_data_read(df, node, []).children['opmerking'][0]
+        self.assertEqual(data_node.data, list(expected))
+        self.assertEqual(data_node.data, ['a', '1', '1.0', 'b'])
+        self.assertEqual(data_node.rows, [(10, 11), (13, 16)])
+
+
+class CoordinatesTest(unittest.TestCase):
+    def setUp(self):
+        self.leaf = Node()
+        self.leaf.name, self.leaf.binding, self.leaf.max_amount = 'gml:posList', 'java.util.List', 1
+        self.node = Node()
+        self.node.name, self.node.max_amount, self.node.children = 'gml:LinearRing', 1, [self.leaf]
+        self.df = pd.DataFrame({'gml:posList': ['0 0 10.5 0,10.5 20', np.nan, '', '0 0 1e3 -0.0  7', '0 0']},
+                               index=pd.RangeIndex(10, 15), dtype=object)
+
+    def test_parse_coordinates(self):
+        coordinates, offsets = parse_coordinates(['1 2,3', '', ' 4.5 '])
+        self.assertEqual(coordinates.tolist(), [1.0, 2.0, 3.0, 4.5])
+        self.assertEqual(offsets.tolist(), [0, 3, 3, 4])
+        with self.assertRaises(ValueError):
+            parse_coordinates(['1 x'])
+
+    def test_same_data(self):
+        # Numbers of all rows in an OrderedSet, as the leaves were read before the bulk parsing
+        expected = OrderedSet(float(n) for cell in self.df['gml:posList'] if isinstance(cell, str)
+                              for k in cell.split(',') for n in k.split(' ') if n != '')
+        for df in (self.df, ColumnarSheet.from_dataframe(self.df, self.node)):
+            data_node = recursive_data_read(df, self.node, []).children['gml:posList'][0]
+            self.assertEqual(data_node.data, list(expected))
+            self.assertEqual(data_node.rows, [(10, 10), (12, 14)])
+
+        self.df.iloc[1, 0] = 5
+        with self.assertRaises(AttributeError):
+            recursive_data_read(self.df, self.node, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from src.dfs_schema import Node, ChoiceNode, SequenceNode, get_dfs_schema, \
+    get_dfs_schema_from_local, get_dfs_schema_from_url, get_XML_schema, get_identifiers, compare_nodes
+from src.schema_artifact import get_artifact_filename, read_schema_artifact, write_schema_artifact
+from src.validation_cache import get_schema_version
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+XSD = """<?xml version="1.0"?>
+<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema" xmlns="http://kern.schemas.dov.vlaanderen.be/test/1.0"
+           targetNamespace="http://kern.schemas.dov.vlaanderen.be/test/1.0">
+  <xs:simpleType name="FiltertypeEnumType">
+    <xs:restriction base="xs:string">
+      <xs:enumeration value="peilfilter"/>
+      <xs:enumeration value="pompfilter"/>
+    </xs:restriction>
+  </xs:simpleType>
+  <xs:simpleType name="Diepte">
+    <xs:restriction base="xs:decimal"><xs:minInclusive value="0"/></xs:restriction>
+  </xs:simpleType>
+  <xs:complexType name="BeheerderType">
+    <xs:sequence>
+      <xs:element name="naam" type="xs:string"/>
+      <xs:choice>
+        <xs:element name="kbonummer" type="xs:string"/>
+        <xs:sequence>
+          <xs:element name="ovocode" type="xs:string"/>
+          <xs:element name="afdeling" type="xs:string" minOccurs="0"/>
+        </xs:sequence>
+      </xs:choice>
+    </xs:sequence>
+  </xs:complexType>
+  <xs:complexType name="FilterType">
+    <xs:sequence>
+      <xs:element name="filtertype" type="FiltertypeEnumType"/>
+      <xs:sequence>
+        <xs:element name="diepte" type="Diepte" minOccurs="0"/>
+      </xs:sequence>
+      <xs:element name="beheerder" type="BeheerderType" maxOccurs="unbounded"/>
+    </xs:sequence>
+  </xs:complexType>
+  <xs:element name="dov-schema">
+    <xs:complexType>
+      <xs:sequence>
+        <xs:element name="filter" type="FilterType" minOccurs="0" maxOccurs="unbounded"/>
+        <xs:element name="opdracht" type="FilterType" minOccurs="0" maxOccurs="unbounded"/>
+      </xs:sequence>
+    </xs:complexType>
+  </xs:element>
+</xs:schema>
+"""
+
+
+def iter_nodes(node):
+    yield node
+    for child in node.children:
+        yield from iter_nodes(child)
+
+
+class DfsSchemaTest(unittest.TestCase):
+    def test_clone(self):
+        child = Node()
+        child.name = 'kbonummer'
+        choice = ChoiceNode()
+        choice.name = 'choice_1'
+        choice.children = [child]
+
+        shallow = choice.clone(deep=False)
+        deep = choice.clone()
+        self.assertIsInstance(deep, ChoiceNode)
+        self.assertIs(shallow.children[0], child)
+        self.assertIsNot(deep.children[0], child)
+        self.assertEqual(deep.children[0].name, 'kbonummer')
+
+    def test_local_schema_does_not_share_nodes(self):
+        # Types are expanded once and shared while building, the returned tree has to be safe to change
+        for filename in ('xsd_schema.json', 'xsd_schema_oefen.json', 'xsd_schema_ontwikkel.json'):
+            root = get_dfs_schema_from_local(PROJECT_ROOT, filename)
+            nodes = list(iter_nodes(root))
+            self.assertEqual(len(nodes), len({id(node) for node in nodes}))
+
+    def test_concurrent_builds(self):
+        # The GUI preloads the schema of every chosen omgeving in its own thread
+        omgevingen = ['productie', 'oefen', 'ontwikkel'] * 2
+        expected = {omgeving: get_dfs_schema(PROJECT_ROOT, omgeving, use_artifact=False) for omgeving in omgevingen}
+        roots = [None] * len(omgevingen)
+
+        def build(i):
+            roots[i] = get_dfs_schema(PROJECT_ROOT, omgevingen[i], use_artifact=False)
+
+        threads = [threading.Thread(target=build, args=(i,)) for i in range(len(omgevingen))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for omgeving, root in zip(omgevingen, roots):
+            compare_nodes(expected[omgeving], root)
+
+    def test_schema_from_xsd(self):
+        import xmlschema
+
+        root = get_dfs_schema_from_url(None, xml_schema=xmlschema.XMLSchema(XSD))
+        self.assertEqual([c.name for c in root.children], ['filter', 'opdracht'])
+
+        # The nested sequence of the filter is flattened, the sequence branch of the choice is kept
+        filter_node = root.get_specific_child('filter')
+        self.assertEqual([c.name for c in filter_node.children], ['filtertype', 'diepte', 'beheerder'])
+        choice = filter_node.get_specific_child('beheerder').get_specific_child('choice_1')
+        self.assertIsInstance(choice, ChoiceNode)
+        self.assertIsInstance(choice.children[1], SequenceNode)
+        self.assertEqual([c.name for c in choice.children[1].children], ['ovocode', 'afdeling'])
+
+        # Types shared by several elements give the same bindings and codes
+        for name in ('filter', 'opdracht'):
+            node = root.get_specific_child(name)
+            self.assertEqual(node.get_specific_child('filtertype').enum, ['peilfilter', 'pompfilter'])
+            self.assertEqual(node.get_specific_child('diepte').binding, 'java.math.BigDecimal')
+
+    def test_xml_schema_cache_failure(self):
+        class Unpicklable:
+            def __reduce__(self):
+                raise RecursionError('maximum recursion depth exceeded while pickling an object')
+
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        xml_schema = Unpicklable()
+        with mock.patch('xmlschema.XMLSchema', return_value=xml_schema):
+            self.assertIs(get_XML_schema('oefen', cache_dir), xml_schema)
+        # The partly written cache file is removed
+        self.assertEqual(os.listdir(cache_dir), [])
+
+    def test_schema_artifact(self):
+        root = get_dfs_schema(PROJECT_ROOT, 'oefen', use_artifact=False)
+        project_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, project_root)
+        shutil.copytree(os.path.join(PROJECT_ROOT, 'config'), os.path.join(project_root, 'config'))
+        filename = get_artifact_filename(project_root, 'oefen')
+
+        write_schema_artifact(root, filename, '0.0.1')
+        artifact = read_schema_artifact(filename)
+        compare_nodes(root, artifact.root)
+        self.assertEqual([type(n) for n in iter_nodes(root)], [type(n) for n in iter_nodes(artifact.root)])
+        self.assertEqual(artifact.source, ('local', 'oefen'))
+        self.assertEqual(artifact.max_depth, root.get_max_depth())
+
+        # The sheets of the loaded tree use the recorded identifiers and max depth
+        sheet = artifact.root.children[0]
+        expected = []
+        get_identifiers(root.children[0], [], expected)
+        self.assertEqual(sheet.identifiers, expected)
+        self.assertEqual(sheet.get_max_depth(), root.children[0].get_max_depth())
+        identifiers = []
+        get_identifiers(sheet, [], identifiers)
+        self.assertIs(identifiers[0], sheet.identifiers[0])
+        self.assertNotIn('max_depth', sheet.clone().__dict__)
+
+        # The artifact is only used when its schema-version matches config/config.ini
+        name = root.children[0].name
+        root.children[0].name = 'uit_artifact'
+        write_schema_artifact(root, filename, get_schema_version(project_root))
+        self.assertEqual(get_dfs_schema(project_root, 'oefen').children[0].name, 'uit_artifact')
+        # An artifact built from the local json schema is not used in online mode
+        with mock.patch('src.dfs_schema.get_dfs_schema_from_url', return_value=root.clone()):
+            self.assertEqual(get_dfs_schema(project_root, 'oefen', 'online').source, ('online', 'oefen'))
+        write_schema_artifact(root, filename, '0.0.1')
+        self.assertEqual(get_dfs_schema(project_root, 'oefen').children[0].name, name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import json
+import os
+import shutil
+import tempfile
+import tracemalloc
+import unittest
+
+from src.instrumentation import Instrumentation, NO_INSTRUMENTATION, Profiler
+
+
+class InstrumentationTest(unittest.TestCase):
+    def test_stages(self):
+        instrumentation = Instrumentation()
+        with instrumentation:
+            with instrumentation:
+                with instrumentation.stage('read', 'filter') as record:
+                    data = [0] * 100000
+                    record.counts['rows'] = len(data)
+            self.assertTrue(tracemalloc.is_tracing())
+            with instrumentation.stage('write'):
+                pass
+        self.assertFalse(tracemalloc.is_tracing())
+
+        read, write = instrumentation.records
+        self.assertEqual((read.stage, read.sheet, read.counts), ('read', 'filter', {'rows': 100000}))
+        self.assertGreater(read.peak_memory, 800000)
+        self.assertIsNone(write.sheet)
+        self.assertEqual(set(instrumentation.get_totals()), {'read', 'write'})
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = os.path.join(directory, 'profile.json')
+        instrumentation.to_json(filename)
+        with open(filename) as f:
+            self.assertEqual(json.load(f)['stages'][0]['counts'], {'rows': 100000})
+
+    def test_no_instrumentation(self):
+        with NO_INSTRUMENTATION:
+            with NO_INSTRUMENTATION.stage('read') as record:
+                record.counts['rows'] = 1
+        self.assertEqual(len(NO_INSTRUMENTATION.records), 0)
+
+    def test_profiler(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        with Profiler(os.path.join(directory, 'result.xml')) as profiler:
+            sorted(range(1000), key=str)
+        self.assertEqual(profiler.filename, os.path.join(directory, 'result.pstats'))
+        self.assertTrue(os.path.exists(profiler.filename))
+        self.assertIn('cumulative', profiler.get_top(5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from src.dfs_schema import get_dfs_schema
+from src.object_index import ObjectIndex, get_index_filename
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKBOOK = os.path.join(PROJECT_ROOT, 'tests', 'data', 'filled_templates', 'grondwater_template_full.xlsx')
+
+
+class ObjectIndexTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.filename = os.path.join(directory, 'workbook.xlsx')
+        with open(self.filename, 'wb') as f:
+            f.write(b'workbook')
+
+        self.index = ObjectIndex(self.filename, 'productie:1.0')
+        self.index.add_sheet('filter', ['identificatie', 'grondwaterlocatie'], [
+            (['F1', 'GW1'], [(4, 5), (9, 9)]),
+            (['F2', 'GW1'], [(6, 8)]),
+            (['F3', None], [(10, 10)]),
+        ])
+
+    def test_find(self):
+        self.assertEqual(self.index.find('filter', ['F2', 'F1']), [0, 1])
+        self.assertEqual(self.index.find('filter', [{'grondwaterlocatie': 'GW1'}]), [0, 1])
+        self.assertEqual(self.index.find('filter', ['F4']), [])
+        self.assertEqual(self.index.get_rows('filter', ['F1', 'F3']), [4, 5, 9, 10])
+        with self.assertRaises(ValueError):
+            self.index.find('filter', [{'filtertype': 'peilfilter'}])
+
+    def test_numeric_identifiers(self):
+        from src.read_excel import get_object_identifiers
+
+        # Numbers are read as floats in a column with empty cells
+        node = get_dfs_schema(PROJECT_ROOT, 'productie').get_specific_child('filter')
+        df = pd.DataFrame({'identificatie': [12345, np.nan, 2.5]}, index=pd.RangeIndex(4, 7))
+        partition = [np.array([True, True, False]), np.array([False, False, True])]
+        self.index.add_sheet('filter', *get_object_identifiers(df, partition, node))
+        self.assertEqual(self.index.sheets['filter']['objects'][0][0], ['12345'])
+        self.assertEqual(self.index.find('filter', ['12345', 2.5]), [0, 1])
+        self.assertEqual(self.index.find('filter', [12345.0]), [0])
+
+    def test_persistence(self):
+        self.index.save()
+        self.assertTrue(os.path.exists(get_index_filename(self.filename)))
+        self.assertEqual(ObjectIndex.load(self.filename, 'productie:1.0').sheets, self.index.sheets)
+        self.assertNotIn('filter', ObjectIndex.load(self.filename, 'oefen:1.0'))
+
+        # The index of an earlier version of the workbook is discarded
+        with open(self.filename, 'ab') as f:
+            f.write(b' changed')
+        self.assertNotIn('filter', ObjectIndex.load(self.filename, 'productie:1.0'))
+
+    def test_read_selected_objects(self):
+        from src.read_excel import read_sheets
+
+        object_index = ObjectIndex(WORKBOOK, 'productie')
+        _, validator = read_sheets(WORKBOOK, ['filter'], object_index=object_index)
+        self.assertIn('filter', object_index)
+        objects = object_index.sheets['filter']['objects']
+        identifier = objects[-1][0][0]
+
+        # The second conversion only reads the rows of the selected object
+        _, selected = read_sheets(WORKBOOK, ['filter'], objects={'filter': [identifier]}, object_index=object_index)
+        self.assertEqual(selected.to_dict()['summary']['filter']['objects'], 1)
+        self.assertEqual(validator.to_dict()['summary']['filter']['objects'], len(objects))
+
+
+if __name__ == '__main__':
+    unittest.main()
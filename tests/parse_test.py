@@ -0,0 +1,115 @@
+import datetime
+import decimal
+import random
+import unittest
+
+import dateutil.parser as parser
+import numpy as np
+
+from src.read_excel import parse_date, parse_time, parse_date_string, parse_time_string, parse_float
+
+DATES = ['12/03/2020', '12-03-2020', '12.03.2020', '1/3/2020', '13/12/2020', '12/13/2020', '29/02/2020',
+         '2020-03-12', '2020-3-1', '2020-13-01', '2020-03-13', '2020-31-12', '2020-12-31', ' 12/03/2020 ',
+         '01-12-2020 08:00:00', '2020-03-12T10:11:12', '2020-03-12 10:11:12.5', '12/03/20', '12 maart 2020']
+INVALID_DATES = ['31/02/2020', '13/13/2020', '0/3/2020', '2020-02-30', '2020-13-13', '12/03/2020 25:00']
+TIMES = ['10:11:12', '9:05', '10:11:12.123', ' 23:59:59 ', '2020-03-12 10:11:12', '12/03/2020 08:00', '10u15']
+INVALID_TIMES = ['24:00:00', '25:00', '10:60']
+
+
+def reference_parse_float(f):
+    # parse_float before it was memoized, using the decimal context of the thread
+    f = str(f).replace(',', '.').replace(' ', '')
+    t = format(decimal.Decimal(f), '.50f').rstrip('0').rstrip('.')
+    if '.' not in t:
+        t += '.0'
+    return t
+
+
+def random_number(rng):
+    kind = rng.randrange(5)
+    if kind == 0:
+        return rng.uniform(-1, 1) * 10 ** rng.randint(-30, 30)
+    if kind == 1:
+        return rng.randint(-10 ** 20, 10 ** 20)
+    if kind == 2:
+        return rng.choice([0.0, -0.0, 0, 1e-5, 1e16, 0.1, 100.0, float('inf')])
+    digits = ''.join(rng.choice('0123456789') for _ in range(rng.randint(0, 6)))
+    fraction = ''.join(rng.choice('0000123456789') for _ in range(rng.randint(0, 60 if kind == 3 else 4)))
+    s = rng.choice(['', '-', '+']) + digits + rng.choice(['.', ',', '']) + fraction
+    if rng.random() < 0.2:
+        s += rng.choice(['e5', 'E-3', ' ', 'x'])
+    if rng.random() < 0.2 and len(s) > 1:
+        position = rng.randrange(1, len(s))
+        s = s[:position] + ' ' + s[position:]
+    return s
+
+
+def dateutil_date(s):
+    return parser.parse(s, dayfirst=True).strftime("%Y-%m-%d")
+
+
+def dateutil_time(s):
+    return parser.parse(s, dayfirst=True).strftime("%H:%M:%S")
+
+
+class ParseTest(unittest.TestCase):
+    def assertSameResult(self, fast, reference, s):
+        try:
+            expected = reference(s)
+        except (ValueError, OverflowError, ArithmeticError):
+            with self.assertRaises((ValueError, OverflowError, ArithmeticError), msg=s):
+                fast(s)
+        else:
+            self.assertEqual(fast(s), expected, msg=s)
+
+    def test_dates(self):
+        for s in DATES + INVALID_DATES:
+            self.assertSameResult(parse_date, dateutil_date, s)
+
+    def test_times(self):
+        for s in TIMES + INVALID_TIMES:
+            self.assertSameResult(parse_time, dateutil_time, s)
+
+    def test_random_strings(self):
+        rng = random.Random(0)
+        for _ in range(2000):
+            numbers = [str(rng.randint(0, 32)).zfill(rng.randint(1, 2)),
+                       str(rng.randint(0, 14)).zfill(rng.randint(1, 2))]
+            year = str(rng.randint(1, 2100)).zfill(4)
+            separator = rng.choice('/-.')
+            s = separator.join([year] + numbers if separator == '-' and rng.random() < 0.5 else numbers + [year])
+            if rng.random() < 0.3:
+                s += f' {rng.randint(0, 25)}:{rng.randint(0, 61):02d}:{rng.randint(0, 61):02d}'
+            self.assertSameResult(parse_date_string, dateutil_date, s)
+            self.assertSameResult(parse_time_string, dateutil_time, s)
+
+    def test_floats(self):
+        rng = random.Random(0)
+        for _ in range(5000):
+            self.assertSameResult(parse_float, reference_parse_float, random_number(rng))
+        self.assertEqual(parse_float(-0.0), '-0.0')
+        self.assertEqual(parse_float(0.0), '0.0')
+        self.assertEqual(parse_float('1 000,50'), '1000.5')
+
+    def test_float_context(self):
+        # parse_float does not depend on nor change the decimal context of the thread
+        with decimal.localcontext() as context:
+            context.prec = 3
+            context.rounding = decimal.ROUND_DOWN
+            self.assertEqual(parse_float('0.' + '0' * 49 + '19'), '0.' + '0' * 49 + '2')
+            self.assertEqual(parse_float(1e-5), '0.00001')
+            self.assertEqual(context.prec, 3)
+
+    def test_values(self):
+        self.assertEqual(parse_date(datetime.datetime(2020, 3, 12, 10, 11, 12)), '2020-03-12')
+        self.assertEqual(parse_time(datetime.time(10, 11, 12)), '10:11:12')
+        # A number in a date or time cell of a workbook, e.g. a year, is reported instead of read as a serial date
+        for value in (2020, 43902.42, np.int64(2020)):
+            with self.assertRaises(ValueError):
+                parse_date(value)
+            with self.assertRaises(ValueError):
+                parse_time(value)
+
+
+if __name__ == '__main__':
+    unittest.main()
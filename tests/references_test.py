@@ -0,0 +1,68 @@
+import os
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from src.dfs_schema import get_dfs_schema
+from src.references import ReferenceIndex, get_references
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ReferenceIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.root = get_dfs_schema(PROJECT_ROOT, 'productie')
+
+    def test_references(self):
+        references = {(r.columns, r.target, r.target_columns) for r in get_references(self.root, 'filtermeting')}
+        self.assertIn((('grondwaterlocatie',), 'grondwaterlocatie', ('identificatie',)), references)
+        self.assertIn((('filter-identificatie', 'filter-filtertype'), 'filter', ('identificatie', 'filtertype')),
+                      references)
+        # Nested objects named after a sheet are no references
+        self.assertFalse(any(r[0][0].startswith('watermonster-observatie-p') for r in references))
+
+        references = {(r.columns, r.target) for r in get_references(self.root, 'bodemlocatieclassificatie')}
+        self.assertEqual(references, {(('ref_bodemlocatie-naam',), 'bodemlocatie')})
+
+    def test_dangling_references(self):
+        index = ReferenceIndex(self.root, ['grondwaterlocatie', 'filter', 'filtermeting'])
+        index.add_sheet('filtermeting', pd.DataFrame({
+            'grondwaterlocatie': ['GW1', np.nan, 'GW3', 'GW3', 'GW1'],
+            'filter-identificatie': ['F1', np.nan, 'F1', 'F1', 'F2'],
+            'filter-filtertype': ['peilfilter', np.nan, 'peilfilter', 'peilfilter', 'pompfilter'],
+        }, index=pd.RangeIndex(4, 9), dtype=object))
+        index.add_sheet('grondwaterlocatie', pd.DataFrame({'identificatie': ['GW1', 'GW2']},
+                                                          index=pd.RangeIndex(4, 6), dtype=object))
+        index.add_sheet('filter', pd.DataFrame({
+            'identificatie': ['F1', 'F2'],
+            'filtertype': ['peilfilter', 'peilfilter'],
+            'grondwaterlocatie': ['GW1', 'GW4'],
+        }, index=pd.RangeIndex(4, 6), dtype=object))
+
+        issues = sorted((issue.sheet, issue.target, tuple(issue.value), issue.rows) for issue in index.get_issues())
+        self.assertEqual(issues, [
+            ('filter', 'grondwaterlocatie', ('GW4',), [(5, 5)]),
+            ('filtermeting', 'filter', ('F2', 'pompfilter'), [(8, 8)]),
+            ('filtermeting', 'grondwaterlocatie', ('GW3',), [(6, 7)]),
+        ])
+
+    def test_numeric_identifiers(self):
+        index = ReferenceIndex(self.root, ['grondwaterlocatie', 'filter'])
+        # The empty row makes the column float, 12 is read as 12.0
+        index.add_sheet('filter', pd.DataFrame({'grondwaterlocatie': [12, np.nan, 14]}, index=pd.RangeIndex(4, 7)))
+        index.add_sheet('grondwaterlocatie', pd.DataFrame({'identificatie': [12, 13]}, index=pd.RangeIndex(4, 6)))
+        self.assertEqual([(issue.value, issue.rows) for issue in index.get_issues()], [(['14'], [(6, 6)])])
+
+    def test_incomplete_target(self):
+        index = ReferenceIndex(self.root, ['grondwaterlocatie', 'filter'])
+        index.add_sheet('filter', pd.DataFrame({'grondwaterlocatie': ['GW2']}, index=pd.RangeIndex(4, 5),
+                                               dtype=object))
+        # Only a part of the grondwaterlocaties was read, GW2 can be in the other rows
+        index.add_sheet('grondwaterlocatie', pd.DataFrame({'identificatie': ['GW1']}, index=pd.RangeIndex(4, 5),
+                                                          dtype=object), complete=False)
+        self.assertEqual(index.get_issues(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import json
+import os
+import threading
+import unittest
+import urllib.error
+import urllib.request
+
+from src.service import ConversionService, ServiceMetrics, create_server
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKBOOK = os.path.join(PROJECT_ROOT, 'tests', 'data', 'filled_templates', 'grondwater_template_full.xlsx')
+
+
+def start_server(test, service) -> str:
+    server = create_server(service, port=0)
+    test.addCleanup(server.server_close)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    test.addCleanup(server.shutdown)
+    return f'http://127.0.0.1:{server.server_address[1]}'
+
+
+class ServiceTest(unittest.TestCase):
+    def test_metrics(self):
+        metrics = ServiceMetrics()
+        self.assertIsNone(metrics.to_dict()['latency'])
+        for seconds in range(1, 101):
+            metrics.update(completed=1)
+            metrics.add_latency(seconds)
+        metrics.update(rejected=1)
+
+        result = metrics.to_dict()
+        self.assertEqual((result['completed'], result['rejected'], result['in_progress']), (100, 1, 0))
+        self.assertEqual(result['latency']['p50'], 51)
+        self.assertEqual(result['latency']['p95'], 96)
+        self.assertEqual(result['latency']['max'], 100)
+
+    def test_requests(self):
+        service = ConversionService(omgevingen=('oefen',), workers=1, queue_size=0, preload=False)
+        self.addCleanup(service.close)
+        url = start_server(self, service)
+
+        with urllib.request.urlopen(f'{url}/health') as response:
+            self.assertEqual(json.load(response)['omgevingen'], ['oefen'])
+        with urllib.request.urlopen(f'{url}/metrics') as response:
+            self.assertEqual(json.load(response)['completed'], 0)
+
+        for path, data, status in (('/convert?omgeving=oefen', b'', 400),
+                                   ('/convert?omgeving=productie', b'xlsx', 400),
+                                   ('/convert?omgeving=oefen&start=abc', b'xlsx', 400),
+                                   ('/convert?omgeving=oefen&start=0&end=1.5', b'xlsx', 400),
+                                   ('/unknown', b'xlsx', 404)):
+            with self.assertRaises(urllib.error.HTTPError) as context:
+                urllib.request.urlopen(urllib.request.Request(f'{url}{path}', data=data, method='POST'))
+            self.assertEqual(context.exception.code, status)
+            context.exception.close()
+
+        # Without free slots every conversion is refused
+        self.assertTrue(service.slots.acquire(blocking=False))
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            urllib.request.urlopen(urllib.request.Request(f'{url}/convert?omgeving=oefen', data=b'xlsx'))
+        self.assertEqual(context.exception.code, 503)
+        context.exception.close()
+        service.slots.release()
+
+    def test_convert(self):
+        service = ConversionService(omgevingen=('productie',), workers=1, queue_size=1)
+        self.addCleanup(service.close)
+        url = start_server(self, service)
+        with open(WORKBOOK, 'rb') as f:
+            data = f.read()
+
+        def post():
+            request = urllib.request.Request(f'{url}/convert?omgeving=productie&sheets=filter&start=0&end=10',
+                                             data=data)
+            with urllib.request.urlopen(request) as response:
+                return json.load(response)
+
+        result = post()
+        self.assertTrue(result['xml'].startswith('<?xml'))
+        self.assertIn('filter', result['report']['summary'])
+        self.assertIsInstance(result['rapport'], str)
+
+        # A worker that dies breaks the pool, the service replaces it after the failed conversion
+        pool = service.pool
+        with self.assertRaises(Exception):
+            pool.submit(os._exit, 1).result()
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            post()
+        self.assertEqual(context.exception.code, 500)
+        context.exception.close()
+        self.assertIsNot(service.pool, pool)
+        self.assertEqual(post()['xml'], result['xml'])
+
+
+if __name__ == '__main__':
+    unittest.main()
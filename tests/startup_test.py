@@ -0,0 +1,87 @@
+import os
+import subprocess
+import sys
+import unittest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Total import time (in seconds) that is allowed before the help of the command line tool is printed. Timings depend
+# on the machine, the budget is only checked when XLS2XML_TIMING_TESTS is set.
+IMPORT_BUDGET = 0.15
+TIMING_TESTS = bool(os.environ.get('XLS2XML_TIMING_TESTS'))
+HEAVY_MODULES = ('pandas', 'numpy', 'xmlschema', 'elementpath', 'dateutil', 'ordered_set', 'openpyxl')
+
+
+def get_import_times(args) -> dict:
+    """
+    Runs a script with -X importtime and collects the time spent on importing each module.
+
+    Args:
+        args (List[str]): Script and arguments to run.
+
+    Returns:
+        dict: Self import time in seconds, keyed by module name.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', *args], cwd=PROJECT_ROOT, capture_output=True,
+                            text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_time, _, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(self_time) / 1e6
+    return times
+
+
+def get_loaded_modules(argv) -> set:
+    """
+    Runs xls2xml.main in a new interpreter and collects the top level modules that are loaded afterwards.
+
+    Args:
+        argv (List[str]): Arguments of xls2xml.main.
+
+    Returns:
+        Set[str]: Names of the loaded top level modules.
+    """
+    script = ('import contextlib, io, sys, xls2xml\n'
+              'with contextlib.redirect_stdout(io.StringIO()), contextlib.suppress(SystemExit):\n'
+              f'    xls2xml.main({argv!r})\n'
+              'print(" ".join(sys.modules))')
+    result = subprocess.run([sys.executable, '-c', script], cwd=PROJECT_ROOT, capture_output=True, text=True,
+                            check=True)
+    return {name.split('.')[0] for name in result.stdout.split()}
+
+
+class StartupTest(unittest.TestCase):
+    def test_main_does_not_load_heavy_modules(self):
+        workbook = os.path.join(PROJECT_ROOT, 'tests', 'data', 'filled_templates', 'grondwater_template_full.xlsx')
+        for argv in (['--help'], ['-l', '-i', workbook]):
+            loaded = get_loaded_modules(argv)
+            self.assertIn('xls2xml', loaded)
+            for module in ('pandas', 'xmlschema'):
+                self.assertNotIn(module, loaded, argv)
+
+    def test_help_does_not_import_heavy_modules(self):
+        times = get_import_times(['xls2xml.py', '--help'])
+        imported = {name.split('.')[0] for name in times}
+        for module in HEAVY_MODULES:
+            self.assertNotIn(module, imported)
+
+    @unittest.skipUnless(TIMING_TESTS, 'set XLS2XML_TIMING_TESTS=1 to check the import time budget')
+    def test_help_import_budget(self):
+        times = get_import_times(['xls2xml.py', '--help'])
+        self.assertLess(sum(times.values()), IMPORT_BUDGET)
+
+    def test_gui_module_does_not_import_heavy_modules(self):
+        try:
+            import tkinter  # noqa: F401
+        except ImportError:
+            self.skipTest('tkinter is not available')
+        times = get_import_times(['-c', 'import gui'])
+        imported = {name.split('.')[0] for name in times}
+        for module in HEAVY_MODULES:
+            self.assertNotIn(module, imported)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic_workbook import create_synthetic_workbook
+from src.dfs_schema import get_dfs_schema
+from src.read_excel import get_partition
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class SyntheticWorkbookTest(unittest.TestCase):
+    def test_objects_are_read_back(self):
+        root = get_dfs_schema(PROJECT_ROOT, 'productie')
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        for sheet in ('filtermeting', 'bodemobservatie', 'boring'):
+            filename = os.path.join(directory, f'{sheet}.xlsx')
+            n_rows = create_synthetic_workbook(filename, sheet, 20, root, repeat=3)
+            self.assertGreaterEqual(n_rows, 20)
+
+            base = root.get_specific_child(sheet)
+            df = pd.read_excel(filename, sheet_name=sheet).iloc[base.get_max_depth():, :]
+            self.assertEqual(df.shape[0], n_rows)
+            self.assertEqual(len(get_partition(df, np.ones(df.shape[0], dtype=bool), [], base)), 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+import unittest
+from importlib.util import find_spec
+
+import numpy as np
+import pandas as pd
+
+from src.dfs_schema import get_dfs_schema
+from src.read_excel import get_table_files, read_table, parse_date, parse_time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TableInputTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_table_files(self):
+        for name in ('filter.csv', 'filter.parquet', 'filtermeting.csv', 'notities.txt'):
+            open(os.path.join(self.directory, name), 'w').close()
+
+        files = get_table_files(self.directory)
+        self.assertEqual(files, {'filter': os.path.join(self.directory, 'filter.parquet'),
+                                 'filtermeting': os.path.join(self.directory, 'filtermeting.csv')})
+        self.assertEqual(get_table_files(files['filtermeting']), {'filtermeting': files['filtermeting']})
+        self.assertIsNone(get_table_files('template.xlsx'))
+
+    def test_read_csv(self):
+        node = get_dfs_schema(PROJECT_ROOT, 'productie').get_specific_child('filter')
+        filename = os.path.join(self.directory, 'filter.csv')
+        with open(filename, 'w') as f:
+            f.write('grondwaterlocatie,identificatie,onbekend\n'
+                    'GW001,0012,1.50\n'
+                    ',,\n'
+                    'GW002,1.50,2\n')
+
+        engines = ['c']
+        if find_spec('pyarrow') is not None:
+            engines.append('pyarrow')
+        for engine in engines:
+            with self.subTest(engine=engine):
+                df = read_table(filename, node, engine=engine)
+                self.assertEqual(list(df.index), [2, 3, 4])
+                # Leaf columns are kept as written, missing values are NaN as in the Excel path
+                self.assertEqual(df['identificatie'].tolist()[::2], ['0012', '1.50'])
+                self.assertTrue(np.isnan(df.loc[3, 'grondwaterlocatie']))
+                self.assertTrue(np.isnan(df.loc[3, 'identificatie']))
+                self.assertEqual(df.loc[4, 'onbekend'], 2)
+
+    @unittest.skipIf(find_spec('pyarrow') is None, 'pyarrow is not installed')
+    def test_read_parquet_serials(self):
+        node = get_dfs_schema(PROJECT_ROOT, 'productie').get_specific_child('filtermeting')
+        filename = os.path.join(self.directory, 'filtermeting.parquet')
+        pd.DataFrame({'choice_1-peilmeting-datum': [43902.0, np.nan, 43903.0],
+                      'choice_1-peilmeting-tijdstip': [0.5, np.nan, 43902 + (10 * 3600 + 11 * 60 + 12) / 86400],
+                      'grondwaterlocatie': ['2020', None, '43902']}).to_parquet(filename)
+
+        df = read_table(filename, node)
+        # Numbers in date and time columns of a tabular source are Excel serials
+        self.assertEqual([parse_date(d) for d in df['choice_1-peilmeting-datum'][::2]], ['2020-03-12', '2020-03-13'])
+        self.assertEqual([parse_time(t) for t in df['choice_1-peilmeting-tijdstip'][::2]], ['12:00:00', '10:11:12'])
+        self.assertTrue(np.isnan(df.loc[2, 'choice_1-peilmeting-datum']))
+        self.assertEqual(df['grondwaterlocatie'].tolist()[::2], ['2020', '43902'])
+
+
+if __name__ == '__main__':
+    unittest.main()
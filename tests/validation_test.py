@@ -0,0 +1,148 @@
+import math
+import os
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+
+from src.dfs_schema import Node, ChoiceNode
+from src.prevalidation import PreValidator, PreValidationError
+import pandas as pd
+
+from src.read_excel import DataNode, get_row_ranges, check_codelijsten
+from src.validation import SourceLocation, merge_row_ranges
+from src.validation_cache import ValidationCache, CachedValidationError
+
+
+def make_node(name, min_amount, max_amount, children=(), enum=None, cls=Node):
+    node = cls()
+    node.name, node.min_amount, node.max_amount = name, min_amount, max_amount
+    node.children = list(children)
+    node.enum = enum
+    return node
+
+
+def make_schema():
+    choice = make_node('choice_1', 1, 1, [make_node('kbonummer', 1, 1), make_node('ovocode', 1, 1)], cls=ChoiceNode)
+    filter_node = make_node('filter', 0, math.inf, [
+        make_node('identificatie', 1, 1),
+        make_node('filtertype', 1, 1, enum=['peilfilter', 'pompfilter']),
+        make_node('meetnet', 0, 1),
+        make_node('beheerder', 1, 1, [make_node('naam', 1, 1), choice]),
+    ])
+    return make_node(None, 1, 1, [filter_node])
+
+
+class SourceLocationTest(unittest.TestCase):
+
+    def test_row_ranges(self):
+        self.assertEqual(get_row_ranges([5, 6, 7, 9, 12, 13]), [(5, 7), (9, 9), (12, 13)])
+        self.assertEqual(get_row_ranges([]), [])
+        self.assertEqual(merge_row_ranges([(9, 9), (5, 7), (8, 8), (12, 13)]), [(5, 9), (12, 13)])
+
+    def test_columns(self):
+        root = DataNode('filter')
+        root.rows = [(5, 8)]
+        identificatie = DataNode('identificatie')
+        identificatie.data, identificatie.rows = ['F1'], [(5, 5)]
+        root.children['identificatie'].append(identificatie)
+        for rows in ([(5, 6)], [(8, 8)]):
+            ligging = DataNode('ligging')
+            ligging.rows = rows
+            aquifer = DataNode('aquifer')
+            aquifer.data, aquifer.rows = ['0100'], rows
+            ligging.children['aquifer'].append(aquifer)
+            root.children['ligging'].append(ligging)
+
+        location = SourceLocation('filter', root)
+        self.assertEqual(location.columns, {'identificatie': [(5, 5)], 'ligging-aquifer': [(5, 6), (8, 8)]})
+        self.assertEqual(location.get_rows('aquifer'), [(5, 6), (8, 8)])
+        self.assertEqual(location.get_rows('onbekend'), [(5, 8)])
+        self.assertEqual(str(location), "sheet 'filter', rows 5-8")
+
+
+class PreValidatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.prevalidator = PreValidator(make_schema())
+        self.valid = {'identificatie': ['F1'], 'filtertype': ['peilfilter'],
+                      'beheerder': [{'naam': ['DOV'], 'kbonummer': ['0123']}]}
+
+    def check(self, subject):
+        try:
+            self.prevalidator.check('filter', subject)
+        except PreValidationError as e:
+            return e.messages
+        return []
+
+    def test_valid(self):
+        self.assertEqual(self.check(self.valid), [])
+        self.assertEqual(self.check(dict(self.valid, filtertype=[' peilfilter '])), [])
+
+    def test_missing_mandatory(self):
+        subject = dict(self.valid)
+        del subject['identificatie']
+        self.assertEqual(self.check(subject), ["Mandatory element 'identificatie' is missing in filter"])
+
+    def test_enum(self):
+        self.assertEqual(self.check(dict(self.valid, filtertype=['onbekend'])),
+                         ["Value 'onbekend' of filter/filtertype is not in the codelijst"])
+
+    def test_cardinality(self):
+        self.assertEqual(self.check(dict(self.valid, meetnet=['1', '2'])),
+                         ["'meetnet' occurs 2 times in filter, at most 1 allowed"])
+
+    def test_choice(self):
+        self.assertEqual(self.check(dict(self.valid, beheerder=[{'naam': ['DOV']}])),
+                         ["One of 'kbonummer', 'ovocode' is mandatory in filter/beheerder"])
+        self.assertEqual(self.check(dict(self.valid, beheerder=[{'naam': ['DOV'], 'kbonummer': ['1'], 'ovocode': ['2']}])),
+                         ["Only one of 'kbonummer', 'ovocode' is allowed in filter/beheerder"])
+
+
+class CodelijstColumnTest(unittest.TestCase):
+
+    def test_unknown_codes(self):
+        df = pd.DataFrame({'identificatie': ['F1', 'F2', 'F3', 'F4', 'F5'],
+                           'filtertype': ['peilfilter', 'foo', float('nan'), 'foo', 'bar']},
+                          index=pd.RangeIndex(6, 11))
+        issues = check_codelijsten(df, 'filter', make_schema().get_specific_child('filter'))
+
+        self.assertEqual([(i.column, i.code, i.count, i.rows) for i in issues],
+                         [('filtertype', 'foo', 2, [(7, 7), (9, 9)]), ('filtertype', 'bar', 1, [(10, 10)])])
+
+
+class ValidationCacheTest(unittest.TestCase):
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ValidationCache(os.path.join(directory, 'cache.sqlite'), namespace='productie:5.10.0',
+                                    max_entries=2)
+            valid = cache.get_hash('filter', {'identificatie': ['F1'], 'meetnet': ['1']})
+            self.assertEqual(valid, cache.get_hash('filter', {'meetnet': ['1'], 'identificatie': ['F1']}))
+            self.assertIsNone(cache.get(valid))
+
+            elem = ET.Element('filter')
+            ET.SubElement(elem, 'identificatie').text = 'F1'
+            cache.put(valid, elem=elem)
+            invalid = cache.get_hash('filter', {'identificatie': ['F2']})
+            cache.put(invalid, error=ValueError('filtertype is missing'), element='filtertype')
+            cache.close()
+
+            cache = ValidationCache(os.path.join(directory, 'cache.sqlite'), namespace='productie:5.10.0',
+                                    max_entries=2)
+            elem, error = cache.get(valid)
+            self.assertIsNone(error)
+            self.assertEqual(ET.tostring(elem), b'<filter><identificatie>F1</identificatie></filter>')
+            elem, error = cache.get(invalid)
+            self.assertIsInstance(error, CachedValidationError)
+            self.assertEqual((str(error), error.element), ('filtertype is missing', 'filtertype'))
+
+            cache.get(valid)
+            cache.put(cache.get_hash('filter', {'identificatie': ['F3']}), elem=ET.Element('filter'))
+            cache.commit()
+            self.assertIsNone(cache.get(invalid))
+            self.assertIsNotNone(cache.get(valid))
+            cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
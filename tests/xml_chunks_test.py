@@ -0,0 +1,115 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+
+from src.dfs_schema import get_dfs_schema, get_dfs_schema_from_url
+from src.xml_chunks import get_chunks, get_object_groups
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKBOOK = os.path.join(PROJECT_ROOT, 'tests', 'data', 'filled_templates', 'grondwater_template_full.xlsx')
+
+XSD = """<?xml version="1.0"?>
+<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema">
+  <xs:element name="dov-schema">
+    <xs:complexType>
+      <xs:sequence>
+        <xs:element name="grondwaterlocatie" minOccurs="0" maxOccurs="unbounded">
+          <xs:complexType>
+            <xs:sequence><xs:element name="identificatie" type="xs:string"/></xs:sequence>
+          </xs:complexType>
+        </xs:element>
+        <xs:element name="filter" minOccurs="0" maxOccurs="unbounded">
+          <xs:complexType>
+            <xs:sequence>
+              <xs:element name="identificatie" type="xs:string"/>
+              <xs:element name="grondwaterlocatie" type="xs:string"/>
+            </xs:sequence>
+          </xs:complexType>
+        </xs:element>
+      </xs:sequence>
+    </xs:complexType>
+  </xs:element>
+</xs:schema>
+"""
+
+
+class XmlChunksTest(unittest.TestCase):
+    def setUp(self):
+        self.root = get_dfs_schema(PROJECT_ROOT, 'productie')
+
+    def test_object_groups(self):
+        corrected = {
+            '@xmlns:gml': 'http://www.opengis.net/gml/3.2',
+            'grondwaterlocatie': [{'identificatie': ['GW1']}, {'identificatie': ['GW2']}, {'identificatie': ['GW3']}],
+            'filter': [
+                {'identificatie': ['F1'], 'filtertype': ['peilfilter'], 'grondwaterlocatie': ['GW2']},
+                {'identificatie': ['F2'], 'filtertype': ['peilfilter'], 'grondwaterlocatie': ['GW4']},
+            ],
+            'filtermeting': [
+                {'grondwaterlocatie': ['GW3'], 'filter': [{'identificatie': ['F1'], 'filtertype': ['peilfilter']}]},
+            ],
+        }
+        # GW3 is joined with GW2 through the filtermeting of F1
+        self.assertEqual(get_object_groups(corrected, self.root), [
+            [('grondwaterlocatie', 0)],
+            [('grondwaterlocatie', 1), ('grondwaterlocatie', 2), ('filter', 0), ('filtermeting', 0)],
+            [('filter', 1)],
+        ])
+
+    def test_chunks(self):
+        import xmlschema
+        from src.validation import Validator
+
+        xml_schema = xmlschema.XMLSchema(XSD)
+        validator = Validator({
+            'grondwaterlocatie': [{'identificatie': ['GW1']}, {'identificatie': ['GW2']}],
+            'filter': [{'identificatie': ['F1'], 'grondwaterlocatie': ['GW2']},
+                       {'identificatie': ['F2'], 'grondwaterlocatie': ['GW1']},
+                       {'identificatie': ['F3'], 'grondwaterlocatie': ['GW2']}],
+        }, xml_schema)
+        validator.validate()
+        # The elements encoded during validation are kept without a validation cache
+        self.assertEqual(ET.canonicalize(ET.tostring(validator.get_encoded()), strip_text=True),
+                         ET.canonicalize(ET.tostring(xml_schema.encode(validator.corrected)), strip_text=True))
+
+        root = get_dfs_schema_from_url(None, xml_schema=xml_schema)
+        documents = get_chunks(validator, root, max_objects=2)
+        # The group of GW2 exceeds the limit, but is not divided
+        self.assertEqual([chunk.get_counts() for _, chunk in documents],
+                         [{'grondwaterlocatie': 1, 'filter': 1}, {'grondwaterlocatie': 1, 'filter': 2}])
+        for xml, _ in documents:
+            self.assertTrue(xml_schema.is_valid(xml))
+        self.assertEqual([e.findtext('identificatie') for e in documents[1][0]], ['GW2', 'F1', 'F3'])
+
+        self.assertEqual(len(get_chunks(validator, root, max_bytes=10 ** 6)), 1)
+        with self.assertRaises(ValueError):
+            get_chunks(validator, root, max_objects=0)
+
+    def test_write_chunks(self):
+        from src.read_excel import read_sheets, write_xml_chunks, get_manifest_filename
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = os.path.join(directory, 'result.xml')
+
+        _, validator = read_sheets(WORKBOOK, ['grondwaterlocatie', 'filter', 'filtermeting'])
+        manifest = write_xml_chunks(validator, filename, max_objects=1)
+        with open(get_manifest_filename(filename), encoding='utf-8') as f:
+            self.assertEqual(json.load(f), manifest)
+
+        groups = get_object_groups(validator.corrected, self.root)
+        self.assertEqual(len(manifest['chunks']), len(groups))
+        totals = {}
+        for chunk in manifest['chunks']:
+            for key, count in chunk['objects'].items():
+                totals[key] = totals.get(key, 0) + count
+            self.assertTrue(validator.xml_schema.is_valid(os.path.join(directory, chunk['file'])))
+        self.assertEqual(totals, {key: len(subjects) for key, subjects in validator.corrected.items()
+                                  if isinstance(subjects, list) and subjects})
+
+
+if __name__ == '__main__':
+    unittest.main()
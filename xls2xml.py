@@ -1,12 +1,16 @@
 import argparse
-from src.read_excel import read_to_xml
+import contextlib
 
-if __name__ == '__main__':
+NON_DATA_SHEETS = ('Codelijsten', 'metadata')
+
+
+def get_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(prog='xls2xml',
                                      description="Function to parse data from xlsx-files to XML ready to be uploaded in DOV")
 
     parser.add_argument("-i", '--input_file',
-                        help='Input xlsx file that will be parsed to XML, default: data/template.xlsx',
+                        help='Input xlsx file that will be parsed to XML, or a directory with a <sheet>.csv or '
+                             '<sheet>.parquet file per sheet, default: data/template.xlsx',
                         default='./data/template.xlsx')
 
     # Adding optional argument
@@ -25,17 +29,138 @@ if __name__ == '__main__':
     parser.add_argument("-s", "--sheets", nargs='+',
                         help="Sheet(s) from excel file that needs to be parsed, by default all sheets will be parsed")
 
-    # Read arguments from command line
-    args = parser.parse_args()
+    parser.add_argument("-c", "--cache",
+                        help="SQLite file in which validation results are cached, so identical objects are not "
+                             "validated again in later conversions, by default no cache is used")
+
+    parser.add_argument("-p", "--profile", nargs='?', const=True, metavar='PROFILE_FILE',
+                        help="Print the time, CPU time, peak memory and counts of every stage of the conversion, and "
+                             "write them to PROFILE_FILE as JSON if given")
+
+    parser.add_argument("--profiler", choices=('cprofile', 'sampling'),
+                        help="Profile the conversion with cProfile or a sampling profiler (pyinstrument), write the "
+                             "profile next to the output file and print the slowest functions")
+
+    parser.add_argument("-r", "--df_range", nargs=2, type=int, metavar=('START', 'END'),
+                        help="Only convert the data rows START up to END of every sheet, e.g. to profile a single "
+                             "object, by default all rows are converted")
+
+    parser.add_argument("--objects", nargs='+', type=object_selector, metavar='SHEET:IDENTIFIER',
+                        help="Only convert these objects, e.g. boring:B-001, by the value of the first identifier "
+                             "column of their sheet. Their rows are looked up in the object index next to the input "
+                             "file, which is built on the first conversion of a sheet")
+
+    parser.add_argument("--index", action='store_true',
+                        help="Store the object index of the converted sheets next to the input file, for later "
+                             "conversions of selected objects")
+
+    parser.add_argument("--columnar", action='store_true',
+                        help="Keep the sheet data as dictionary encoded columns while reading the objects, which uses "
+                             "less memory on large sheets")
+
+    parser.add_argument("--max_objects", type=positive_number(int), metavar='N',
+                        help="Split the output into numbered XML files of at most N objects, next to a manifest "
+                             "<output>.manifest.json. Objects that refer to each other stay in the same file")
+
+    parser.add_argument("--max_size", type=positive_number(float), metavar='MB',
+                        help="Split the output into numbered XML files of at most MB megabytes of objects, see "
+                             "--max_objects")
+
+    parser.add_argument("-l", "--list_sheets", action='store_true',
+                        help="Only list the sheets of the input file that can be parsed")
+
+    return parser
+
+
+def list_sheets(input_file) -> list:
+    """
+    Lists the data sheets of an Excel file without loading its cells.
+
+    Args:
+        input_file (str): Path to the Excel file.
+
+    Returns:
+        List[str]: Names of the sheets that would be parsed by default.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(input_file, read_only=True)
+    try:
+        return [sheet for sheet in workbook.sheetnames if sheet not in NON_DATA_SHEETS]
+    finally:
+        workbook.close()
+
+
+def object_selector(value) -> tuple:
+    sheet, separator, identifier = value.partition(':')
+    if not separator or not sheet:
+        raise argparse.ArgumentTypeError(f'select objects as SHEET:IDENTIFIER, not {value}')
+    return sheet, identifier
+
+
+def positive_number(type_):
+    def parse(value):
+        number = type_(value)
+        if number <= 0:
+            raise argparse.ArgumentTypeError(f'has to be positive, not {value}')
+        return number
+
+    parse.__name__ = type_.__name__
+    return parse
+
+
+def get_objects(selectors):
+    """
+    Groups the selected objects by sheet.
+
+    Returns:
+        Dict[str, List[str]]: Identifiers of the selected objects of every sheet, or None if no objects were selected.
+    """
+    if not selectors:
+        return None
+    objects = {}
+    for sheet, identifier in selectors:
+        objects.setdefault(sheet, []).append(identifier)
+    return objects
+
+
+def main(argv=None):
+    # Read arguments from command line, before importing the conversion modules (pandas and xmlschema take about a
+    # second to import)
+    args = get_parser().parse_args(argv)
 
     assert args.omgeving in ('ontwikkel', 'oefen', 'productie')
     assert args.mode in ('local', 'online')
 
+    if args.list_sheets:
+        print('\n'.join(list_sheets(args.input_file)))
+        return
+
+    from src.read_excel import read_to_xml
+    from src.instrumentation import Instrumentation, Profiler
+
+    instrumentation = Instrumentation() if args.profile else None
+    profiler = Profiler(args.output_file, sampling=args.profiler == 'sampling') if args.profiler else None
+
     # Call the read_to_xml function with provided arguments
-    if args.sheets:
+    with profiler or contextlib.nullcontext():
         rapport = read_to_xml(args.input_file, args.output_file, sheets=args.sheets, mode=args.mode,
-                              xsd_source=args.omgeving)
-    else:
-        rapport = read_to_xml(args.input_file, args.output_file, mode=args.mode, xsd_source=args.omgeving)
+                              xsd_source=args.omgeving, validation_cache=args.cache, df_range=args.df_range,
+                              instrumentation=instrumentation, columnar=args.columnar,
+                              objects=get_objects(args.objects), index=args.index, max_objects=args.max_objects,
+                              max_bytes=int(args.max_size * 1e6) if args.max_size is not None else None)
 
     print(rapport.get_error_rapport())
+
+    if profiler is not None:
+        print(profiler.get_top())
+        print(f'Profile written to {profiler.filename}')
+
+    if instrumentation is not None:
+        print(instrumentation)
+        if isinstance(args.profile, str):
+            instrumentation.to_json(args.profile)
+
+
+if __name__ == '__main__':
+    main()